@@ -0,0 +1,439 @@
+"""
+In-process stand-ins for the AWS clients the Lambdas use.
+
+install(world) replaces boto3.client / boto3.resource, so every client a
+handler creates – directly or through blueberry_common.aws – talks to the
+FakeWorld instead of the network:
+
+  * S3            objects kept in memory (get/put/head/list/delete, uploads)
+  * DynamoDB      per-table item lists, returned in Limit/page_size pages
+                  with LastEvaluatedKey; partition-key conditions built with
+                  boto3.dynamodb.conditions.Key are honoured
+  * Bedrock       invoke_agent streams agent_chunks chunks, sleeping
+                  chunk_latency seconds before each; invoke_model returns a
+                  unit embedding, converse a plausible category answer
+  * anything else returns {} (or a fixed minimal response), so handlers run
+    their real code paths end to end
+
+Every call is counted in world.calls, keyed "service.operation".
+"""
+import io
+import json
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+_serializer = TypeSerializer()
+
+
+class FakeWorld:
+
+    def __init__(self, chunk_latency=0.0, agent_chunks=20, page_size=100):
+        self.chunk_latency = chunk_latency
+        self.agent_chunks  = agent_chunks
+        self.page_size     = page_size
+        self.agent_text    = "Prune blueberry bushes in late winter while they are dormant. (confidence: 95%)"
+        self.objects       = {}      # (bucket, key) -> {"body", "last_modified", "content_type", "metadata"}
+        self.tables        = {}      # name -> {"keys": (attr, ...), "items": [...]}
+        self.calls         = Counter()
+        self.lock          = threading.Lock()
+
+    # ---- fixtures --------------------------------------------------------
+    def put_object(self, bucket, key, body, content_type="binary/octet-stream", metadata=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.objects[(bucket, key)] = {
+            "body":          bytes(body),
+            "last_modified": datetime.now(timezone.utc).replace(microsecond=0),
+            "content_type":  content_type,
+            "metadata":      dict(metadata or {}),
+        }
+
+    def table(self, name, keys=(), items=()):
+        self.tables[name] = {"keys": tuple(keys), "items": list(items)}
+        self.reindex(name)
+        return self.tables[name]
+
+    def reindex(self, name):
+        spec = self.tables[name]
+        spec["index"] = {tuple(it.get(k) for k in spec["keys"]): i for i, it in enumerate(spec["items"])}
+
+    def count(self, service, operation):
+        with self.lock:
+            self.calls[f"{service}.{operation}"] += 1
+
+
+def _error(code, operation, status=400, message=""):
+    return ClientError({"Error": {"Code": code, "Message": message or code},
+                        "ResponseMetadata": {"HTTPStatusCode": status}}, operation)
+
+
+class FakeBody:
+    """The subset of botocore's StreamingBody the handlers use."""
+
+    def __init__(self, data):
+        self._fp = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self._fp.read() if amt is None else self._fp.read(amt)
+
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        while chunk := self._fp.read(chunk_size):
+            yield chunk
+
+    def iter_lines(self, chunk_size=1024 * 1024, keepends=False):
+        for line in io.BytesIO(self._fp.read()):
+            yield line if keepends else line.rstrip(b"\r\n")
+
+    def __iter__(self):
+        return self.iter_chunks()
+
+    def close(self):
+        self._fp.close()
+
+
+class _Exceptions:
+    """client.exceptions.<Name> – ClientError subclasses made on demand."""
+
+    def __init__(self):
+        self._made = {}
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if name not in self._made:
+            self._made[name] = type(name, (ClientError,), {})
+        return self._made[name]
+
+
+class _Paginator:
+
+    def __init__(self, client, operation):
+        self.client, self.operation = client, operation
+
+    def paginate(self, **kwargs):
+        token_in, token_out = {
+            "list_objects_v2": ("ContinuationToken", "NextContinuationToken"),
+            "query":           ("ExclusiveStartKey", "LastEvaluatedKey"),
+            "scan":            ("ExclusiveStartKey", "LastEvaluatedKey"),
+        }.get(self.operation, ("NextToken", "NextToken"))
+        while True:
+            page = getattr(self.client, self.operation)(**kwargs)
+            yield page
+            if not page.get(token_out):
+                return
+            kwargs[token_in] = page[token_out]
+
+
+class FakeClient:
+
+    def __init__(self, service, world, **_):
+        self.service    = service
+        self.world      = world
+        self.exceptions = _Exceptions()
+        self.meta       = type("Meta", (), {"region_name": "us-east-1", "service_name": service})()
+
+    def __getattr__(self, operation):
+        if operation.startswith("__"):
+            raise AttributeError(operation)
+
+        def call(*args, **kwargs):
+            self.world.count(self.service, operation)
+            handler = getattr(type(self), f"_{self.service.replace('-', '_')}_{operation}", None)
+            if handler:
+                return handler(self, *args, **kwargs)
+            return _DEFAULTS.get((self.service, operation), dict)()
+        return call
+
+    def get_paginator(self, operation):
+        return _Paginator(self, operation)
+
+    def generate_presigned_url(self, operation, Params=None, ExpiresIn=3600, **_):
+        self.world.count(self.service, "generate_presigned_url")
+        return f"https://fake-s3.invalid/{(Params or {}).get('Key', '')}?X-Amz-Expires={ExpiresIn}"
+
+    def generate_presigned_post(self, Bucket, Key, **_):
+        return {"url": f"https://fake-s3.invalid/{Bucket}", "fields": {"key": Key}}
+
+    # ---- S3 --------------------------------------------------------------
+    def _object(self, bucket, key, operation):
+        obj = self.world.objects.get((bucket, key))
+        if obj is None and operation == "GetObject":
+            raise self.exceptions.NoSuchKey({"Error": {"Code": "NoSuchKey", "Message": key},
+                                             "ResponseMetadata": {"HTTPStatusCode": 404}}, operation)
+        if obj is None:
+            raise _error("404", operation, 404, "Not Found")
+        return obj
+
+    def _head(self, obj):
+        return {
+            "ContentLength": len(obj["body"]),
+            "LastModified":  obj["last_modified"],
+            "ETag":          f'"{uuid.uuid5(uuid.NAMESPACE_OID, str(len(obj["body"]))).hex}"',
+            "ContentType":   obj["content_type"],
+            "Metadata":      obj["metadata"],
+        }
+
+    def _s3_get_object(self, Bucket, Key, Range=None, **_):
+        obj  = self._object(Bucket, Key, "GetObject")
+        body = obj["body"]
+        if Range:
+            start, _sep, end = Range.replace("bytes=", "").partition("-")
+            body = body[int(start):int(end) + 1 if end else None]
+        return {**self._head(obj), "ContentLength": len(body), "Body": FakeBody(body)}
+
+    def _s3_head_object(self, Bucket, Key, **_):
+        return self._head(self._object(Bucket, Key, "HeadObject"))
+
+    def _s3_put_object(self, Bucket, Key, Body=b"", ContentType="binary/octet-stream", Metadata=None, **_):
+        if hasattr(Body, "read"):
+            Body = Body.read()
+        self.world.put_object(Bucket, Key, Body, ContentType, Metadata)
+        return {"ETag": '"fake"'}
+
+    def _s3_upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, **_):
+        extra = ExtraArgs or {}
+        self.world.put_object(Bucket, Key, Fileobj.read(), extra.get("ContentType", "binary/octet-stream"),
+                              extra.get("Metadata"))
+
+    def _s3_upload_file(self, Filename, Bucket, Key, ExtraArgs=None, **_):
+        with open(Filename, "rb") as fh:
+            self._s3_upload_fileobj(fh, Bucket, Key, ExtraArgs)
+
+    def _s3_copy_object(self, Bucket, Key, CopySource, **_):
+        src = self._object(CopySource["Bucket"], CopySource["Key"], "CopyObject")
+        self.world.objects[(Bucket, Key)] = dict(src)
+        return {}
+
+    def _s3_delete_object(self, Bucket, Key, **_):
+        self.world.objects.pop((Bucket, Key), None)
+        return {}
+
+    def _s3_delete_objects(self, Bucket, Delete, **_):
+        for obj in Delete.get("Objects", []):
+            self.world.objects.pop((Bucket, obj["Key"]), None)
+        return {"Deleted": [{"Key": o["Key"]} for o in Delete.get("Objects", [])]}
+
+    def _s3_list_objects_v2(self, Bucket, Prefix="", MaxKeys=1000, ContinuationToken=None, **_):
+        keys  = sorted(k for b, k in self.world.objects if b == Bucket and k.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page  = keys[start:start + MaxKeys]
+        resp  = {"KeyCount": len(page), "IsTruncated": start + MaxKeys < len(keys),
+                 "Contents": [{"Key": k, "Size": len(self.world.objects[(Bucket, k)]["body"]),
+                               "LastModified": self.world.objects[(Bucket, k)]["last_modified"],
+                               "ETag": '"fake"'} for k in page]}
+        if resp["IsTruncated"]:
+            resp["NextContinuationToken"] = str(start + MaxKeys)
+        return resp
+
+    def _s3_create_multipart_upload(self, Bucket, Key, **_):
+        return {"UploadId": uuid.uuid4().hex, "Bucket": Bucket, "Key": Key}
+
+    def _s3_upload_part(self, PartNumber, **_):
+        return {"ETag": f'"part-{PartNumber}"'}
+
+    # ---- Bedrock ---------------------------------------------------------
+    def _agent_stream(self):
+        text  = self.world.agent_text
+        n     = max(1, self.world.agent_chunks)
+        step  = max(1, -(-len(text) // n))
+        for i in range(0, len(text), step):
+            if self.world.chunk_latency:
+                time.sleep(self.world.chunk_latency)
+            yield {"chunk": {"bytes": text[i:i + step].encode("utf-8")}}
+
+    def _bedrock_agent_runtime_invoke_agent(self, sessionId="", **_):
+        return {"completion": self._agent_stream(), "sessionId": sessionId}
+
+    def _bedrock_runtime_invoke_model(self, body="{}", **_):
+        dims   = json.loads(body).get("dimensions", 256)
+        vector = [1.0 / dims ** 0.5] * dims
+        return {"body": FakeBody(json.dumps({"embedding": vector}).encode())}
+
+    def _bedrock_runtime_converse(self, messages=(), **_):
+        prompt = messages[0]["content"][0]["text"] if messages else ""
+        m = re.search(r"JSON array of (\d+)", prompt)
+        text = json.dumps(["Harvest"] * int(m.group(1))) if m else '"Harvest"'
+        return {"output": {"message": {"content": [{"text": text}]}},
+                "usage": {"inputTokens": len(prompt) // 4, "outputTokens": 4}}
+
+    # ---- DynamoDB (low-level client: typed attribute values) -------------
+    def _dynamodb_query(self, TableName, Limit=None, ExclusiveStartKey=None, **_):
+        return _page(self.world, TableName, Limit, ExclusiveStartKey, typed=True)
+
+    def _dynamodb_scan(self, TableName, Limit=None, ExclusiveStartKey=None, **_):
+        return _page(self.world, TableName, Limit, ExclusiveStartKey, typed=True)
+
+
+_DEFAULTS = {
+    ("lambda", "invoke"):                   lambda: {"StatusCode": 202},
+    ("sqs", "send_message"):                lambda: {"MessageId": uuid.uuid4().hex},
+    ("sqs", "send_message_batch"):          lambda: {"Successful": [], "Failed": []},
+    ("sqs", "get_queue_attributes"):        lambda: {"Attributes": {"ApproximateNumberOfMessages": "0"}},
+    ("ses", "send_email"):                  lambda: {"MessageId": uuid.uuid4().hex},
+    ("logs", "start_query"):                lambda: {"queryId": uuid.uuid4().hex},
+    ("logs", "get_query_results"):          lambda: {"status": "Complete", "results": [],
+                                                     "statistics": {"recordsMatched": 0.0}},
+    ("bedrock-agent", "start_ingestion_job"): lambda: {"ingestionJob": {"ingestionJobId": "job", "status": "STARTING"}},
+}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  DynamoDB
+# ──────────────────────────────────────────────────────────────────────────────
+def _key_filter(condition):
+    """Predicate for Key(...).eq / begins_with conditions (joined with &); others match all."""
+    if condition is None or isinstance(condition, str):
+        return lambda item: True
+    expr = condition.get_expression()
+    op, values = expr["operator"], expr["values"]
+    if op == "AND":
+        left, right = _key_filter(values[0]), _key_filter(values[1])
+        return lambda item: left(item) and right(item)
+    name = getattr(values[0], "name", None)
+    if op == "=" and name:
+        return lambda item: item.get(name) == values[1]
+    if op == "begins_with" and name:
+        return lambda item: str(item.get(name, "")).startswith(values[1])
+    return lambda item: True
+
+
+def _page(world, name, limit, start_key, condition=None, typed=False):
+    table = world.tables.get(name, {"items": []})
+    match = _key_filter(condition)
+    rows  = [it for it in table["items"] if match(it)]
+    start = int((start_key or {}).get("__offset", {"N": 0}).get("N", 0) if typed
+                else (start_key or {}).get("__offset", 0))
+    size  = min(int(limit), world.page_size) if limit else world.page_size
+    page  = rows[start:start + size]
+    if typed:
+        page = [{k: _serializer.serialize(v) for k, v in it.items()} for it in page]
+    resp = {"Items": page, "Count": len(page), "ScannedCount": len(page)}
+    if start + size < len(rows):
+        resp["LastEvaluatedKey"] = ({"__offset": {"N": str(start + size)}} if typed
+                                    else {"__offset": start + size})
+    return resp
+
+
+class FakeTable:
+
+    def __init__(self, name, world):
+        self.name  = name
+        self.world = world
+
+    def _spec(self):
+        return self.world.tables.get(self.name)
+
+    def _find(self, key):
+        spec = self._spec()
+        if not spec:
+            return None, None
+        if spec["keys"] and all(k in key for k in spec["keys"]):     # GSI queries return whole items
+            i = spec["index"].get(tuple(key[k] for k in spec["keys"]))
+            return (None, None) if i is None else (i, spec["items"][i])
+        for i, item in enumerate(spec["items"]):
+            if all(item.get(k) == v for k, v in key.items()):
+                return i, item
+        return None, None
+
+    def get_item(self, Key, **_):
+        self.world.count("dynamodb", "get_item")
+        _, item = self._find(Key)
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, Item, ReturnValues="NONE", **_):
+        self.world.count("dynamodb", "put_item")
+        spec = self._spec()
+        if not spec or not spec["keys"]:
+            return {}                         # write-only table: nothing to keep
+        i, old = self._find({k: Item.get(k) for k in spec["keys"]})
+        if i is None:
+            spec["index"][tuple(Item.get(k) for k in spec["keys"])] = len(spec["items"])
+            spec["items"].append(dict(Item))
+        else:
+            spec["items"][i] = dict(Item)
+        return {"Attributes": old} if old and ReturnValues == "ALL_OLD" else {}
+
+    def delete_item(self, Key, ReturnValues="NONE", **_):
+        self.world.count("dynamodb", "delete_item")
+        i, old = self._find(Key)
+        if i is not None and self._spec()["keys"]:
+            del self._spec()["items"][i]
+            self.world.reindex(self.name)
+        return {"Attributes": old} if old and ReturnValues == "ALL_OLD" else {}
+
+    def update_item(self, **_):
+        self.world.count("dynamodb", "update_item")
+        return {"Attributes": {}}
+
+    def query(self, KeyConditionExpression=None, Limit=None, ExclusiveStartKey=None, **_):
+        self.world.count("dynamodb", "query")
+        return _page(self.world, self.name, Limit, ExclusiveStartKey, KeyConditionExpression)
+
+    def scan(self, Limit=None, ExclusiveStartKey=None, **_):
+        self.world.count("dynamodb", "scan")
+        return _page(self.world, self.name, Limit, ExclusiveStartKey)
+
+    def batch_writer(self, **_):
+        return _BatchWriter(self)
+
+    def load(self):
+        pass
+
+
+class _BatchWriter:
+
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def put_item(self, Item):
+        self.table.put_item(Item=Item)
+
+    def delete_item(self, Key):
+        self.table.delete_item(Key=Key)
+
+
+class FakeResource:
+
+    def __init__(self, service, world, **_):
+        self.service = service
+        self.world   = world
+        self.meta    = type("Meta", (), {"client": FakeClient(service, world)})()
+
+    def Table(self, name):
+        return FakeTable(name, self.world)
+
+    def batch_get_item(self, RequestItems, **_):
+        self.world.count("dynamodb", "batch_get_item")
+        responses = {}
+        for name, request in RequestItems.items():
+            table = FakeTable(name, self.world)
+            found = (table._find(key)[1] for key in request.get("Keys", []))
+            responses[name] = [dict(item) for item in found if item]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+
+def install(world):
+    """Route boto3.client / boto3.resource to the world; returns an undo function."""
+    import boto3
+
+    saved = boto3.client, boto3.resource
+    boto3.client   = lambda service, *a, **kw: FakeClient(service, world, **kw)
+    boto3.resource = lambda service, *a, **kw: FakeResource(service, world, **kw)
+
+    def undo():
+        boto3.client, boto3.resource = saved
+    return undo
+
@@ -0,0 +1,315 @@
+"""
+Offline cold-start, latency and memory benchmarks for the Lambdas in lambda/.
+
+    python bench/run.py                                   # every handler
+    python bench/run.py -H cfEvaluator adminFile -n 200 --chunk-latency-ms 20
+    python bench/run.py --save-baseline main              # bench/baselines/main.json
+    python bench/run.py --compare main                    # exit 1 on a regression
+
+No AWS account is needed: boto3.client / boto3.resource are replaced by the
+in-memory fakes of fake_aws.py, with the state and events of scenarios.py.
+Every handler runs in fresh interpreters (they are all called handler.py),
+with its own directory and the common layer on sys.path, as in Lambda.
+
+Per handler:
+  cold_import_ms   median of --cold-runs fresh `import handler`; boto3 itself
+                   is loaded (and patched) first and reported as sdk_import_ms.
+                   Bytecode comes from a per-run cache primed by one
+                   discarded import, so stale .pyc files and
+                   PYTHONDONTWRITEBYTECODE do not skew it
+  import_peak_kb   tracemalloc peak while importing
+  client_init_ms   time blueberry_common.aws spent creating each client
+Per case:
+  first_ms         first invocation after the import (lazy clients, caches)
+  p50/p90/p99/max  warm lambda_handler latency over -n calls (after --warmup)
+  peak_kb          tracemalloc peak of one warm invocation
+  aws_calls        fake AWS calls per invocation (aws_ops: per operation)
+
+A comparison flags a metric that grew by more than --threshold (relative)
+and by more than a small absolute floor, so noise on sub-millisecond paths
+does not fail the run.
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+BENCH_DIR    = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR   = os.path.join(BENCH_DIR, "..", "lambda")
+COMMON_DIR   = os.path.join(LAMBDA_DIR, "common", "python")
+BASELINE_DIR = os.path.join(BENCH_DIR, "baselines")
+
+FAKE_ENV = {
+    "AWS_DEFAULT_REGION":    "us-east-1",
+    "AWS_REGION":            "us-east-1",
+    "AWS_ACCESS_KEY_ID":     "bench",
+    "AWS_SECRET_ACCESS_KEY": "bench",
+    "AWS_LAMBDA_FUNCTION_NAME": "bench",
+}
+FLOORS = {"ms": 0.5, "kb": 64}       # absolute growth below these is never a regression
+
+
+class FakeContext:
+
+    def __init__(self, handler):
+        self.aws_request_id       = str(uuid.uuid4())
+        self.function_name        = handler
+        self.invoked_function_arn = f"arn:aws:lambda:us-east-1:000000000000:function:{handler}"
+        self.memory_limit_in_mb   = 1024
+
+    def get_remaining_time_in_millis(self):
+        return 300_000
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Child process: one handler, fresh interpreter
+# ──────────────────────────────────────────────────────────────────────────────
+def _quiet():
+    """Handlers print a lot; keep it out of the timings and the report."""
+    return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+
+def child(args):
+    sys.path[:0] = [BENCH_DIR, os.path.join(LAMBDA_DIR, args.child), COMMON_DIR]
+    started = time.perf_counter()
+    import boto3  # noqa: F401  (the fakes patch it, so it is loaded before the handler)
+    sdk_import_ms = (time.perf_counter() - started) * 1000
+    import fake_aws
+    from scenarios import SCENARIOS
+
+    scenario = SCENARIOS[args.child]
+    world = fake_aws.FakeWorld(chunk_latency=args.chunk_latency_ms / 1000, agent_chunks=args.agent_chunks,
+                               page_size=args.page_size)
+    scenario.fixtures(world)
+    fake_aws.install(world)
+    out = {"sdk_import_ms": sdk_import_ms}
+
+    with _quiet():
+        if args.trace:
+            tracemalloc.start()
+        started = time.perf_counter()
+        module = importlib.import_module("handler")
+        out["import_ms"] = (time.perf_counter() - started) * 1000
+        if args.trace:
+            out["import_peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+
+    if args.mode == "import":
+        return out
+
+    cases = {}
+    for name, event in scenario.cases.items():
+        before = scenario.before.get(name, lambda w: None)
+        result = {}
+
+        def invoke():
+            before(world)
+            event_copy = json.loads(json.dumps(event))
+            world.calls.clear()
+            started = time.perf_counter()
+            with _quiet():
+                module.lambda_handler(event_copy, FakeContext(args.child))
+            return (time.perf_counter() - started) * 1000
+
+        result["first_ms"] = invoke()
+        result["aws_calls"] = sum(world.calls.values())
+        result["aws_ops"]   = dict(world.calls)
+        for _ in range(args.warmup):
+            invoke()
+        timings = [invoke() for _ in range(args.iterations)]
+        result.update({
+            "p50_ms":  percentile(timings, 50),
+            "p90_ms":  percentile(timings, 90),
+            "p99_ms":  percentile(timings, 99),
+            "max_ms":  max(timings),
+            "mean_ms": statistics.fmean(timings),
+        })
+
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        invoke()
+        result["peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        cases[name] = result
+
+    from blueberry_common import aws
+    out["client_init_ms"] = aws.init_times()
+    out["cases"] = cases
+    return out
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Parent: spawn children, aggregate, compare
+# ──────────────────────────────────────────────────────────────────────────────
+def spawn(handler, mode, args, trace=False):
+    from scenarios import SCENARIOS
+
+    env = {**os.environ, **FAKE_ENV, **SCENARIOS[handler].env, "PYTHONPYCACHEPREFIX": args.pycache}
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    with tempfile.NamedTemporaryFile("r", suffix=".json") as out:
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", handler, "--mode", mode, "--out", out.name,
+               "-n", str(args.iterations), "--warmup", str(args.warmup),
+               "--chunk-latency-ms", str(args.chunk_latency_ms), "--agent-chunks", str(args.agent_chunks),
+               "--page-size", str(args.page_size)]
+        if trace:
+            cmd.append("--trace")
+        proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{handler} ({mode}) failed:\n{proc.stderr.strip()[-2000:]}")
+        return json.load(out)
+
+
+def bench_handler(handler, args):
+    spawn(handler, "import", args)        # compiles into the run's bytecode cache
+    cold = [spawn(handler, "import", args) for _ in range(args.cold_runs)]
+    traced = spawn(handler, "import", args, trace=True)
+    warm = spawn(handler, "warm", args)
+    return {
+        "cold_import_ms": statistics.median(c["import_ms"] for c in cold),
+        "cold_import_min_ms": min(c["import_ms"] for c in cold),
+        "sdk_import_ms": statistics.median(c["sdk_import_ms"] for c in cold),
+        "import_peak_kb": traced["import_peak_kb"],
+        "client_init_ms": warm["client_init_ms"],
+        "cases": warm["cases"],
+    }
+
+
+def print_report(results):
+    print(f"{'handler':<20} {'case':<16} {'cold ms':>8} {'first':>8} {'p50':>8} {'p90':>8} "
+          f"{'p99':>8} {'peak KB':>9} {'calls':>6}")
+    for handler, res in results.items():
+        if "error" in res:
+            print(f"{handler:<20} ERROR {res['error'].splitlines()[-1]}")
+            continue
+        for i, (case, c) in enumerate(res["cases"].items()):
+            cold = f"{res['cold_import_ms']:8.1f}" if i == 0 else " " * 8
+            print(f"{handler if i == 0 else '':<20} {case:<16} {cold} {c['first_ms']:8.2f} {c['p50_ms']:8.2f} "
+                  f"{c['p90_ms']:8.2f} {c['p99_ms']:8.2f} {c['peak_kb']:9.0f} {c['aws_calls']:6d}")
+        inits = ", ".join(f"{k}={v:.1f}" for k, v in res["client_init_ms"].items())
+        print(f"{'':<20} import peak {res['import_peak_kb']:.0f} KB, boto3 {res['sdk_import_ms']:.0f} ms; "
+              f"clients: {inits or '-'}")
+
+
+def _metrics(res):
+    yield "cold_import_ms", res["cold_import_ms"], "ms"
+    yield "import_peak_kb", res["import_peak_kb"], "kb"
+    for case, c in res["cases"].items():
+        yield f"{case}.p50_ms", c["p50_ms"], "ms"
+        yield f"{case}.p99_ms", c["p99_ms"], "ms"
+        yield f"{case}.peak_kb", c["peak_kb"], "kb"
+
+
+def compare(results, baseline, threshold):
+    """Print metric deltas against the baseline; returns the regressions."""
+    regressions = []
+    for handler, res in results.items():
+        base = baseline["results"].get(handler)
+        if not base or "error" in res or "error" in base:
+            continue
+        base_metrics = {name: value for name, value, _ in _metrics(base)}
+        for name, value, unit in _metrics(res):
+            if name not in base_metrics:
+                continue
+            old = base_metrics[name]
+            delta = (value - old) / old if old else 0.0
+            regressed = value > old * (1 + threshold) and value - old > FLOORS[unit]
+            mark = "REGRESSION" if regressed else ""
+            print(f"{handler:<20} {name:<28} {old:10.2f} -> {value:10.2f} {delta:+8.1%} {mark}")
+            if regressed:
+                regressions.append((handler, name, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-H", "--handlers", nargs="*", help="handler directories (default: all with a scenario)")
+    parser.add_argument("-n", "--iterations", type=int, default=50, help="warm invocations per case")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--cold-runs", type=int, default=5, help="fresh-process imports per handler")
+    parser.add_argument("--chunk-latency-ms", type=float, default=0.0, help="delay before each agent chunk")
+    parser.add_argument("--agent-chunks", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=100, help="fake DynamoDB items per page")
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative growth that counts as a regression")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    # internal: child process
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=("import", "warm"), default="warm", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    parser.add_argument("--trace", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        with open(args.out, "w") as fh:
+            json.dump(child(args), fh)
+        return 0
+
+    sys.path.insert(0, BENCH_DIR)
+    from scenarios import SCENARIOS
+
+    handlers = args.handlers or list(SCENARIOS)
+    unknown = [h for h in handlers if h not in SCENARIOS]
+    if unknown:
+        parser.error(f"no scenario for {', '.join(unknown)}")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench-pycache-") as args.pycache:
+        for handler in handlers:
+            print(f"… {handler}", file=sys.stderr)
+            try:
+                results[handler] = bench_handler(handler, args)
+            except RuntimeError as e:
+                results[handler] = {"error": str(e)}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+    settings = {k: getattr(args, k) for k in ("iterations", "warmup", "cold_runs", "chunk_latency_ms",
+                                              "agent_chunks", "page_size")}
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w") as fh:
+            json.dump({
+                "created":  datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python":   platform.python_version(),
+                "platform": platform.platform(),
+                "settings": settings,
+                "results":  results,
+            }, fh, indent=2, sort_keys=True)
+        print(f"Baseline saved to {path}", file=sys.stderr)
+
+    failed = any("error" in r for r in results.values())
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json")) as fh:
+            baseline = json.load(fh)
+        if baseline.get("settings") != settings:
+            print(f"Note: baseline settings differ: {baseline.get('settings')}", file=sys.stderr)
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        print(f"\n{len(regressions)} regression(s) against {args.compare}")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
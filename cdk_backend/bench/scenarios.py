@@ -0,0 +1,224 @@
+"""
+What each Lambda is benchmarked with: its environment, the fake AWS state
+it finds (tables, objects) and the events its lambda_handler is called with.
+
+A scenario's `fixtures(world)` runs before the handler is imported, so
+import-time reads (models, gazetteers, …) see the same state as warm calls.
+`before` hooks run ahead of every invocation of one case, outside the timed
+region, to restore state the previous invocation consumed.
+"""
+import base64
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+TOPICS    = ["prune", "fertilize", "water", "harvest", "mulch", "plant", "protect", "pollinate"]
+SUBJECTS  = ["young bushes", "highbush plants", "rabbiteye blueberries", "potted blueberries",
+             "southern highbush", "new canes", "mature plants", "berries in July"]
+PLACES    = ["Alachua County, Florida", "Bacon County, Georgia", "Hammonton, NJ", "Michigan",
+             "Oregon", "Pender County, North Carolina", "Washington", "Texas"]
+
+
+def question(i):
+    return f"How do I {TOPICS[i % len(TOPICS)]} {SUBJECTS[(i // len(TOPICS)) % len(SUBJECTS)]} (case {i})?"
+
+
+def _day_start(days_ago=0):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days_ago)
+
+
+def session_rows(n, day):
+    """Session-log items as logclassifier writes them, spread over one day."""
+    rng, rows = random.Random(7), []
+    for i in range(n):
+        ts = (day + timedelta(seconds=int(i * 86000 / max(n, 1)))).isoformat()
+        rows.append({
+            "session_id":  f"s-{i % (n // 4 or 1)}",
+            "timestamp":   f"{ts}#{i:06d}",
+            "original_ts": ts,
+            "date_bucket": ts[:10],
+            "hour_bucket": ts[:13],
+            "query":       question(rng.randrange(64)),
+            "response":    "Prune in late winter. (confidence: 92%)",
+            "location":    PLACES[i % len(PLACES)],
+            "category":    "Pruning",
+            "category_source": "local",
+        })
+    return rows
+
+
+def sqs_record(body, i=0, group=None):
+    rec = {"messageId": f"m-{i}", "eventSource": "aws:sqs", "body": json.dumps(body),
+           "receiptHandle": f"r-{i}", "attributes": {}}
+    if group:
+        rec["attributes"]["MessageGroupId"] = group
+    return rec
+
+
+def raw_email(attachment_bytes=256 * 1024):
+    pdf = base64.encodebytes(b"%PDF-1.4\n" + bytes(attachment_bytes)).decode()
+    return (
+        "From: expert@example.org\r\nTo: bot@example.org\r\nSubject: Re: question\r\n"
+        "MIME-Version: 1.0\r\nContent-Type: multipart/mixed; boundary=\"XX\"\r\n\r\n"
+        "--XX\r\nContent-Type: text/plain; charset=utf-8\r\n\r\n"
+        "QUESTION: When should I prune rabbiteye blueberries?\r\n"
+        "ANSWER: In late winter, before bud break.\r\n"
+        "--XX\r\nContent-Type: application/pdf\r\nContent-Transfer-Encoding: base64\r\n"
+        "Content-Disposition: attachment; filename=\"guide.pdf\"\r\n\r\n"
+        f"{pdf}\r\n--XX--\r\n"
+    ).encode()
+
+
+class Scenario:
+
+    def __init__(self, env, cases, fixtures=None, before=None):
+        self.env      = env
+        self.cases    = cases
+        self.fixtures = fixtures or (lambda world: None)
+        self.before   = before or {}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Fixtures
+# ──────────────────────────────────────────────────────────────────────────────
+def _document_index(world, docs=2000, answers=0):
+    from blueberry_common.answer_index import _row
+
+    rows = [{"pk": "meta", "key": "stats", "count": docs, "bytes": docs * 50_000},
+            {"pk": "meta", "key": "answers", "version": 1, "count": answers}]
+    rows += [{"pk": "doc", "key": f"guides/doc-{i:05d}.pdf", "name": f"doc-{i:05d}.pdf",
+              "name_lower": f"doc-{i:05d}.pdf", "size": 50_000,
+              "last_modified": "2026-01-01T00:00:00+00:00", "etag": "x"} for i in range(docs)]
+    rows += [_row(f"admin_answers/{i:05d}.txt", question(i), f"Approved answer {i}.") for i in range(answers)]
+    world.table("DocumentIndex", ("pk", "key"), rows)
+
+
+def _escalations(world, n=200):
+    world.table("Escalations", ("pk", "sk"))
+    spec, window = world.tables["Escalations"], 0
+    for i in range(n):
+        spec["items"].append({"pk": "pending", "sk": f"{window:010d}#{i:06d}", "window": window,
+                              "received_at": "0", "email": f"user{i % 40}@example.org",
+                              "querytext": question(i % 30), "agent_response": "I am not sure.",
+                              "urgent": False, "ttl": 0})
+    world.reindex("Escalations")
+
+
+def _email(world):
+    world.put_object("emails", "incoming/msg-1", raw_email())
+    world.table("SyncState", ("pk", "sk"))
+    _document_index(world, docs=0, answers=0)
+
+
+def _sessions(world):
+    world.table("SessionLogs", ("session_id", "timestamp"),
+                session_rows(2000, _day_start()) + session_rows(2000, _day_start(1)))
+
+
+def _export_status(world):
+    world.put_object("exports", "exports/e-1/status.json",
+                     json.dumps({"state": "done", "key": "exports/e-1/export.csv.gz", "rows": 1000}))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Scenarios
+# ──────────────────────────────────────────────────────────────────────────────
+_COMMON_KB = {"KNOWLEDGE_BASE_ID": "KB", "DATA_SOURCE_ID": "DS", "SYNC_STATE_TABLE": "SyncState"}
+
+SCENARIOS = {
+    "adminFile": Scenario(
+        env={**_COMMON_KB, "BUCKET_NAME": "data", "DOCUMENT_INDEX_TABLE": "DocumentIndex"},
+        fixtures=lambda world: _document_index(world, docs=2000),
+        cases={
+            "options":    {"httpMethod": "OPTIONS", "path": "/files"},
+            "list_files": {"httpMethod": "GET", "path": "/files", "queryStringParameters": {"limit": "50"}},
+        },
+    ),
+    "cfEvaluator": Scenario(
+        env={"WS_API_ENDPOINT": "https://fake-ws.invalid/production", "AGENT_ID": "AGENT",
+             "AGENT_ALIAS_ID": "ALIAS", "LOG_CLASSIFIER_FN_NAME": "logclassifier",
+             "LOG_QUEUE_URL": "https://fake-sqs.invalid/log-queue",
+             "APPROVED_ANSWERS": "on", "APPROVED_ANSWERS_TABLE": "DocumentIndex"},
+        fixtures=lambda world: _document_index(world, docs=0, answers=500),
+        cases={
+            "agent":        {"querytext": "Which blueberry varieties suit sandy soil?", "session_id": "s-1"},
+            "agent_stream": {"querytext": "Which blueberry varieties suit sandy soil?", "session_id": "s-1",
+                             "connectionId": "c-1", "stream": True},
+            "approved":     {"querytext": question(42), "session_id": "s-1", "connectionId": "c-1"},
+            "queue_batch":  {"Records": [sqs_record({"querytext": question(100 + i), "session_id": f"s-{i}",
+                                                     "connectionId": f"c-{i}"}, i, f"s-{i}") for i in range(4)]},
+        },
+    ),
+    "websocketHandler": Scenario(
+        env={"RESPONSE_FUNCTION_ARN": "arn:aws:lambda:us-east-1:000000000000:function:cfEvaluator",
+             "DISPATCH_MODE": "queue", "QUEUE_URL": "https://fake-sqs.invalid/chat.fifo"},
+        cases={
+            "connect":      {"requestContext": {"connectionId": "c-1", "routeKey": "$connect"}},
+            "send_message": {"requestContext": {"connectionId": "c-1", "routeKey": "sendMessage"},
+                             "body": json.dumps({"querytext": question(1), "session_id": "s-1"})},
+        },
+    ),
+    "email": Scenario(
+        env={"VERIFIED_SOURCE_EMAIL": "bot@example.org", "ADMIN_EMAIL": "admin@example.org",
+             "NOTIFY_MODE": "digest", "ESCALATIONS_TABLE": "Escalations", "NOTIFY_MAX_EMAILS_PER_HOUR": "0"},
+        fixtures=_escalations,
+        before={"flush": _escalations},
+        cases={
+            "escalation": {"actionGroup": "notify-admin", "apiPath": "/notify", "httpMethod": "POST",
+                           "requestBody": {"content": {"application/json": {"properties": [
+                               {"name": "email", "value": "user@example.org"},
+                               {"name": "querytext", "value": question(3)},
+                               {"name": "agentResponse", "value": "I am not sure."}]}}}},
+            "flush":      {"source": "aws.events", "detail-type": "Scheduled Event"},
+        },
+    ),
+    "emailReply": Scenario(
+        env={**_COMMON_KB, "SOURCE_BUCKET_NAME": "emails", "DESTINATION_BUCKET_NAME": "data",
+             "ADMIN_EMAIL": "admin@example.org", "DOCUMENT_INDEX_TABLE": "DocumentIndex"},
+        fixtures=_email,
+        cases={
+            "sqs_email": {"Records": [sqs_record({"Records": [{"s3": {
+                "bucket": {"name": "emails"}, "object": {"key": "incoming/msg-1"}}}]})]},
+        },
+    ),
+    "kbSync": Scenario(
+        env={**_COMMON_KB, "BUCKET_NAME": "data"},
+        fixtures=lambda world: world.table("SyncState", ("pk", "sk")),
+        cases={"tick": {"source": "aws.events", "detail-type": "Scheduled Event"}},
+    ),
+    "logclassifier": Scenario(
+        env={"DYNAMODB_TABLE": "SessionLogs", "BUCKET": "dashboard"},
+        cases={
+            "classify":  {"session_id": "s-1", "timestamp": "2026-01-01T10:00:00", "query": question(5),
+                          "response": "Fertilize in early spring. (confidence: 91%)", "location": "Texas"},
+            "sqs_batch": {"Records": [sqs_record({"session_id": f"s-{i}", "timestamp": f"2026-01-01T10:00:{i:02d}",
+                                                  "query": question(i), "response": "Answer. (confidence: 90%)",
+                                                  "location": PLACES[i % len(PLACES)]}, i) for i in range(10)]},
+        },
+    ),
+    "retrieveSessionLogs": Scenario(
+        env={"DYNAMODB_TABLE": "SessionLogs"},
+        fixtures=_sessions,
+        cases={
+            "analytics_today": {"queryStringParameters": {"timeframe": "today"}},
+            "transcript":      {"pathParameters": {"sessionId": "s-1"}, "queryStringParameters": {"limit": "50"}},
+        },
+    ),
+    "sessionLogs": Scenario(
+        env={"GROUP_NAME": "/aws/lambda/cfEvaluator", "BUCKET": "dashboard"},
+        before={"store_logs": lambda world: world.objects.pop(("dashboard", "session_logs/_watermark.json"), None)},
+        cases={"store_logs": {"action": "store_logs"}},
+    ),
+    "exportSessionLogs": Scenario(
+        env={"DYNAMODB_TABLE": "SessionLogs", "EXPORT_BUCKET": "exports"},
+        fixtures=_export_status,
+        cases={"status": {"httpMethod": "GET", "resource": "/export/{exportId}",
+                          "pathParameters": {"exportId": "e-1"}}},
+    ),
+    "archiveSessionLogs": Scenario(
+        env={"DYNAMODB_TABLE": "SessionLogs", "BUCKET": "dashboard"},
+        fixtures=_sessions,
+        cases={"compact_day": {"start": _day_start(1).strftime("%Y-%m-%d")}},
+    ),
+}
@@ -1,21 +1,55 @@
 import json
+import math
+import mimetypes
 import os
+import tempfile
+import time
 import urllib.parse
+import uuid
+import zipfile
 from base64 import b64decode, b64encode
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-import boto3
+from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 
+from blueberry_common import aws, kb_sync
+from blueberry_common.answer_index import AnswerIndex
+from blueberry_common.document_index import DEFAULT_PAGE_SIZE, STAGING_PREFIX, DocumentIndex
+
 # ──────────────────────────────────────────────────────────────────────────────
 #  AWS clients & env
 # ──────────────────────────────────────────────────────────────────────────────
-s3            = boto3.client("s3")
-bedrock_agent = boto3.client("bedrock-agent")
-
-BUCKET_NAME       = os.environ["BUCKET_NAME"]
-KNOWLEDGE_BASE_ID = os.environ["KNOWLEDGE_BASE_ID"]
-DATA_SOURCE_ID    = os.environ["DATA_SOURCE_ID"]
+s3            = aws.client("s3")
+ddb           = aws.resource("dynamodb")
+lambda_client = aws.client("lambda")
+
+BUCKET_NAME          = os.environ["BUCKET_NAME"]
+KNOWLEDGE_BASE_ID    = os.environ["KNOWLEDGE_BASE_ID"]
+DATA_SOURCE_ID       = os.environ["DATA_SOURCE_ID"]
+SYNC_STATE_TABLE     = os.environ["SYNC_STATE_TABLE"]
+DOCUMENT_INDEX_TABLE = os.environ["DOCUMENT_INDEX_TABLE"]
+URL_TTL              = int(os.environ.get("PRESIGNED_URL_TTL", "3600"))
+
+MiB                 = 1024 * 1024
+MULTIPART_THRESHOLD = int(os.environ.get("MULTIPART_THRESHOLD_MB", "64")) * MiB
+PART_SIZE           = int(os.environ.get("MULTIPART_PART_MB", "16")) * MiB
+MAX_PARTS           = 10000   # S3 limit per upload
+
+# batch operations
+DELETE_CHUNK        = 1000    # DeleteObjects limit
+MAX_BATCH_KEYS      = int(os.environ.get("MAX_BATCH_KEYS", "5000"))
+SYNC_DELETE_KEYS    = int(os.environ.get("SYNC_DELETE_KEYS", "100"))   # larger deletes run async
+MAX_BATCH_UPLOADS   = int(os.environ.get("MAX_BATCH_UPLOADS", "200"))
+BATCH_WORKERS       = int(os.environ.get("BATCH_WORKERS", "8"))
+MAX_ARCHIVE_ENTRIES = int(os.environ.get("MAX_ARCHIVE_ENTRIES", "2000"))
+MAX_ARCHIVE_BYTES   = int(os.environ.get("MAX_ARCHIVE_MB", "4096")) * MiB   # uncompressed
+BATCH_TTL           = 7 * 24 * 3600
+BATCH_PART_BYTES    = 300 * 1024   # per-key results per item, under DynamoDB's 400 KB item limit
+
+documents = DocumentIndex(ddb.Table(DOCUMENT_INDEX_TABLE), s3, BUCKET_NAME)
+answers   = AnswerIndex(ddb.Table(DOCUMENT_INDEX_TABLE), s3, BUCKET_NAME)
 
 # ──────────────────────────────────────────────────────────────────────────────
 #  CORS
@@ -66,6 +100,11 @@ def _extract_key(raw_path: str, path_parameters: dict) -> str:
 # ──────────────────────────────────────────────────────────────────────────────
 def lambda_handler(event, context):
     log("==== NEW INVOCATION =============================================")
+    if event.get("action") == "extract_archive":      # async self-invocation
+        return run_extract_archive(event["batch_id"], event["key"], event.get("prefix", ""))
+    if event.get("action") == "batch_delete":
+        return run_batch_delete(event["batch_id"])
+
     log("Incoming event keys        :", list(event.keys()))
     log("Resource                   :", event.get("resource"))
     log("Path                       :", event.get("path") or event.get("rawPath"))
@@ -91,24 +130,57 @@ def lambda_handler(event, context):
     # ── Route dispatch ───────────────────────────────────────────────────
     try:
         if raw_path == "/files" and http_method == "GET":
-            return handle_list_files()
+            return handle_list_files(event)
+
+        if raw_path == "/files/reindex" and http_method == "POST":
+            return handle_reindex()
+
+        # batches: one S3 call per 1,000 deletes, many uploads, one KB sync each
+        if raw_path == "/files/batch/delete" and http_method == "POST":
+            return handle_batch_delete(event, context)
+
+        if raw_path == "/files/batch/uploads" and http_method == "POST":
+            return handle_batch_start_upload(event)
+
+        if raw_path == "/files/batch/uploads/complete" and http_method == "POST":
+            return handle_batch_complete_upload(event, context)
+
+        if raw_path.startswith("/files/batch/") and http_method == "GET":
+            return handle_batch_status(path_parameters.get("batchId") or raw_path.rsplit("/", 1)[-1])
 
         if raw_path == "/files" and http_method == "POST":
             out = handle_upload_file(event)
-            sync_knowledge_base()
+            if out["statusCode"] == 200:
+                sync_knowledge_base([json.loads(out["body"])["file"]["name"]])
             return out
 
+        # direct-to-S3 uploads: presigned PUT (or multipart parts), then complete
+        if raw_path == "/files/uploads" and http_method == "POST":
+            return handle_start_upload(event)
+
+        if raw_path == "/files/uploads/complete" and http_method == "POST":
+            out = handle_complete_upload(event)
+            if out["statusCode"] == 200:
+                sync_knowledge_base([json.loads(out["body"])["file"]["name"]])
+            return out
+
+        if raw_path == "/files/uploads/abort" and http_method == "POST":
+            return handle_abort_upload(event)
+
         if raw_path.startswith("/files/") and http_method == "GET":
+            if ((event.get("queryStringParameters") or {}).get("presign") or "").lower() in ("1", "true"):
+                return handle_presign_download(raw_path, path_parameters)
             return handle_download_file(raw_path, path_parameters)
 
         if raw_path.startswith("/files/") and http_method == "DELETE":
             out = handle_delete_file(raw_path, path_parameters)
-            sync_knowledge_base()
+            if out["statusCode"] == 200:
+                sync_knowledge_base([json.loads(out["body"])["deleted_file"]])
             return out
 
         if raw_path == "/sync" and http_method == "POST":
-            sync_result = sync_knowledge_base()
-            return respond(200, {"message": "KB sync kicked off", **sync_result})
+            sync_result = sync_knowledge_base(force=True)
+            return respond(200, {"message": "KB sync queued", **sync_result})
 
         log("No matching route")
         return respond(404, {"error": "Route not found"})
@@ -121,44 +193,80 @@ def lambda_handler(event, context):
 # ──────────────────────────────────────────────────────────────────────────────
 #  Route handlers
 # ──────────────────────────────────────────────────────────────────────────────
-def sync_knowledge_base():
-    log("KB sync → start_ingestion_job()")
+def sync_knowledge_base(keys=(), force=False):
+    """
+    Record changed documents for the kbSync scheduler, which debounces them
+    into a single ingestion job (force skips the debounce window).
+    """
+    log("KB sync → request_sync()   :", len(keys), "key(s)", "force" if force else "")
     try:
-        response = bedrock_agent.start_ingestion_job(
-            knowledgeBaseId=KNOWLEDGE_BASE_ID,
-            dataSourceId=DATA_SOURCE_ID,
-        )
-        job_id = response.get("ingestionJobId")
-        log("KB sync job id            :", job_id)
-        return {"status": "success", "jobId": job_id}
+        return kb_sync.request_sync(ddb.Table(SYNC_STATE_TABLE), KNOWLEDGE_BASE_ID, DATA_SOURCE_ID,
+                                    keys, force)
     except Exception as exc:
         log("KB sync ERROR             :", exc)
         return {"status": "error", "message": str(exc)}
 
 
-def handle_list_files():
-    log("LIST files in bucket       :", BUCKET_NAME)
+def _index(action, key, *args):
+    """Keep the document manifest in step; S3 stays the source of truth if this fails."""
     try:
-        objects = s3.list_objects_v2(Bucket=BUCKET_NAME)
-        log("S3 returned #keys          :", objects.get("KeyCount", 0))
-
-        files = [
-            {
-                "key": obj["Key"],
-                "size": obj["Size"],
-                "last_modified": obj["LastModified"].isoformat(),
-                "actions": {
-                    "download": {"method": "GET", "endpoint": f"/files/{urllib.parse.quote_plus(obj['Key'])}"},
-                    "delete":   {"method": "DELETE", "endpoint": f"/files/{urllib.parse.quote_plus(obj['Key'])}"},
-                },
-            }
-            for obj in objects.get("Contents", [])
-        ]
-        return respond(200, {"files": files, "upload": {"method": "POST", "endpoint": "/files"}, "sync": {"method": "POST", "endpoint": "/sync"}})
+        getattr(documents, action)(key, *args)
+        if action == "delete":
+            answers.delete(key)      # a removed admin_answers/ file must stop being served
+    except Exception as exc:
+        log("INDEX error               :", action, key, exc)
+
+
+def handle_list_files(event):
+    """
+    One page of the document manifest.  Query parameters: prefix, q (name
+    contains), sort (name | last_modified | size), order (asc | desc),
+    limit and next_token from the previous page.
+    """
+    params = event.get("queryStringParameters") or {}
+    log("LIST params                :", params)
+    try:
+        total = documents.stats()           # also builds the manifest on first use
+        page = documents.list(
+            prefix=params.get("prefix") or "",
+            search=(params.get("q") or "").strip(),
+            sort=params.get("sort") or "name",
+            order=params.get("order") or "asc",
+            limit=int(params.get("limit") or DEFAULT_PAGE_SIZE),
+            token=params.get("next_token") or None,
+        )
+    except ValueError as exc:           # bad sort/order/limit or InvalidToken
+        return respond(400, {"error": str(exc)})
     except Exception as exc:
         log("LIST error                :", exc)
         return respond(500, {"error": str(exc)})
 
+    log("LIST returned #keys        :", len(page["files"]), "more" if page["next_token"] else "")
+    for f in page["files"]:
+        quoted = urllib.parse.quote_plus(f["key"])
+        f["actions"] = {
+            "download": {"method": "GET", "endpoint": f"/files/{quoted}?presign=true"},
+            "delete":   {"method": "DELETE", "endpoint": f"/files/{quoted}"},
+        }
+    return respond(200, {
+        **page,
+        "total":  total,
+        "upload": {"method": "POST", "endpoint": "/files/uploads", "complete": "/files/uploads/complete"},
+        "sync":   {"method": "POST", "endpoint": "/sync"},
+    })
+
+
+def handle_reindex():
+    """
+    Rebuild the manifest from a full bucket listing (objects written outside
+    this API), and the approved-answer index from admin_answers/.
+    """
+    log("REINDEX bucket             :", BUCKET_NAME)
+    result = documents.rebuild()
+    result["answers"] = answers.rebuild()["count"]
+    log("REINDEX OK                 :", result)
+    return respond(200, {"message": "Reindexed", **result})
+
 
 def handle_upload_file(event):
     body = json.loads(event["body"])
@@ -168,6 +276,7 @@ def handle_upload_file(event):
     try:
         file_content = b64decode(body["content"])
         s3.put_object(Bucket=BUCKET_NAME, Key=filename, Body=file_content, ContentType=content_type)
+        _index("put_head", filename, s3.head_object(Bucket=BUCKET_NAME, Key=filename))
         log("UPLOAD OK")
         return respond(200, {"message": "Uploaded", "file": {"name": filename, "url": f"/files/{urllib.parse.quote_plus(filename)}"}})
     except Exception as exc:
@@ -175,11 +284,150 @@ def handle_upload_file(event):
         return respond(500, {"error": str(exc)})
 
 
+def _part_size(size):
+    """Smallest whole-MiB part size >= PART_SIZE that keeps the upload within MAX_PARTS."""
+    return max(PART_SIZE, math.ceil(size / MAX_PARTS / MiB) * MiB)
+
+
+def handle_start_upload(event):
+    """
+    Presigned upload slot(s) for one document.  Up to MULTIPART_THRESHOLD a
+    single PUT URL; above it a multipart upload with one PUT URL per part.
+    The browser PUTs the bytes straight to S3 and then calls
+    /files/uploads/complete – nothing passes through this function.
+    """
+    body = json.loads(event.get("body") or "{}")
+    filename     = body.get("filename") or f"doc_{datetime.utcnow():%Y%m%d_%H%M%S}"
+    content_type = body.get("content_type") or "application/octet-stream"
+    try:
+        size = int(body.get("size") or 0)
+    except (TypeError, ValueError):
+        return respond(400, {"error": "size must be the file size in bytes"})
+    log("UPLOAD-START filename      :", filename, "size:", size)
+    return respond(200, _upload_slot(filename, content_type, size))
+
+
+def _upload_slot(filename, content_type, size):
+    if size <= MULTIPART_THRESHOLD:
+        url = s3.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": BUCKET_NAME, "Key": filename, "ContentType": content_type},
+            ExpiresIn=URL_TTL,
+        )
+        return {
+            "mode":       "single",
+            "key":        filename,
+            "url":        url,
+            "headers":    {"Content-Type": content_type},
+            "expires_in": URL_TTL,
+        }
+
+    part_size = _part_size(size)
+    upload_id = s3.create_multipart_upload(Bucket=BUCKET_NAME, Key=filename, ContentType=content_type)["UploadId"]
+    parts = [
+        {
+            "part_number": n,
+            "url": s3.generate_presigned_url(
+                "upload_part",
+                Params={"Bucket": BUCKET_NAME, "Key": filename, "UploadId": upload_id, "PartNumber": n},
+                ExpiresIn=URL_TTL,
+            ),
+        }
+        for n in range(1, math.ceil(size / part_size) + 1)
+    ]
+    log("UPLOAD-START multipart     :", filename, len(parts), "part(s) of", part_size, "bytes")
+    return {
+        "mode":       "multipart",
+        "key":        filename,
+        "upload_id":  upload_id,
+        "part_size":  part_size,
+        "parts":      parts,
+        "expires_in": URL_TTL,
+    }
+
+
+def handle_complete_upload(event):
+    """Finish a multipart upload (parts are read back from S3) and confirm the object exists."""
+    body      = json.loads(event.get("body") or "{}")
+    key       = body.get("key")
+    upload_id = body.get("upload_id")
+    if not key:
+        return respond(400, {"error": "key is required"})
+    log("UPLOAD-COMPLETE key        :", key, "upload_id:", upload_id)
+    try:
+        head = _finish_upload(key, upload_id)
+        _index("put_head", key, head)
+        log("UPLOAD-COMPLETE OK         :", head["ContentLength"], "bytes")
+        return respond(200, {
+            "message": "Uploaded",
+            "file": {"name": key, "size": head["ContentLength"], "url": f"/files/{urllib.parse.quote_plus(key)}"},
+        })
+    except ValueError as err:
+        return respond(400, {"error": str(err)})
+    except ClientError as err:
+        code = err.response["Error"]["Code"]
+        log("UPLOAD-COMPLETE ClientError:", code)
+        if code in ("NoSuchKey", "NoSuchUpload", "404"):
+            return respond(404, {"error": f'No upload found for "{key}"'})
+        return respond(500, {"error": str(err)})
+
+
+def _finish_upload(key, upload_id=None):
+    """Complete a multipart upload (parts are read back from S3); HeadObject of the result."""
+    if upload_id:
+        parts = [
+            {"PartNumber": part["PartNumber"], "ETag": part["ETag"]}
+            for page in s3.get_paginator("list_parts").paginate(
+                Bucket=BUCKET_NAME, Key=key, UploadId=upload_id)
+            for part in page.get("Parts", [])
+        ]
+        if not parts:
+            raise ValueError("No parts were uploaded")
+        s3.complete_multipart_upload(
+            Bucket=BUCKET_NAME, Key=key, UploadId=upload_id,
+            MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])},
+        )
+    return s3.head_object(Bucket=BUCKET_NAME, Key=key)
+
+
+def handle_abort_upload(event):
+    body = json.loads(event.get("body") or "{}")
+    if not body.get("key") or not body.get("upload_id"):
+        return respond(400, {"error": "key and upload_id are required"})
+    log("UPLOAD-ABORT key           :", body["key"])
+    try:
+        s3.abort_multipart_upload(Bucket=BUCKET_NAME, Key=body["key"], UploadId=body["upload_id"])
+    except ClientError as err:
+        if err.response["Error"]["Code"] != "NoSuchUpload":
+            return respond(500, {"error": str(err)})
+    return respond(200, {"message": "Aborted", "key": body["key"]})
+
+
+def handle_presign_download(raw_path, path_parameters):
+    key = _extract_key(raw_path, path_parameters)
+    log("PRESIGN-DOWNLOAD key       :", key)
+    try:
+        s3.head_object(Bucket=BUCKET_NAME, Key=key)
+    except ClientError as err:
+        if err.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return respond(404, {"error": f'File "{key}" not found'})
+        return respond(500, {"error": str(err)})
+    filename = key.rsplit("/", 1)[-1].replace('"', "")
+    url = s3.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": BUCKET_NAME, "Key": key,
+                "ResponseContentDisposition": f'attachment; filename="{filename}"'},
+        ExpiresIn=URL_TTL,
+    )
+    return respond(200, {"key": key, "url": url, "expires_in": URL_TTL})
+
+
 def handle_delete_file(raw_path, path_parameters):
     key = _extract_key(raw_path, path_parameters)
     log("DELETE key                 :", key)
     try:
         s3.delete_object(Bucket=BUCKET_NAME, Key=key)
+        _index("delete", key)
         log("DELETE OK")
         return respond(200, {"message": "Deleted", "deleted_file": key})
     except ClientError as err:
@@ -218,3 +466,310 @@ def handle_download_file(raw_path, path_parameters):
     except Exception as exc:
         log("DOWNLOAD error            :", exc)
         return respond(500, {"error": str(exc)})
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Batch operations
+# ──────────────────────────────────────────────────────────────────────────────
+def _result_parts(report):
+    """Split succeeded / failed into chunks whose JSON stays under BATCH_PART_BYTES."""
+    part, size = {"succeeded": [], "failed": []}, 0
+    for field in ("succeeded", "failed"):
+        for entry in report.get(field) or ():
+            entry_size = len(json.dumps(entry)) + 2
+            if size + entry_size > BATCH_PART_BYTES and size:
+                yield part
+                part, size = {"succeeded": [], "failed": []}, 0
+            part[field].append(entry)
+            size += entry_size
+    if size:
+        yield part
+
+
+def _save_batch(report):
+    """
+    The status row keeps state and counts; the per-key results (up to
+    MAX_BATCH_KEYS of them) go to "batch#<id>" part rows, written first.
+    """
+    batch_id, expires = report["batch_id"], int(time.time()) + BATCH_TTL
+    parts = list(_result_parts(report))
+    with documents.table.batch_writer() as batch:
+        for n, part in enumerate(parts):
+            batch.put_item(Item={"pk": f"batch#{batch_id}", "key": f"{n:05d}", "ttl": expires,
+                                 "results": json.dumps(part)})
+    summary = {k: v for k, v in report.items() if k not in ("succeeded", "failed")}
+    if "succeeded" in report or "failed" in report:
+        summary.update(succeeded_count=len(report.get("succeeded") or ()),
+                       failed_count=len(report.get("failed") or ()), parts=len(parts))
+    documents.table.put_item(Item={
+        "pk":     "batch",
+        "key":    batch_id,
+        "ttl":    expires,
+        "report": json.dumps(summary),
+    })
+    return report
+
+
+def _load_batch_results(batch_id):
+    results, kwargs = {"succeeded": [], "failed": []}, {
+        "KeyConditionExpression": Key("pk").eq(f"batch#{batch_id}"), "ConsistentRead": True}
+    while True:
+        resp = documents.table.query(**kwargs)
+        for item in resp.get("Items", []):
+            part = json.loads(item["results"])
+            results["succeeded"] += part["succeeded"]
+            results["failed"]    += part["failed"]
+        if "LastEvaluatedKey" not in resp:
+            return results
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _finish_batch(report, succeeded, failed):
+    """Index the results, queue ONE knowledge-base sync and store the report."""
+    report.update(
+        state="done",
+        succeeded=sorted(succeeded),
+        failed=sorted(failed, key=lambda f: f["key"]),
+        finished_at=datetime.utcnow().isoformat(),
+    )
+    if succeeded:
+        report["sync"] = sync_knowledge_base(succeeded)
+    log(f"BATCH {report['batch_id']} {report['kind']}:", len(succeeded), "ok,", len(failed), "failed")
+    return _save_batch(report)
+
+
+def _new_batch(kind, batch_id=None, **extra):
+    return {"batch_id": batch_id or uuid.uuid4().hex, "kind": kind, "state": "running",
+            "created_at": datetime.utcnow().isoformat(), **extra}
+
+
+def handle_batch_status(batch_id):
+    item = documents.table.get_item(Key={"pk": "batch", "key": batch_id}).get("Item")
+    if not item:
+        return respond(404, {"error": f"Unknown batch {batch_id}"})
+    report = json.loads(item["report"])
+    if report.pop("parts", None) is not None:
+        report.update(_load_batch_results(batch_id))
+    return respond(200, report)
+
+
+def handle_batch_delete(event, context):
+    """
+    POST {"keys": [...]} – DeleteObjects 1,000 keys at a time.  Up to
+    SYNC_DELETE_KEYS keys are deleted within the request; larger batches
+    are queued for an async self-invocation (202) – poll GET /files/batch/{batch_id}.
+    """
+    keys = list(dict.fromkeys(k for k in json.loads(event.get("body") or "{}").get("keys") or [] if k))
+    if not keys:
+        return respond(400, {"error": "keys is required"})
+    if len(keys) > MAX_BATCH_KEYS:
+        return respond(400, {"error": f"At most {MAX_BATCH_KEYS} keys per batch"})
+    log("BATCH-DELETE #keys         :", len(keys))
+
+    report = _new_batch("delete", requested=len(keys))
+    if len(keys) <= SYNC_DELETE_KEYS:
+        return respond(200, _delete_keys(report, keys))
+
+    # the key list can exceed the async payload limit, so it waits in the table
+    with documents.table.batch_writer() as batch:
+        for n, part in enumerate(_key_parts(keys)):
+            batch.put_item(Item={"pk": f"batch#{report['batch_id']}#keys", "key": f"{n:05d}",
+                                 "ttl": int(time.time()) + BATCH_TTL, "keys": json.dumps(part)})
+    _save_batch(report)
+    lambda_client.invoke(
+        FunctionName=context.function_name,
+        InvocationType="Event",
+        Payload=json.dumps({"action": "batch_delete", "batch_id": report["batch_id"]}),
+    )
+    log("BATCH-DELETE queued        :", report["batch_id"])
+    return respond(202, report)
+
+
+def _key_parts(keys):
+    """Split a key list into chunks whose JSON stays under BATCH_PART_BYTES."""
+    part, size = [], 0
+    for key in keys:
+        key_size = len(json.dumps(key)) + 2
+        if size + key_size > BATCH_PART_BYTES and part:
+            yield part
+            part, size = [], 0
+        part.append(key)
+        size += key_size
+    if part:
+        yield part
+
+
+def run_batch_delete(batch_id):
+    """Delete the keys a queued batch stored in its "batch#<id>#keys" rows."""
+    keys, kwargs = [], {"KeyConditionExpression": Key("pk").eq(f"batch#{batch_id}#keys"),
+                        "ConsistentRead": True}
+    while True:
+        resp = documents.table.query(**kwargs)
+        for item in resp.get("Items", []):
+            keys += json.loads(item["keys"])
+        if "LastEvaluatedKey" not in resp:
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    log("BATCH-DELETE running       :", batch_id, len(keys), "key(s)")
+    return _delete_keys(_new_batch("delete", batch_id, requested=len(keys)), keys)
+
+
+def _delete_keys(report, keys):
+    deleted, failed = [], []
+    for start in range(0, len(keys), DELETE_CHUNK):
+        chunk = keys[start:start + DELETE_CHUNK]
+        try:
+            resp = s3.delete_objects(Bucket=BUCKET_NAME, Delete={"Objects": [{"Key": k} for k in chunk]})
+        except ClientError as err:
+            failed += [{"key": k, "error": err.response["Error"]["Code"]} for k in chunk]
+            continue
+        deleted += [d["Key"] for d in resp.get("Deleted", [])]
+        failed  += [{"key": e["Key"], "error": e.get("Code", "Error")} for e in resp.get("Errors", [])]
+
+    for key in deleted:
+        _index("delete", key)
+    return _finish_batch(report, deleted, failed)
+
+
+def handle_batch_start_upload(event):
+    """
+    POST {"files": [{filename, content_type, size}, ...]}
+        one presigned slot (single or multipart, as /files/uploads) per file;
+    POST {"archive": {filename, size}}
+        one slot for a .zip that is extracted into the bucket on complete.
+    """
+    body = json.loads(event.get("body") or "{}")
+    try:
+        if body.get("archive"):
+            archive, batch_id = body["archive"], uuid.uuid4().hex
+            slot = _upload_slot(f"{STAGING_PREFIX}{batch_id}.zip", "application/zip",
+                                int(archive.get("size") or 0))
+            log("BATCH-UPLOAD archive       :", archive.get("filename"), "→", slot["key"])
+            return respond(200, {"batch_id": batch_id, "slots": [slot]})
+
+        files = body.get("files") or []
+        if not files:
+            return respond(400, {"error": "files or archive is required"})
+        if len(files) > MAX_BATCH_UPLOADS:
+            return respond(400, {"error": f"At most {MAX_BATCH_UPLOADS} files per batch"})
+        slots = [
+            _upload_slot(f.get("filename") or f"doc_{datetime.utcnow():%Y%m%d_%H%M%S}_{n}",
+                         f.get("content_type") or "application/octet-stream", int(f.get("size") or 0))
+            for n, f in enumerate(files)
+        ]
+    except (TypeError, ValueError):
+        return respond(400, {"error": "size must be the file size in bytes"})
+    log("BATCH-UPLOAD #files        :", len(slots))
+    return respond(200, {"batch_id": uuid.uuid4().hex, "slots": slots})
+
+
+def handle_batch_complete_upload(event, context):
+    """
+    POST {"batch_id", "uploads": [{key, upload_id?}, ...]}
+        completes every slot (a bounded thread pool) and returns the report;
+    POST {"batch_id", "archive_key", "prefix"?}
+        starts the extraction asynchronously – poll GET /files/batch/{batch_id}.
+    """
+    body     = json.loads(event.get("body") or "{}")
+    batch_id = body.get("batch_id") or uuid.uuid4().hex
+
+    if body.get("archive_key"):
+        key = body["archive_key"]
+        if key != f"{STAGING_PREFIX}{batch_id}.zip":
+            return respond(400, {"error": "archive_key does not belong to this batch"})
+        if body.get("upload_id"):
+            try:
+                _finish_upload(key, body["upload_id"])
+            except (ClientError, ValueError) as err:
+                return respond(400, {"error": f"Archive upload incomplete: {err}"})
+        report = _save_batch(_new_batch("archive", batch_id, prefix=_clean_prefix(body.get("prefix"))))
+        lambda_client.invoke(
+            FunctionName=context.function_name,
+            InvocationType="Event",
+            Payload=json.dumps({"action": "extract_archive", "batch_id": batch_id,
+                                "key": key, "prefix": report["prefix"]}),
+        )
+        log("BATCH-ARCHIVE queued       :", batch_id)
+        return respond(202, report)
+
+    uploads = [u for u in body.get("uploads") or [] if u.get("key")]
+    if not uploads:
+        return respond(400, {"error": "uploads or archive_key is required"})
+    log("BATCH-COMPLETE #uploads    :", len(uploads))
+
+    def complete(upload):
+        try:
+            return upload["key"], _finish_upload(upload["key"], upload.get("upload_id")), None
+        except (ClientError, ValueError) as err:
+            return upload["key"], None, str(err)
+
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+        results = list(pool.map(complete, uploads))
+
+    succeeded, failed = [], []
+    for key, head, error in results:
+        if error:
+            failed.append({"key": key, "error": error})
+        else:
+            _index("put_head", key, head)
+            succeeded.append(key)
+    return respond(200, _finish_batch(_new_batch("upload", batch_id, requested=len(uploads)), succeeded, failed))
+
+
+def _clean_prefix(prefix):
+    parts = [p for p in (prefix or "").replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    return "/".join(parts) + "/" if parts else ""
+
+
+def _archive_key(prefix, name):
+    """Bucket key for a zip entry, or None for directories, hidden files and unsafe paths."""
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".")]
+    if not parts or ".." in parts or parts[0] == "__MACOSX" or any(p.startswith(".") for p in parts):
+        return None
+    return prefix + "/".join(parts)
+
+
+def run_extract_archive(batch_id, key, prefix=""):
+    """Extract a staged .zip into the bucket with a bounded pool of uploaders."""
+    report = _new_batch("archive", batch_id, prefix=prefix)
+    succeeded, failed = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "archive.zip")
+        try:
+            s3.download_file(BUCKET_NAME, key, path)
+            with zipfile.ZipFile(path) as zf:
+                entries = [(i, _archive_key(prefix, i.filename)) for i in zf.infolist() if not i.is_dir()]
+        except (ClientError, zipfile.BadZipFile) as err:
+            report.update(state="failed", error=f"Cannot read archive: {err}")
+            return _save_batch(report)
+
+        entries = [(info, k) for info, k in entries if k]
+        if len(entries) > MAX_ARCHIVE_ENTRIES or sum(i.file_size for i, _ in entries) > MAX_ARCHIVE_BYTES:
+            report.update(state="failed", error=f"Archive exceeds {MAX_ARCHIVE_ENTRIES} files "
+                                                f"or {MAX_ARCHIVE_BYTES // MiB} MB uncompressed")
+            s3.delete_object(Bucket=BUCKET_NAME, Key=key)
+            return _save_batch(report)
+        log("BATCH-ARCHIVE extracting   :", len(entries), "file(s) from", key)
+
+        def upload(entry):
+            info, dest = entry
+            try:
+                # one ZipFile per upload: reads from a shared handle are not thread-safe
+                with zipfile.ZipFile(path) as zf, zf.open(info) as src:
+                    s3.upload_fileobj(src, BUCKET_NAME, dest, ExtraArgs={
+                        "ContentType": mimetypes.guess_type(dest)[0] or "application/octet-stream"})
+                return dest, s3.head_object(Bucket=BUCKET_NAME, Key=dest), None
+            except Exception as err:
+                return dest, None, str(err)
+
+        with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+            results = list(pool.map(upload, entries))
+
+    for dest, head, error in results:
+        if error:
+            failed.append({"key": dest, "error": error})
+        else:
+            _index("put_head", dest, head)
+            succeeded.append(dest)
+    s3.delete_object(Bucket=BUCKET_NAME, Key=key)
+    return _finish_batch(report, succeeded, failed)
@@ -0,0 +1,102 @@
+"""
+Query the Parquet archive written by handler.py.
+
+Reads straight from S3 or, much faster for repeated analysis, from a local
+copy (`aws s3 sync s3://<bucket>/archive/session_logs ./archive`).  Only
+the columns a query needs are read, the date range prunes whole
+date=YYYY-MM-DD partitions before any file is opened, and category /
+location filters are pushed down to the Parquet row-group statistics.
+
+    python archive_query.py ./archive --trend year
+    python archive_query.py ./archive --trend month --start 2024-01-01 --category "Pest Management"
+    python archive_query.py s3://my-bucket/archive/session_logs --trend year --by location
+
+As a module:
+
+    from archive_query import open_archive, scan, trend
+    archive = open_archive("./archive")
+    trend(archive, period="year", start="2023-01-01")   # {category: {"2023": n, "2024": n}}
+"""
+import argparse
+import json
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+PERIODS      = {"day": 10, "month": 7, "year": 4}   # prefix length of the date partition
+
+
+def open_archive(root):
+    """Dataset over the archive at a local path or an s3://bucket/prefix URI."""
+    if root.startswith("s3://"):
+        from pyarrow import fs
+        return ds.dataset(root[len("s3://"):], format="parquet", partitioning=PARTITIONING,
+                          filesystem=fs.S3FileSystem())
+    return ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+
+
+def predicate(start=None, end=None, category=None, location=None):
+    """Filter expression; dates are YYYY-MM-DD strings (inclusive)."""
+    clauses = []
+    if start:
+        clauses.append(ds.field("date") >= start)
+    if end:
+        clauses.append(ds.field("date") <= end)
+    for name, value in (("category", category), ("location", location)):
+        if value:
+            values = [value] if isinstance(value, str) else list(value)
+            clauses.append(ds.field(name).isin(values))
+    expr = None
+    for clause in clauses:
+        expr = clause if expr is None else expr & clause
+    return expr
+
+
+def scan(archive, columns, start=None, end=None, category=None, location=None):
+    """Arrow table with just `columns` (plus the date partition) of matching rows."""
+    wanted = list(dict.fromkeys([*columns, "date"]))
+    return archive.to_table(columns=wanted, filter=predicate(start, end, category, location))
+
+
+def trend(archive, period="year", by="category", start=None, end=None, category=None, location=None):
+    """Turn counts per `by` value per period – {value: {period: count}}."""
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    table = scan(archive, [by], start, end, category, location)
+    keys  = pc.utf8_slice_codeunits(table["date"], 0, PERIODS[period])
+    values = table[by]
+    if pa.types.is_dictionary(values.type):
+        values = values.cast(pa.string())
+    counts = (pa.table({"value": pc.fill_null(values, "Unknown"), "period": keys})
+              .group_by(["value", "period"])
+              .aggregate([([], "count_all")]))
+
+    result = {}
+    for value, key, count in zip(*(counts[c].to_pylist() for c in ("value", "period", "count_all"))):
+        result.setdefault(value, {})[key] = count
+    return {value: dict(sorted(periods.items())) for value, periods in sorted(result.items())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trends over the Parquet session-log archive")
+    parser.add_argument("root", help="local archive directory or s3://bucket/archive/session_logs")
+    parser.add_argument("--trend", choices=sorted(PERIODS), default="year")
+    parser.add_argument("--by", choices=["category", "location"], default="category")
+    parser.add_argument("--start", help="first day, YYYY-MM-DD")
+    parser.add_argument("--end", help="last day, YYYY-MM-DD")
+    parser.add_argument("--category", action="append", help="only these categories (repeatable)")
+    parser.add_argument("--location", action="append", help="only these locations (repeatable)")
+    args = parser.parse_args()
+
+    began = time.perf_counter()
+    result = trend(open_archive(args.root), args.trend, args.by, args.start, args.end,
+                   args.category, args.location)
+    print(json.dumps(result, indent=2))
+    print(f"({time.perf_counter() - began:.3f} s)")
+
+
+if __name__ == "__main__":
+    main()
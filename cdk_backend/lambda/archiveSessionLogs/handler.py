@@ -0,0 +1,195 @@
+"""
+Columnar archive of chat history.
+
+Once a day this compacts the previous (UTC) day into one Parquet file
+
+    s3://<bucket>/archive/session_logs/date=YYYY-MM-DD/part-0.parquet
+
+from two sources:
+
+  * BlueberriesDashboardSessionlogs – the classified turns (read through
+    the ByDateBucket index + BatchGetItem), and
+  * the raw log dumps in the same bucket – the legacy daily arrays
+    session_logs/{date}.json and the incremental
+    session_logs/date={date}/part-*.ndjson.gz objects – which fill in
+    turns that never reached the table (they carry no category).
+
+A turn found in both is kept once, from the table.  Category, location and
+the provenance columns are dictionary-encoded, and rows are sorted by
+category/location so row-group statistics let readers skip row groups on
+those columns.  Re-running a day overwrites its file, so backfills are
+safe:  {"start": "2024-01-01", "end": "2024-12-31"}.
+
+pyarrow comes from the AWS SDK for pandas layer.  archive_query.py is the
+matching read side.
+"""
+import gzip
+import io
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from blueberry_common import aws
+from blueberry_common.session_rows import iter_rows
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Env & AWS clients
+# ──────────────────────────────────────────────────────────────────────────────
+TABLE_NAME     = os.environ["DYNAMODB_TABLE"]
+BUCKET         = os.environ["BUCKET"]
+LOGS_PREFIX    = os.environ.get("LOGS_PREFIX", "session_logs/")
+ARCHIVE_PREFIX = os.environ.get("ARCHIVE_PREFIX", "archive/session_logs/")
+MAX_DAYS       = int(os.environ.get("ARCHIVE_MAX_DAYS", "366"))   # per invocation
+
+s3  = aws.client("s3")
+ddb = aws.resource("dynamodb")
+
+DICTIONARY_COLUMNS = ["location", "category", "category_source", "source"]
+SCHEMA = pa.schema([
+    ("session_id",      pa.string()),
+    ("ts",              pa.timestamp("us", tz="UTC")),
+    ("query",           pa.string()),
+    ("response",        pa.string()),
+    ("location",        pa.dictionary(pa.int32(), pa.string())),
+    ("category",        pa.dictionary(pa.int32(), pa.string())),
+    ("category_source", pa.dictionary(pa.int32(), pa.string())),
+    ("confidence",      pa.float64()),
+    ("source",          pa.dictionary(pa.int32(), pa.string())),
+])
+
+
+def log(*msg):
+    print("[ARCHIVE]", *msg)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Sources
+# ──────────────────────────────────────────────────────────────────────────────
+def _parse_ts(raw):
+    try:
+        return datetime.fromisoformat(str(raw).split("#", 1)[0].replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def _turn_key(session_id, ts, query):
+    return session_id, ts.isoformat(timespec="milliseconds") if ts else "", query
+
+
+def table_turns(day):
+    for item in iter_rows(ddb, TABLE_NAME, day, day):
+        confidence = item.get("confidence")
+        yield {
+            "session_id":      item["session_id"],
+            "ts":              _parse_ts(item.get("original_ts") or item["timestamp"]),
+            "query":           item.get("query", ""),
+            "response":        item.get("response", ""),
+            "location":        item.get("location") or None,
+            "category":        item.get("category") or None,
+            "category_source": item.get("category_source") or None,
+            "confidence":      float(confidence) if confidence is not None else None,
+            "source":          "dynamodb",
+        }
+
+
+def _dump_keys(day):
+    date_str = day.strftime("%Y-%m-%d")
+    keys = [f"{LOGS_PREFIX}{date_str}.json"]
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=BUCKET, Prefix=f"{LOGS_PREFIX}date={date_str}/"):
+        keys.extend(obj["Key"] for obj in page.get("Contents", []))
+    return keys
+
+
+def dump_turns(day):
+    """Turns from the raw log dumps of one day (missing objects are skipped)."""
+    for key in _dump_keys(day):
+        try:
+            body = s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+        except s3.exceptions.NoSuchKey:
+            continue
+        if key.endswith(".gz"):
+            records = (json.loads(line) for line in gzip.decompress(body).splitlines() if line.strip())
+        else:
+            records = json.loads(body)
+        for record in records:
+            confidence = record.get("confidence")
+            yield {
+                "session_id":      record.get("session_id", ""),
+                "ts":              _parse_ts(record.get("timestamp", "")),
+                "query":           record.get("query", ""),
+                "response":        record.get("response", ""),
+                "location":        record.get("location") or None,
+                "category":        None,
+                "category_source": None,
+                "confidence":      float(confidence) if isinstance(confidence, (int, float)) else None,
+                "source":          "log",
+            }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Compaction
+# ──────────────────────────────────────────────────────────────────────────────
+def day_table(day):
+    """All turns of one day as an Arrow table (table rows win over log rows)."""
+    turns = {}
+    for turn in table_turns(day):
+        turns[_turn_key(turn["session_id"], turn["ts"], turn["query"])] = turn
+    from_table = len(turns)
+    for turn in dump_turns(day):
+        turns.setdefault(_turn_key(turn["session_id"], turn["ts"], turn["query"]), turn)
+    log(f"{day:%Y-%m-%d}: {from_table} turn(s) from the table, {len(turns) - from_table} only in the log dumps")
+
+    rows = sorted(turns.values(), key=lambda t: (t["category"] or "", t["location"] or "", t["ts"] or datetime.min))
+    columns = {name: [row[name] for row in rows] for name in SCHEMA.names}
+    return pa.Table.from_pydict(columns, schema=SCHEMA)
+
+
+def partition_key(day):
+    return f"{ARCHIVE_PREFIX}date={day:%Y-%m-%d}/part-0.parquet"
+
+
+def compact_day(day):
+    table = day_table(day)
+    if table.num_rows == 0:
+        return 0
+    buf = io.BytesIO()
+    pq.write_table(table, buf, compression="zstd", use_dictionary=DICTIONARY_COLUMNS,
+                   row_group_size=64 * 1024, write_statistics=True)
+    s3.put_object(Bucket=BUCKET, Key=partition_key(day), Body=buf.getvalue(),
+                  ContentType="application/vnd.apache.parquet")
+    log(f"{day:%Y-%m-%d}: {table.num_rows} row(s), {buf.tell()} bytes -> {partition_key(day)}")
+    return table.num_rows
+
+
+def days_to_compact(event):
+    """Yesterday by default; {"start","end"} (inclusive, YYYY-MM-DD) for a backfill."""
+    if event.get("start"):
+        start = datetime.strptime(event["start"], "%Y-%m-%d")
+        end   = datetime.strptime(event.get("end") or event["start"], "%Y-%m-%d")
+    else:
+        start = end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    if end < start:
+        raise ValueError("end is before start")
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    if len(days) > MAX_DAYS:
+        raise ValueError(f"at most {MAX_DAYS} days per invocation")
+    return days
+
+
+def lambda_handler(event, context):
+    event = event or {}
+    try:
+        days = days_to_compact(event)
+    except ValueError as e:
+        return {"statusCode": 400, "body": json.dumps({"error": str(e)})}
+
+    began, counts = time.time(), {}
+    for day in days:
+        counts[day.strftime("%Y-%m-%d")] = compact_day(day)
+    log(f"Compacted {len(days)} day(s), {sum(counts.values())} row(s) in {time.time() - began:.1f} s")
+    return {"statusCode": 200, "body": json.dumps({"rows": counts})}
@@ -0,0 +1,58 @@
+"""
+Zero-LLM fast path: serve an admin-approved answer when the question
+matches one the experts already answered (blueberry_common.answer_index).
+
+The BM25 postings are loaded once per container and reloaded only when
+the index version in the table moves; the version itself is checked at
+most every APPROVED_ANSWERS_REFRESH seconds, so a hit costs no AWS call at
+all most of the time.
+"""
+import os
+import time
+
+from blueberry_common.answer_index import AnswerIndex, Bm25Index
+
+APPROVED_ANSWERS          = os.environ.get("APPROVED_ANSWERS", "off").lower()
+APPROVED_ANSWERS_TABLE    = os.environ.get("APPROVED_ANSWERS_TABLE", "")
+APPROVED_ANSWER_THRESHOLD = float(os.environ.get("APPROVED_ANSWER_THRESHOLD", "0.8"))
+APPROVED_ANSWERS_REFRESH  = int(os.environ.get("APPROVED_ANSWERS_REFRESH", "60"))
+
+
+class ApprovedAnswers:
+
+    def __init__(self, source, threshold=APPROVED_ANSWER_THRESHOLD, refresh_seconds=APPROVED_ANSWERS_REFRESH):
+        self.source          = source
+        self.threshold       = threshold
+        self.refresh_seconds = refresh_seconds
+        self.index           = Bm25Index()
+        self.version         = None
+        self.checked_at      = 0.0
+
+    def refresh(self, force=False):
+        if not force and time.time() - self.checked_at < self.refresh_seconds:
+            return
+        self.checked_at = time.time()
+        version = self.source.version()
+        if version is None or (version == self.version and not force):
+            return
+        self.index   = self.source.load()
+        self.version = version
+        print(f"[APPROVED] loaded {len(self.index)} answers (version {version})")
+
+    def lookup(self, query):
+        """The approved match dict when confident enough, else None."""
+        self.refresh()
+        match = self.index.match(query)
+        if match and match["confidence"] >= self.threshold:
+            print(f"[APPROVED] hit confidence={match['confidence']:.3f} key={match['key']}")
+            return match
+        if match:
+            print(f"[APPROVED] miss best_confidence={match['confidence']:.3f}")
+        return None
+
+
+def build_approved_answers(dynamodb=None):
+    """Create the fast path configured by APPROVED_ANSWERS, or None when disabled."""
+    if APPROVED_ANSWERS != "on" or not APPROVED_ANSWERS_TABLE:
+        return None
+    return ApprovedAnswers(AnswerIndex(dynamodb.Table(APPROVED_ANSWERS_TABLE)))
@@ -1,21 +1,47 @@
 import json
-import boto3
 import os
 from datetime import datetime
 
+from blueberry_common import aws
+from blueberry_common.bedrock_limiter import get_limiter
+from blueberry_common.text import is_follow_up
+from approved_answers import build_approved_answers
+from queue_worker import is_sqs_batch, process_queue_batch
+from semantic_cache import build_cache
+from single_flight import SingleFlight, build_single_flight
+from ws_stream import WebSocketStreamer
+
 # Initialize AWS clients
-bedrock_agent = boto3.client('bedrock-agent-runtime')
-api_gateway = boto3.client('apigatewaymanagementapi', endpoint_url=os.environ['WS_API_ENDPOINT'])
-lambda_client = boto3.client('lambda')
+bedrock_agent = aws.client('bedrock-agent-runtime')
+api_gateway = aws.client('apigatewaymanagementapi', endpoint_url=os.environ['WS_API_ENDPOINT'])
+lambda_client = aws.client('lambda')
+sqs_client = aws.client('sqs')
+bedrock_runtime = aws.client('bedrock-runtime')
+dynamodb = aws.resource('dynamodb')
 
 agent_id = os.environ["AGENT_ID"]
 agent_alias_id = os.environ["AGENT_ALIAS_ID"] 
 LOG_CLASSIFIER_FN_NAME = os.environ['LOG_CLASSIFIER_FN_NAME']
+LOG_QUEUE_URL = os.environ.get('LOG_QUEUE_URL', '')
+STREAM_RESPONSES = os.environ.get('STREAM_RESPONSES', 'false').lower() == 'true'
+
+# Shared throttle-aware limiter for the agent (limits are per Bedrock resource)
+agent_limiter = get_limiter(f"agent:{agent_id}")
+
+# Admin-approved answers, matched lexically before anything else (None when APPROVED_ANSWERS=off)
+approved_answers = build_approved_answers(dynamodb)
+
+# Semantic answer cache (None when SEMANTIC_CACHE=off)
+answer_cache = build_cache(bedrock_runtime, dynamodb)
+
+# Coalescing of identical in-flight questions (None when SINGLE_FLIGHT=off)
+flights = build_single_flight(dynamodb)
 
 def send_ws_response(connection_id, response):
+    """Post one frame; returns whether it reached the connection."""
     if connection_id and connection_id.startswith("mock-"):
         print(f"[TEST] Skipping WebSocket send for mock ID: {connection_id}")
-        return
+        return True
     print(f"Sending response to WebSocket connection: {connection_id}")
     print(f"Response: {response}")
     try:
@@ -23,10 +49,76 @@ def send_ws_response(connection_id, response):
             ConnectionId=connection_id,
             Data=json.dumps(response)
         )
+        return True
     except Exception as e:
         print(f"WebSocket error: {str(e)}")
+        return False
+
+def log_turn(payload):
+    """Hand the turn to logclassifier – batched through its queue when configured."""
+    if LOG_QUEUE_URL:
+        sqs_client.send_message(QueueUrl=LOG_QUEUE_URL, MessageBody=json.dumps(payload))
+        return
+    lambda_client.invoke(
+        FunctionName   = LOG_CLASSIFIER_FN_NAME,
+        InvocationType = 'Event',
+        Payload        = json.dumps(payload).encode('utf-8')
+    )
+
+def run_agent(query, session_id, connection_id, stream):
+    """
+    Invoke the agent through the shared Bedrock limiter (backoff + adaptive
+    concurrency) and return (full_response, streamer).
+    """
+    attempt = {"streamer": None}
+
+    def invoke():
+        request = {
+            "agentId": agent_id,
+            "agentAliasId": agent_alias_id,
+            "sessionId": session_id,
+            "inputText": query,
+        }
+        if stream:
+            request["streamingConfigurations"] = {"streamFinalResponse": True}
+            attempt["streamer"] = WebSocketStreamer(api_gateway, connection_id)
+
+        response = bedrock_agent.invoke_agent(**request)
+
+        chunks = (
+            event['chunk']['bytes'].decode('utf-8')
+            for event in response['completion']
+            if 'chunk' in event
+        )
+        if stream:
+            for text in chunks:
+                attempt["streamer"].write(text)
+            return attempt["streamer"].text
+        return "".join(chunks)
+
+    full_response = agent_limiter.call(
+        invoke,
+        session_id=session_id,
+        # Once frames have reached the client a retry would repeat them
+        can_retry=lambda: not (attempt["streamer"] and attempt["streamer"].started),
+    )
+    return full_response, attempt["streamer"]
+
+def _time_left(context, margin=5.0):
+    """Seconds this invocation may still block, or None when unknown."""
+    remaining = getattr(context, "get_remaining_time_in_millis", None)
+    return max(1.0, remaining() / 1000 - margin) if remaining else None
 
 def lambda_handler(event, context):
+    # Queue-backed dispatch: a batch of sendMessage payloads from websocketHandler
+    if is_sqs_batch(event):
+        # a turn whose error could not be reported raises, so the queue retries it
+        return process_queue_batch(event, lambda message, ctx: handle_message(message, ctx, raise_errors=True),
+                                   context=context)
+    return handle_message(event, context)
+
+def handle_message(event, context, raise_errors=False):
+    connection_id = None
     try:
         query = event.get("querytext", "").strip()
         connection_id = event.get("connectionId")
@@ -35,30 +127,73 @@ def lambda_handler(event, context):
         
         print(f"Received Query - Session: {session_id}, Location: {location}, Query: {query}")
 
-        max_retries = 2
-        full_response = ""
+        # Stream when the client asks for it (or when forced on for everyone)
+        stream = bool(connection_id) and (STREAM_RESPONSES or bool(event.get("stream")))
+
+        # The agent keeps a session's earlier turns, so a follow-up ("what about
+        # Oregon?") has an answer of its own: never share one across chats
+        # (cache or single-flight)
+        follow_up = is_follow_up(query)
 
-        for attempt in range(max_retries):
+        # Questions the experts already answered: no embedding, no agent
+        approved = None
+        if approved_answers:
             try:
-                response = bedrock_agent.invoke_agent(
-                    agentId=agent_id,
-                    agentAliasId=agent_alias_id,
-                    sessionId=session_id,
-                    inputText=query
-                )
+                approved = approved_answers.lookup(query)
+            except Exception as e:
+                print(f"Approved answer lookup failed: {str(e)}")
+
+        # Serve near-duplicate questions from the semantic cache
+        cached, cache_vector = None, None
+        if approved:
+            cached = approved["answer"]
+        elif answer_cache and not follow_up:
+            try:
+                cached, _, cache_vector = answer_cache.lookup(query, location or "")
+            except Exception as e:
+                print(f"Semantic cache lookup failed: {str(e)}")
 
-                full_response = "".join(
-                    event['chunk']['bytes'].decode('utf-8')
-                    for event in response['completion']
-                    if 'chunk' in event
+        # Identical question already being answered? Follow that run instead
+        flight = None
+        if cached is None and flights and connection_id and not follow_up:
+            try:
+                flight = flights.enter(
+                    SingleFlight.key_for(query, location or ""),
+                    context.aws_request_id,
+                    connection_id,
                 )
-                break
+                if flight.role == "follower":
+                    flights.wait(flight, _time_left(context))
             except Exception as e:
-                print(f"Attempt {attempt + 1} failed: {str(e)}")
-                if attempt == max_retries - 1:
-                    raise
+                print(f"Single-flight coordination failed, answering independently: {str(e)}")
+                flight = None
+
+        streamer = None
+        if cached is not None:
+            full_response = cached
+            if stream:
+                streamer = WebSocketStreamer(api_gateway, connection_id)
+                streamer.write(cached)
+        elif flight and flight.role == "done":
+            full_response = flight.result
+        else:
+            try:
+                full_response, streamer = run_agent(query, session_id, connection_id, stream)
+            except Exception:
+                if flight and flight.role == "leader":
+                    flights.abandon(flight)
+                raise
+            if flight and flight.role == "leader":
+                followers = flights.finish(flight, full_response) - {connection_id}
+                print(f"Fanning out to {len(followers)} follower connection(s)")
+                for follower_id in followers:
+                    send_ws_response(follower_id, {'responsetext': full_response})
+            if answer_cache and not follow_up:
+                try:
+                    answer_cache.store(query, full_response, location or "", cache_vector)
+                except Exception as e:
+                    print(f"Semantic cache store failed: {str(e)}")
 
-        
         print(full_response)
 
         payload = {
@@ -66,7 +201,9 @@ def lambda_handler(event, context):
             "timestamp": datetime.utcnow().isoformat(),
             "query": query,
             "response": full_response,
-            "location": location
+            "location": location,
+            "cached": cached is not None,
+            "approved": bool(approved)
         }
 
         print(payload)
@@ -75,20 +212,23 @@ def lambda_handler(event, context):
                 'responsetext': full_response,
                  }
 
-        if connection_id:
+        if flight and flight.delivered:
+            print("Answer already fanned out by the leader")
+        elif streamer:
+            streamer.close()
+        elif connection_id:
             send_ws_response(connection_id, result)
 
-        lambda_client.invoke(
-            FunctionName   = LOG_CLASSIFIER_FN_NAME,
-            InvocationType = 'Event',
-            Payload        = json.dumps(payload).encode('utf-8')
-        )
+        log_turn(payload)
 
         return {'statusCode': 200, 'body': json.dumps(result)}
 
     except Exception as e:
         print(f"Error: {str(e)}")
         error_msg = {'error': str(e)}
-        if connection_id:
-            send_ws_response(connection_id, error_msg)
+        delivered = bool(connection_id) and send_ws_response(connection_id, error_msg)
+        # once the client has the error frame a retry would only answer twice
+        # and hold up the session's later messages
+        if raise_errors and not delivered:
+            raise
         return {'statusCode': 500, 'body': json.dumps(error_msg)}
\ No newline at end of file
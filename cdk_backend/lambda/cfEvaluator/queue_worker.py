@@ -0,0 +1,58 @@
+"""
+Consumes websocketHandler's FIFO queue in batches.
+
+Records are grouped by MessageGroupId (one group per chat session).  Groups
+run concurrently on a bounded pool; records inside a group run strictly in
+order.  A record that raises is reported back through batchItemFailures
+together with every later record of its group, so SQS redelivers them in
+the original order.
+"""
+import json
+import os
+import types
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUE_WORKER_CONCURRENCY = int(os.environ.get("QUEUE_WORKER_CONCURRENCY", "4"))
+
+
+def is_sqs_batch(event):
+    records = event.get("Records") or []
+    return bool(records) and records[0].get("eventSource") == "aws:sqs"
+
+
+def _group_records(records):
+    groups = OrderedDict()
+    for rec in records:
+        group = rec.get("attributes", {}).get("MessageGroupId") or rec["messageId"]
+        groups.setdefault(group, []).append(rec)
+    return groups
+
+
+def _run_group(records, handle, context=None):
+    """Process one session's records in order; returns the ids that must be retried."""
+    for i, rec in enumerate(records):
+        try:
+            message = json.loads(rec["body"])
+            # every message gets its own request id (single-flight owner, default session)
+            record_context = types.SimpleNamespace(aws_request_id=rec["messageId"])
+            if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+                record_context.get_remaining_time_in_millis = context.get_remaining_time_in_millis
+            handle(message, record_context)
+        except Exception as e:
+            print(f"[QUEUE] record {rec['messageId']} failed: {str(e)}")
+            return [r["messageId"] for r in records[i:]]
+    return []
+
+
+def process_queue_batch(event, handle, concurrency=QUEUE_WORKER_CONCURRENCY, context=None):
+    """Run handle(message, context) over an SQS batch; returns the partial-batch response."""
+    groups = _group_records(event["Records"])
+    print(f"[QUEUE] batch of {len(event['Records'])} record(s) in {len(groups)} session group(s)")
+
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(groups)))) as pool:
+        for failed in pool.map(lambda recs: _run_group(recs, handle, context), groups.values()):
+            failures.extend(failed)
+
+    return {"batchItemFailures": [{"itemIdentifier": mid} for mid in failures]}
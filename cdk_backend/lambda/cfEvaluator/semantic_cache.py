@@ -0,0 +1,285 @@
+"""
+Semantic answer cache that sits in front of invoke_agent.
+
+A question is embedded (Titan Text Embeddings v2, 256 dims, normalised) and
+compared by cosine similarity against previously answered questions; above
+SEMANTIC_CACHE_THRESHOLD the stored answer is served instead of running the
+agent.  The vector index itself is pluggable:
+
+  memory   – per-container only (tests / local runs)
+  file     – same, persisted to a JSON file (offline runs)
+  dynamodb – write-through to the answer cache table, loaded per container
+
+Every backend honours TTL + LRU eviction.  When a KB ingestion job
+completes, kbSync bumps the "__generation__" counter in the cache table
+(blueberry_common.cache_generation), which drops every entry written
+against an older generation.
+
+Follow-up questions (blueberry_common.text.is_follow_up) bypass the cache:
+their answer depends on the earlier turns of their own chat.
+"""
+import json
+import operator
+import os
+import re
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+
+from blueberry_common.bedrock_limiter import get_limiter
+from blueberry_common.cache_generation import GENERATION_KEY, bump_generation, current_generation
+from blueberry_common.text import normalize_query
+
+SEMANTIC_CACHE         = os.environ.get("SEMANTIC_CACHE", "off").lower()
+SEMANTIC_CACHE_TABLE   = os.environ.get("SEMANTIC_CACHE_TABLE", "")
+SEMANTIC_CACHE_PATH    = os.environ.get("SEMANTIC_CACHE_PATH", "/tmp/semantic_cache.json")
+SIMILARITY_THRESHOLD   = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+CACHE_TTL_SECONDS      = int(os.environ.get("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+CACHE_MAX_ENTRIES      = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+CACHE_REFRESH_SECONDS  = int(os.environ.get("SEMANTIC_CACHE_REFRESH", "300"))
+EMBED_MODEL_ID         = os.environ.get("EMBED_MODEL_ID", "amazon.titan-embed-text-v2:0")
+EMBED_DIMENSIONS       = 256
+
+# Only answers the agent was confident about are worth re-serving; the
+# "(confidence: X%)" suffix is part of the agent instruction.
+_CONFIDENCE_RE = re.compile(r"confidence:\s*(\d+)\s*%", re.IGNORECASE)
+MIN_CACHE_CONFIDENCE = int(os.environ.get("SEMANTIC_CACHE_MIN_CONFIDENCE", "90"))
+
+
+def is_cacheable(answer):
+    m = _CONFIDENCE_RE.search(answer or "")
+    return bool(m) and int(m.group(1)) >= MIN_CACHE_CONFIDENCE
+
+
+def cosine(a, b):
+    # vectors are stored L2-normalised, so the dot product is the cosine
+    return sum(map(operator.mul, a, b))
+
+
+def vector_from_bytes(raw):
+    vec = array("f")
+    vec.frombytes(bytes(getattr(raw, "value", raw)))   # boto3 wraps B as Binary
+    return vec
+
+
+def titan_embedder(bedrock_runtime, model_id=EMBED_MODEL_ID, dimensions=EMBED_DIMENSIONS):
+    """Return an embed(text) -> array('f') function backed by Bedrock."""
+    limiter = get_limiter(f"model:{model_id}")
+
+    def embed(text):
+        resp = limiter.call(lambda: bedrock_runtime.invoke_model(
+            modelId=model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=json.dumps({"inputText": text, "dimensions": dimensions, "normalize": True}),
+        ))
+        return array("f", json.loads(resp["body"].read())["embedding"])
+    return embed
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Index backends
+# ──────────────────────────────────────────────────────────────────────────────
+class InMemoryIndex:
+    """Brute-force cosine index with TTL and LRU eviction."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.generation  = 0
+        self.entries     = OrderedDict()   # key -> entry dict, oldest first
+
+    def _expired(self, entry, now):
+        return now - entry["created_at"] > self.ttl_seconds
+
+    def search(self, vector, scope=""):
+        """Best (score, entry) for this scope, or (0.0, None)."""
+        now = time.time()
+        best_key, best_score = None, 0.0
+        for key, entry in list(self.entries.items()):
+            if self._expired(entry, now):
+                del self.entries[key]
+                continue
+            if entry["scope"] != scope:
+                continue
+            score = cosine(vector, entry["vector"])
+            if score > best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return 0.0, None
+        self.entries.move_to_end(best_key)
+        return best_score, self.entries[best_key]
+
+    def put(self, vector, query, answer, scope=""):
+        key = uuid.uuid4().hex
+        entry = {
+            "vector":     vector,
+            "query":      query,
+            "answer":     answer,
+            "scope":      scope,
+            "created_at": time.time(),
+            "generation": self.generation,
+        }
+        self._insert(key, entry)
+        return key, entry
+
+    def _insert(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self):
+        self.generation += 1
+        self.entries.clear()
+
+
+class FileIndex(InMemoryIndex):
+    """InMemoryIndex persisted to a local JSON file after every change."""
+
+    def __init__(self, path=SEMANTIC_CACHE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        if os.path.exists(path):
+            with open(path) as fh:
+                data = json.load(fh)
+            self.generation = data.get("generation", 0)
+            for key, entry in data.get("entries", []):
+                entry["vector"] = array("f", entry["vector"])
+                self._insert(key, entry)
+
+    def _save(self):
+        data = {
+            "generation": self.generation,
+            "entries": [
+                (key, {**entry, "vector": list(entry["vector"])})
+                for key, entry in self.entries.items()
+            ],
+        }
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(data, fh)
+        os.replace(tmp, self.path)
+
+    def put(self, vector, query, answer, scope=""):
+        out = super().put(vector, query, answer, scope)
+        self._save()
+        return out
+
+    def invalidate(self):
+        super().invalidate()
+        self._save()
+
+
+class DynamoDBIndex(InMemoryIndex):
+    """
+    InMemoryIndex loaded from / written through to a DynamoDB table
+    (PK cache_key, TTL attribute "ttl").  The generation counter is checked
+    on every lookup; other containers' writes are picked up by a full
+    reload every CACHE_REFRESH_SECONDS.
+    """
+
+    def __init__(self, table, refresh_seconds=CACHE_REFRESH_SECONDS, **kwargs):
+        super().__init__(**kwargs)
+        self.table           = table
+        self.refresh_seconds = refresh_seconds
+        self.loaded_at       = 0.0
+
+    def refresh(self, force=False):
+        generation = current_generation(self.table)
+        stale = time.time() - self.loaded_at >= self.refresh_seconds
+        if not (force or stale or generation != self.generation):
+            return
+        self.generation = generation
+        self.entries.clear()
+
+        now, kwargs = time.time(), {}
+        while True:
+            resp = self.table.scan(**kwargs)
+            for it in resp.get("Items", []):
+                if it["cache_key"] == GENERATION_KEY or int(it.get("generation", 0)) != self.generation:
+                    continue
+                entry = {
+                    "vector":     vector_from_bytes(it["vector"]),
+                    "query":      it["query"],
+                    "answer":     it["answer"],
+                    "scope":      it.get("scope", ""),
+                    "created_at": float(it["created_at"]),
+                    "generation": self.generation,
+                }
+                if not self._expired(entry, now):
+                    self._insert(it["cache_key"], entry)
+            if "LastEvaluatedKey" not in resp:
+                break
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+        self.loaded_at = time.time()
+        print(f"[CACHE] loaded {len(self.entries)} entries (generation {self.generation})")
+
+    def search(self, vector, scope=""):
+        self.refresh()
+        return super().search(vector, scope)
+
+    def put(self, vector, query, answer, scope=""):
+        key, entry = super().put(vector, query, answer, scope)
+        self.table.put_item(Item={
+            "cache_key":  key,
+            "vector":     vector.tobytes(),
+            "query":      query,
+            "answer":     answer,
+            "scope":      scope,
+            "created_at": str(entry["created_at"]),
+            "generation": entry["generation"],
+            "ttl":        int(entry["created_at"] + self.ttl_seconds),
+        })
+        return key, entry
+
+    def invalidate(self):
+        bump_generation(self.table)
+        self.refresh(force=True)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Cache facade
+# ──────────────────────────────────────────────────────────────────────────────
+class SemanticCache:
+
+    def __init__(self, index, embed, threshold=SIMILARITY_THRESHOLD):
+        self.index     = index
+        self.embed     = embed
+        self.threshold = threshold
+
+    def lookup(self, query, scope=""):
+        """
+        Returns (answer, score, vector).  answer is None on a miss; the
+        vector is handed back so store() doesn't have to embed twice.
+        """
+        vector = self.embed(normalize_query(query))
+        score, entry = self.index.search(vector, normalize_query(scope))
+        if entry and score >= self.threshold:
+            print(f"[CACHE] hit score={score:.3f} cached_query={entry['query']!r}")
+            return entry["answer"], score, vector
+        print(f"[CACHE] miss best_score={score:.3f}")
+        return None, score, vector
+
+    def store(self, query, answer, scope="", vector=None):
+        if not is_cacheable(answer):
+            return False
+        if vector is None:
+            vector = self.embed(normalize_query(query))
+        self.index.put(vector, query, answer, normalize_query(scope))
+        return True
+
+
+def build_cache(bedrock_runtime=None, dynamodb=None):
+    """Create the cache configured by SEMANTIC_CACHE, or None when disabled."""
+    if SEMANTIC_CACHE == "memory":
+        index = InMemoryIndex()
+    elif SEMANTIC_CACHE == "file":
+        index = FileIndex()
+    elif SEMANTIC_CACHE == "dynamodb" and SEMANTIC_CACHE_TABLE:
+        index = DynamoDBIndex(dynamodb.Table(SEMANTIC_CACHE_TABLE))
+    else:
+        return None
+    return SemanticCache(index, titan_embedder(bedrock_runtime))
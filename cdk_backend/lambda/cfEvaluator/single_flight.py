@@ -0,0 +1,327 @@
+"""
+Single-flight coalescing of identical in-flight questions.
+
+The first cfEvaluator invocation for a normalised (question, location) key
+becomes the leader and runs the agent.  Invocations that arrive while it is
+running register their connectionId as followers and wait; the leader fans
+its answer out to them with post_to_connection when it finishes.  The
+leader holds a lease that a background heartbeat renews every third of it
+while the agent runs – if the leader dies (or fails) the lease lapses and a
+waiting follower takes the flight over and runs the agent itself.
+Followers wait for as long as their own invocation has time left.
+Follow-up questions never join a flight: two chats asking "what about
+clay?" are asking different things (blueberry_common.text.is_follow_up).
+
+The coordination store is pluggable:
+
+  local    – in-process dict (tests / local runs)
+  dynamodb – the in-flight table (PK flight_key, TTL attribute "ttl")
+"""
+import os
+import threading
+import time
+from decimal import Decimal
+
+from semantic_cache import normalize_query
+
+SINGLE_FLIGHT          = os.environ.get("SINGLE_FLIGHT", "off").lower()
+SINGLE_FLIGHT_TABLE    = os.environ.get("SINGLE_FLIGHT_TABLE", "")
+LEASE_SECONDS          = int(os.environ.get("SINGLE_FLIGHT_LEASE", "30"))      # renewed while running
+POLL_SECONDS           = float(os.environ.get("SINGLE_FLIGHT_POLL", "0.5"))
+MAX_WAIT_SECONDS       = int(os.environ.get("SINGLE_FLIGHT_MAX_WAIT", "100"))  # when the deadline is unknown
+RESULT_TTL_SECONDS     = int(os.environ.get("SINGLE_FLIGHT_RESULT_TTL", "30"))
+
+RUNNING, DONE, FAILED = "running", "done", "failed"
+ENTER_ATTEMPTS = 5
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Coordination stores
+# ──────────────────────────────────────────────────────────────────────────────
+class LocalFlightStore:
+    """Thread-safe in-process stand-in for the DynamoDB table."""
+
+    def __init__(self):
+        self.items = {}
+        self.lock  = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            return dict(item, followers=set(item["followers"])) if item else None
+
+    def try_lead(self, key, owner, lease_seconds, now):
+        with self.lock:
+            item = self.items.get(key)
+            if item and not _can_lead(item, now):
+                return False
+            self.items[key] = {
+                "state":         RUNNING,
+                "leader":        owner,
+                "lease_expires": now + lease_seconds,
+                "followers":     item["followers"] if item and item["state"] != DONE else set(),
+            }
+            return True
+
+    def renew(self, key, owner, lease_seconds, now):
+        with self.lock:
+            item = self.items.get(key)
+            if not item or item["leader"] != owner or item["state"] != RUNNING:
+                return False
+            item["lease_expires"] = now + lease_seconds
+            return True
+
+    def join(self, key, connection_id):
+        with self.lock:
+            item = self.items.get(key)
+            if not item or item["state"] != RUNNING:
+                return False
+            item["followers"].add(connection_id)
+            return True
+
+    def complete(self, key, owner, result, now):
+        """Mark done; returns the followers to fan out to, or None if we lost the lease."""
+        with self.lock:
+            item = self.items.get(key)
+            if not item or item["leader"] != owner:
+                return None
+            followers = item["followers"]
+            item.update(state=DONE, result=result, done_at=now, followers=set())
+            return followers
+
+    def fail(self, key, owner):
+        with self.lock:
+            item = self.items.get(key)
+            if item and item["leader"] == owner:
+                item["state"] = FAILED
+
+
+class DynamoDBFlightStore:
+    """Same contract as LocalFlightStore, backed by conditional writes."""
+
+    def __init__(self, table):
+        self.table = table
+        self.ConditionalCheckFailed = table.meta.client.exceptions.ConditionalCheckFailedException
+
+    def get(self, key):
+        item = self.table.get_item(Key={"flight_key": key}, ConsistentRead=True).get("Item")
+        if not item:
+            return None
+        return {
+            "state":         item["state"],
+            "leader":        item.get("leader"),
+            "lease_expires": float(item.get("lease_expires", 0)),
+            "done_at":       float(item.get("done_at", 0)),
+            "result":        item.get("result"),
+            "followers":     set(item.get("followers") or ()),
+        }
+
+    def try_lead(self, key, owner, lease_seconds, now):
+        try:
+            self.table.update_item(
+                Key={"flight_key": key},
+                UpdateExpression=(
+                    "SET #s = :running, leader = :me, lease_expires = :lease, #ttl = :ttl "
+                    "REMOVE #r, done_at"
+                ),
+                ConditionExpression=(
+                    "attribute_not_exists(flight_key) OR #s = :failed "
+                    "OR (#s = :running AND lease_expires < :now) "
+                    "OR (#s = :done AND done_at < :fresh)"
+                ),
+                ExpressionAttributeNames={"#s": "state", "#r": "result", "#ttl": "ttl"},
+                ExpressionAttributeValues={
+                    ":running": RUNNING,
+                    ":failed":  FAILED,
+                    ":done":    DONE,
+                    ":me":      owner,
+                    ":now":     _num(now),
+                    ":lease":   _num(now + lease_seconds),
+                    ":fresh":   _num(now - RESULT_TTL_SECONDS),
+                    ":ttl":     int(now + lease_seconds + 3600),
+                },
+            )
+            return True
+        except self.ConditionalCheckFailed:
+            return False
+
+    def renew(self, key, owner, lease_seconds, now):
+        try:
+            self.table.update_item(
+                Key={"flight_key": key},
+                UpdateExpression="SET lease_expires = :lease, #ttl = :ttl",
+                ConditionExpression="leader = :me AND #s = :running",
+                ExpressionAttributeNames={"#s": "state", "#ttl": "ttl"},
+                ExpressionAttributeValues={
+                    ":me":      owner,
+                    ":running": RUNNING,
+                    ":lease":   _num(now + lease_seconds),
+                    ":ttl":     int(now + lease_seconds + 3600),
+                },
+            )
+            return True
+        except self.ConditionalCheckFailed:
+            return False
+
+    def join(self, key, connection_id):
+        try:
+            self.table.update_item(
+                Key={"flight_key": key},
+                UpdateExpression="ADD followers :conn",
+                ConditionExpression="#s = :running",
+                ExpressionAttributeNames={"#s": "state"},
+                ExpressionAttributeValues={":conn": {connection_id}, ":running": RUNNING},
+            )
+            return True
+        except self.ConditionalCheckFailed:
+            return False
+
+    def complete(self, key, owner, result, now):
+        try:
+            resp = self.table.update_item(
+                Key={"flight_key": key},
+                UpdateExpression="SET #s = :done, #r = :result, done_at = :now REMOVE followers",
+                ConditionExpression="leader = :me",
+                ExpressionAttributeNames={"#s": "state", "#r": "result"},
+                ExpressionAttributeValues={
+                    ":done": DONE, ":result": result, ":now": _num(now), ":me": owner,
+                },
+                ReturnValues="ALL_OLD",
+            )
+        except self.ConditionalCheckFailed:
+            return None
+        return set(resp.get("Attributes", {}).get("followers") or ())
+
+    def fail(self, key, owner):
+        try:
+            self.table.update_item(
+                Key={"flight_key": key},
+                UpdateExpression="SET #s = :failed",
+                ConditionExpression="leader = :me",
+                ExpressionAttributeNames={"#s": "state"},
+                ExpressionAttributeValues={":failed": FAILED, ":me": owner},
+            )
+        except self.ConditionalCheckFailed:
+            pass
+
+
+def _num(value):
+    return Decimal(str(round(value, 3)))
+
+
+def _can_lead(item, now):
+    if item["state"] == FAILED:
+        return True
+    if item["state"] == RUNNING:
+        return item["lease_expires"] < now
+    return item.get("done_at", 0) < now - RESULT_TTL_SECONDS
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Coordinator
+# ──────────────────────────────────────────────────────────────────────────────
+class Flight:
+    """
+    role is "leader", "follower", "done" (result is set) or "solo" (could not
+    coordinate – run the agent without fanning out).
+    """
+
+    def __init__(self, key, owner, role, result=None, delivered=False):
+        self.key       = key
+        self.owner     = owner
+        self.role      = role
+        self.result    = result
+        self.delivered = delivered   # the leader already fanned the result out to us
+        self.heartbeat = None        # threading.Event stopping the lease renewal
+
+
+class SingleFlight:
+
+    def __init__(self, store, lease_seconds=LEASE_SECONDS, poll_seconds=POLL_SECONDS,
+                 max_wait_seconds=MAX_WAIT_SECONDS):
+        self.store            = store
+        self.lease_seconds    = lease_seconds
+        self.poll_seconds     = poll_seconds
+        self.max_wait_seconds = max_wait_seconds
+
+    @staticmethod
+    def key_for(query, scope=""):
+        return f"{normalize_query(scope)}|{normalize_query(query)}"
+
+    def enter(self, key, owner, connection_id):
+        """Become leader, register as follower, or pick up a just-finished result."""
+        for _ in range(ENTER_ATTEMPTS):
+            if self.store.try_lead(key, owner, self.lease_seconds, time.time()):
+                print(f"[FLIGHT] leader for {key!r}")
+                return self._lead(Flight(key, owner, "leader"))
+            if self.store.join(key, connection_id):
+                print(f"[FLIGHT] following {key!r}")
+                return Flight(key, owner, "follower")
+            item = self.store.get(key)
+            if item and item["state"] == DONE:
+                return Flight(key, owner, "done", result=item["result"])
+            # Item changed state between our calls – go round again
+        return Flight(key, owner, "solo")
+
+    def _lead(self, flight):
+        """Renew the lease every third of it until finish() / abandon()."""
+        stop = flight.heartbeat = threading.Event()
+
+        def beat():
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    if not self.store.renew(flight.key, flight.owner, self.lease_seconds, time.time()):
+                        print(f"[FLIGHT] lease on {flight.key!r} lost – stopping heartbeat")
+                        return
+                except Exception as e:
+                    print(f"[FLIGHT] lease renewal failed: {str(e)}")
+
+        threading.Thread(target=beat, daemon=True).start()
+        return flight
+
+    def _stop(self, flight):
+        if flight.heartbeat:
+            flight.heartbeat.set()
+
+    def wait(self, flight, max_wait_seconds=None):
+        """
+        Block a follower until the leader finishes, for at most
+        max_wait_seconds (the caller's remaining time; default
+        SINGLE_FLIGHT_MAX_WAIT).  Returns the same flight, now either "done"
+        or – after a lease takeover – "leader".
+        """
+        deadline = time.monotonic() + (max_wait_seconds or self.max_wait_seconds)
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_seconds)
+            item = self.store.get(flight.key)
+            if item and item["state"] == DONE:
+                flight.role, flight.result, flight.delivered = "done", item["result"], True
+                return flight
+            if item is None or _can_lead(item, time.time()):
+                if self.store.try_lead(flight.key, flight.owner, self.lease_seconds, time.time()):
+                    print(f"[FLIGHT] took over {flight.key!r} (leader gone)")
+                    flight.role = "leader"
+                    return self._lead(flight)
+        raise TimeoutError(f"Timed out waiting for in-flight answer to {flight.key!r}")
+
+    def finish(self, flight, result):
+        """Record the leader's result; returns follower connectionIds to fan out to."""
+        self._stop(flight)
+        followers = self.store.complete(flight.key, flight.owner, result, time.time())
+        if followers is None:
+            print(f"[FLIGHT] lost lease on {flight.key!r} – another leader will fan out")
+            return set()
+        return followers
+
+    def abandon(self, flight):
+        self._stop(flight)
+        self.store.fail(flight.key, flight.owner)
+
+
+def build_single_flight(dynamodb=None):
+    """Create the coordinator configured by SINGLE_FLIGHT, or None when disabled."""
+    if SINGLE_FLIGHT == "local":
+        return SingleFlight(LocalFlightStore())
+    if SINGLE_FLIGHT == "dynamodb" and SINGLE_FLIGHT_TABLE:
+        return SingleFlight(DynamoDBFlightStore(dynamodb.Table(SINGLE_FLIGHT_TABLE)))
+    return None
@@ -0,0 +1,95 @@
+import json
+import os
+import time
+
+# Coalescing knobs – small enough that the first words show up at once,
+# large enough that we don't fire one post_to_connection per token.
+STREAM_FLUSH_BYTES = int(os.environ.get("STREAM_FLUSH_BYTES", "200"))
+STREAM_FLUSH_MS    = int(os.environ.get("STREAM_FLUSH_MS", "150"))
+
+
+class WebSocketStreamer:
+    """
+    Forwards agent chunks to one WebSocket connection as they arrive.
+
+    Frames on the wire:
+      {"type": "delta", "seq": 0, "text": "..."}
+      {"type": "delta", "seq": 1, "text": "..."}
+      {"type": "end",   "seq": 2, "responsetext": "<full answer>"}
+
+    The very first chunk is flushed immediately so time-to-first-byte is the
+    agent's first chunk; after that text is buffered until it reaches
+    STREAM_FLUSH_BYTES or STREAM_FLUSH_MS has passed since the last frame.
+    """
+
+    def __init__(self, api_gateway, connection_id,
+                 flush_bytes=STREAM_FLUSH_BYTES, flush_ms=STREAM_FLUSH_MS):
+        self.api_gateway   = api_gateway
+        self.connection_id = connection_id
+        self.flush_bytes   = flush_bytes
+        self.flush_ms      = flush_ms
+
+        self.seq        = 0
+        self.parts      = []     # everything received, for the final frame
+        self.buffer     = []     # not yet sent
+        self.buffered   = 0
+        self.last_flush = None
+        self.gone       = False  # client went away – keep collecting, stop posting
+
+    @property
+    def started(self):
+        """True once at least one frame has been posted to the client."""
+        return self.seq > 0
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def _post(self, frame):
+        if self.gone or not self.connection_id:
+            return
+        if self.connection_id.startswith("mock-"):
+            print(f"[TEST] Skipping WebSocket frame {frame.get('seq')} for mock ID: {self.connection_id}")
+            self.seq += 1
+            return
+        try:
+            self.api_gateway.post_to_connection(
+                ConnectionId=self.connection_id,
+                Data=json.dumps(frame)
+            )
+        except self.api_gateway.exceptions.GoneException:
+            print(f"WebSocket {self.connection_id} gone – dropping remaining frames")
+            self.gone = True
+            return
+        except Exception as e:
+            print(f"WebSocket error: {str(e)}")
+            return
+        self.seq += 1
+
+    def flush(self):
+        if not self.buffer:
+            return
+        text = "".join(self.buffer)
+        self.buffer, self.buffered = [], 0
+        self._post({"type": "delta", "seq": self.seq, "text": text})
+        self.last_flush = time.monotonic()
+
+    def write(self, text):
+        if not text:
+            return
+        self.parts.append(text)
+        self.buffer.append(text)
+        self.buffered += len(text)
+
+        if self.last_flush is None:
+            self.flush()
+            return
+
+        elapsed_ms = (time.monotonic() - self.last_flush) * 1000
+        if self.buffered >= self.flush_bytes or elapsed_ms >= self.flush_ms:
+            self.flush()
+
+    def close(self, **extra):
+        """Flush whatever is left and send the terminating "end" frame."""
+        self.flush()
+        self._post({"type": "end", "seq": self.seq, "responsetext": self.text, **extra})
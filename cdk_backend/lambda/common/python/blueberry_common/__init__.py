@@ -0,0 +1 @@
+"""Code shared by the Blueberry Lambdas (deployed as the common layer)."""
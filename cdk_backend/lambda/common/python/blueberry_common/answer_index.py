@@ -0,0 +1,208 @@
+"""
+Lexical (BM25) index of the admin-approved answers.
+
+emailReply files every expert answer as admin_answers/<ts>_<digest>.txt
+("Q: …\\nA: …\\n\\nApproved by: …"), but it only reaches users after a KB
+ingestion and an agent run.  This index lets cfEvaluator serve the approved
+answer itself when a question matches one the experts already answered.
+
+The pairs live in the document index table next to the document manifest,
+one row per answer file:
+
+    pk = "answer", key = <object key>, question, answer, terms {term: tf}, length
+
+so adding an answer is a single put_item – concurrent emailReply batches
+never race on a shared artifact.  A "meta"/"answers" row carries a version
+counter bumped on every change; readers keep the postings in memory and
+reload only when the version moves.  When the meta row is missing (first
+deploy) ensure() rebuilds the rows from the bucket once.
+
+Scores are plain BM25 over the question text.  Raw BM25 is not comparable
+across queries, so match() also reports a confidence in [0, 1]: the lower of
+ * coverage  – share of the query's IDF mass found in the approved question
+ * closeness – BM25(query, doc) / BM25(doc question, doc)
+which is only close to 1 when the two questions say the same thing.
+"""
+import math
+import re
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key
+
+from blueberry_common.text import tokenize
+
+ANSWER_PK     = "answer"
+META_PK       = "meta"
+VERSION_KEY   = "answers"
+ANSWER_PREFIX = "admin_answers/"
+
+K1 = 1.2
+B  = 0.75
+
+_ANSWER_RE = re.compile(r"^Q:\s*(.*?)\nA:\s*(.*?)(?:\n\s*\nApproved by:.*)?\s*$", re.DOTALL)
+
+
+def term_counts(text):
+    counts = {}
+    for term in tokenize(text):
+        counts[term] = counts.get(term, 0) + 1
+    return counts
+
+
+def parse_answer(body):
+    """(question, answer) from an admin_answers/ file, or (None, None)."""
+    m = _ANSWER_RE.match((body or "").replace("\r\n", "\n").strip())
+    if not m or not m.group(1).strip() or not m.group(2).strip():
+        return None, None
+    return m.group(1).strip(), m.group(2).strip()
+
+
+def _row(key, question, answer):
+    terms = term_counts(question)
+    return {
+        "pk":       ANSWER_PK,
+        "key":      key,
+        "question": question,
+        "answer":   answer,
+        "terms":    terms,
+        "length":   sum(terms.values()),
+    }
+
+
+class Bm25Index:
+    """Immutable in-memory inverted index over approved question/answer rows."""
+
+    def __init__(self, rows=(), k1=K1, b=B):
+        self.k1, self.b = k1, b
+        self.docs     = []        # (key, question, answer)
+        self.lengths  = []
+        self.postings = {}        # term -> [(doc, tf), ...]
+        for row in rows:
+            terms = {t: int(tf) for t, tf in (row.get("terms") or {}).items()}
+            if not terms:
+                continue
+            doc = len(self.docs)
+            self.docs.append((row["key"], row["question"], row["answer"]))
+            self.lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, []).append((doc, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.idf = {t: self._idf(len(p)) for t, p in self.postings.items()}
+        self.self_scores = [0.0] * len(self.docs)
+        for term, posting in self.postings.items():
+            for doc, tf in posting:
+                self.self_scores[doc] += self.idf[term] * self._saturate(tf, doc)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _idf(self, df):
+        n = len(self.docs)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _saturate(self, tf, doc):
+        norm = 1 - self.b + self.b * self.lengths[doc] / self.avg_length
+        return tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+    def match(self, query):
+        """
+        Best approved pair for the query:
+        {"key", "question", "answer", "score", "confidence"} or None.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.docs:
+            return None
+        unseen = self._idf(0)
+        total  = sum(self.idf.get(t, unseen) for t in terms)
+
+        scores, covered = {}, {}
+        for term in terms:
+            idf = self.idf.get(term)
+            for doc, tf in self.postings.get(term, ()):
+                scores[doc]  = scores.get(doc, 0.0) + idf * self._saturate(tf, doc)
+                covered[doc] = covered.get(doc, 0.0) + idf
+        if not scores:
+            return None
+
+        best = max(scores, key=scores.get)
+        key, question, answer = self.docs[best]
+        closeness  = scores[best] / self.self_scores[best] if self.self_scores[best] else 0.0
+        confidence = min(covered[best] / total, closeness, 1.0)
+        return {"key": key, "question": question, "answer": answer,
+                "score": scores[best], "confidence": confidence}
+
+
+class AnswerIndex:
+    """Rows of the approved-answer index in the document index table."""
+
+    def __init__(self, table, s3=None, bucket=""):
+        self.table  = table
+        self.s3     = s3
+        self.bucket = bucket
+
+    # ---- writes ----------------------------------------------------------
+    def _bump(self, count=None):
+        names, values = {"#v": "version"}, {":one": 1}
+        expression = "ADD #v :one"
+        if count is not None:
+            expression += " SET #c = :count"
+            names["#c"], values[":count"] = "count", count
+        self.table.update_item(
+            Key={"pk": META_PK, "key": VERSION_KEY},
+            UpdateExpression=expression,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+    def put(self, key, question, answer):
+        self.ensure()
+        self.table.put_item(Item=_row(key, question, answer))
+        self._bump()
+
+    def delete(self, key):
+        if not key.startswith(ANSWER_PREFIX):
+            return
+        old = self.table.delete_item(Key={"pk": ANSWER_PK, "key": key}, ReturnValues="ALL_OLD").get("Attributes")
+        if old:
+            self._bump()
+
+    def rebuild(self):
+        """Replace the rows with the answers currently in the bucket."""
+        listed = {}
+        for page in self.s3.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=ANSWER_PREFIX):
+            for obj in page.get("Contents", []):
+                body = self.s3.get_object(Bucket=self.bucket, Key=obj["Key"])["Body"].read()
+                question, answer = parse_answer(body.decode("utf-8", errors="replace"))
+                if question:
+                    listed[obj["Key"]] = _row(obj["Key"], question, answer)
+        stale = [row["key"] for row in self.rows() if row["key"] not in listed]
+        with self.table.batch_writer(overwrite_by_pkeys=["pk", "key"]) as batch:
+            for row in listed.values():
+                batch.put_item(Item=row)
+            for key in stale:
+                batch.delete_item(Key={"pk": ANSWER_PK, "key": key})
+        self._bump(count=len(listed))
+        return {"count": len(listed), "removed": len(stale)}
+
+    def ensure(self):
+        """Build the rows once if the index never was (needs s3 + bucket)."""
+        if self.version() is None and self.s3 is not None:
+            self.rebuild()
+
+    # ---- reads -----------------------------------------------------------
+    def version(self):
+        item = self.table.get_item(Key={"pk": META_PK, "key": VERSION_KEY}).get("Item")
+        return None if item is None else int(item.get("version", 0))
+
+    def rows(self):
+        kwargs = {"KeyConditionExpression": Key("pk").eq(ANSWER_PK)}
+        while True:
+            resp = self.table.query(**kwargs)
+            for item in resp.get("Items", []):
+                yield {k: int(v) if isinstance(v, Decimal) else v for k, v in item.items()}
+            if "LastEvaluatedKey" not in resp:
+                return
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    def load(self):
+        return Bm25Index(self.rows())
@@ -0,0 +1,127 @@
+"""
+Lazily created AWS clients shared by every handler.
+
+Handlers used to build all their boto3 clients at import, with default
+botocore settings, so even an OPTIONS preflight or a $connect paid for
+clients it never touched.  Here a module-level
+
+    s3  = aws.client("s3")
+    ddb = aws.resource("dynamodb")
+    table = ddb.Table(TABLE_NAME)
+
+only returns a proxy; the real client (and boto3 itself) is built on first
+attribute access, once per container, and shared by every caller asking
+for the same service / region / endpoint.  resource(...).Table(name) stays
+lazy too, so module-level table handles cost nothing either.
+
+Every client gets TCP keep-alive, a connection pool sized for the thread
+pools the handlers run, and per-service timeouts and retries (adaptive
+retries, except for Bedrock, whose throttling is already handled by
+blueberry_common.bedrock_limiter).  The time spent creating each client is
+printed once and kept in init_times().
+"""
+import threading
+import time
+
+DEFAULTS = {
+    "connect_timeout": 3,
+    "read_timeout":    30,
+    "attempts":        5,         # total, including the first call
+    "retry_mode":      "adaptive",
+    "pool":            10,
+}
+
+SERVICE_CONFIG = {
+    "dynamodb":                {"connect_timeout": 2, "read_timeout": 10, "attempts": 8, "pool": 50},
+    "s3":                      {"read_timeout": 60, "pool": 50},          # batch workers x transfer threads
+    "lambda":                  {"read_timeout": 10, "attempts": 3},
+    "sqs":                     {"read_timeout": 25},
+    "apigatewaymanagementapi": {"connect_timeout": 2, "read_timeout": 5, "attempts": 3, "pool": 25},
+    # bedrock_limiter retries with backoff and adapts its concurrency itself
+    "bedrock-agent-runtime":   {"read_timeout": 120, "attempts": 1, "retry_mode": "standard", "pool": 25},
+    "bedrock-runtime":         {"read_timeout": 60, "attempts": 1, "retry_mode": "standard", "pool": 25},
+}
+
+_lock       = threading.RLock()
+_instances  = {}
+_init_ms    = {}
+_generation = 0       # bumped by reset() so existing proxies rebuild
+
+
+def client_config(service):
+    """botocore Config for a service: keep-alive, pool size, timeouts, retries."""
+    from botocore.config import Config
+
+    opts = {**DEFAULTS, **SERVICE_CONFIG.get(service, {})}
+    return Config(
+        tcp_keepalive=True,
+        max_pool_connections=opts["pool"],
+        connect_timeout=opts["connect_timeout"],
+        read_timeout=opts["read_timeout"],
+        retries={"mode": opts["retry_mode"], "total_max_attempts": opts["attempts"]},
+    )
+
+
+def _create(kind, service, kwargs):
+    key = (kind, service, tuple(sorted(kwargs.items())))
+    with _lock:
+        if key not in _instances:
+            started = time.perf_counter()
+            import boto3
+
+            factory = boto3.client if kind == "client" else boto3.resource
+            _instances[key] = factory(service, config=client_config(service), **kwargs)
+            name = f"{kind}:{service}"
+            _init_ms[name] = _init_ms.get(name, 0.0) + (time.perf_counter() - started) * 1000
+            print(f"[AWS] {name} ready in {_init_ms[name]:.1f} ms")
+        return _instances[key]
+
+
+class _Lazy:
+    """Builds its target on first attribute access; thread-safe."""
+
+    def __init__(self, build):
+        self._build  = build
+        self._target = None
+        self._built  = -1
+
+    def _get(self):
+        if self._built != _generation:
+            with _lock:
+                if self._built != _generation:
+                    self._target = self._build()
+                    self._built  = _generation
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+class _LazyResource(_Lazy):
+
+    def Table(self, name):
+        return _Lazy(lambda: self._get().Table(name))
+
+
+def client(service, **kwargs):
+    """Lazy boto3 client; kwargs (region_name, endpoint_url, …) as for boto3.client."""
+    return _Lazy(lambda: _create("client", service, kwargs))
+
+
+def resource(service, **kwargs):
+    """Lazy boto3 resource; its Table(name) handles are lazy as well."""
+    return _LazyResource(lambda: _create("resource", service, kwargs))
+
+
+def init_times():
+    """{"client:s3": ms, ...} spent creating each client in this container."""
+    return dict(_init_ms)
+
+
+def reset():
+    """Forget every cached client (tests / benchmarks that swap credentials or stubs)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _instances.clear()
+        _init_ms.clear()
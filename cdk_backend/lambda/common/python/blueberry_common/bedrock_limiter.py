@@ -0,0 +1,381 @@
+"""
+Shared call layer for every Bedrock runtime call (invoke_agent, converse,
+invoke_model).
+
+  * exponential backoff with full jitter on throttling / transient errors
+  * AIMD adaptive concurrency limit per model: +1/limit per success
+    (summed in-process and written at most once per
+    BEDROCK_INCREASE_WINDOW seconds), x BEDROCK_DECREASE_FACTOR on
+    ThrottlingException
+  * per-session fairness: one session may hold at most
+    BEDROCK_SESSION_SHARE of the current limit; calls without a session
+    (embeddings, background classification) only count against the limit
+  * the limit and the slots in use live in a pluggable store, so concurrent
+    Lambdas share one view ("local" in-process or "dynamodb")
+  * queueing delay and throttle counts are printed as CloudWatch Embedded
+    Metric Format lines and kept in-process (limiter.metrics())
+
+Usage:
+    limiter = get_limiter("agent")
+    result  = limiter.call(lambda: bedrock.converse(...), session_id=sid)
+"""
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, ReadTimeoutError
+
+LIMITER_STORE       = os.environ.get("BEDROCK_LIMITER_STORE", "local").lower()
+LIMITER_TABLE       = os.environ.get("BEDROCK_LIMITER_TABLE", "")
+MIN_CONCURRENCY     = float(os.environ.get("BEDROCK_MIN_CONCURRENCY", "1"))
+MAX_CONCURRENCY     = float(os.environ.get("BEDROCK_MAX_CONCURRENCY", "20"))
+INITIAL_CONCURRENCY = float(os.environ.get("BEDROCK_INITIAL_CONCURRENCY", "4"))
+DECREASE_FACTOR     = float(os.environ.get("BEDROCK_DECREASE_FACTOR", "0.5"))
+SESSION_SHARE       = float(os.environ.get("BEDROCK_SESSION_SHARE", "0.25"))
+MAX_ATTEMPTS        = int(os.environ.get("BEDROCK_MAX_ATTEMPTS", "4"))
+BACKOFF_BASE        = float(os.environ.get("BEDROCK_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP         = float(os.environ.get("BEDROCK_BACKOFF_CAP", "8"))
+ACQUIRE_TIMEOUT     = float(os.environ.get("BEDROCK_ACQUIRE_TIMEOUT", "30"))
+INCREASE_WINDOW     = float(os.environ.get("BEDROCK_INCREASE_WINDOW", "5"))
+# a little over the callers' Lambda timeout: a crashed holder's slot frees soon after
+SLOT_LEASE_SECONDS  = int(os.environ.get("BEDROCK_SLOT_LEASE", "130"))
+METRICS_NAMESPACE   = os.environ.get("BEDROCK_METRICS_NAMESPACE", "BlueberryBot/Bedrock")
+
+THROTTLE_CODES = {
+    "throttlingexception",
+    "toomanyrequestsexception",
+    "servicequotaexceededexception",
+}
+TRANSIENT_CODES = {
+    "serviceunavailableexception",
+    "internalserverexception",
+    "modelnotreadyexception",
+    "modeltimeoutexception",
+}
+
+
+class LimiterTimeout(Exception):
+    """No concurrency slot became free within BEDROCK_ACQUIRE_TIMEOUT."""
+
+
+def error_code(exc):
+    if isinstance(exc, ClientError):
+        return exc.response.get("Error", {}).get("Code", "").lower()
+    return ""
+
+
+def is_throttle(exc):
+    return error_code(exc) in THROTTLE_CODES
+
+
+def is_transient(exc):
+    return error_code(exc) in TRANSIENT_CODES or isinstance(exc, (BotoConnectionError, ReadTimeoutError))
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Full jitter: uniform(0, min(cap, base * 2**attempt))."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Limiter state stores
+# ──────────────────────────────────────────────────────────────────────────────
+class LocalLimiterStore:
+    """Per-container state; exact, used for tests and single-container runs."""
+
+    def __init__(self):
+        self.lock   = threading.Lock()
+        self.limits = {}
+        self.slots  = {}    # name -> {holder: (session, expires)}
+
+    def _limit(self, name):
+        return self.limits.setdefault(name, INITIAL_CONCURRENCY)
+
+    def try_acquire(self, name, holder, session, now):
+        with self.lock:
+            limit = self._limit(name)
+            slots = self.slots.setdefault(name, {})
+            for h, (_, exp) in list(slots.items()):
+                if exp < now:
+                    del slots[h]
+            if len(slots) >= math.floor(limit):
+                return False
+            if _over_session_cap((s for s, _ in slots.values()), session, limit):
+                return False
+            slots[holder] = (session, now + SLOT_LEASE_SECONDS)
+            return True
+
+    def release(self, name, holder):
+        with self.lock:
+            self.slots.get(name, {}).pop(holder, None)
+
+    def adjust(self, name, fn):
+        with self.lock:
+            self.limits[name] = fn(self._limit(name))
+            return self.limits[name]
+
+    def limit(self, name):
+        with self.lock:
+            return self._limit(name)
+
+
+class DynamoDBLimiterStore:
+    """
+    One item per limiter (PK limiter_key):
+      limit – current AIMD limit (number)
+      slots – map holder -> {"s": session, "e": lease expiry}
+    Slots carry a lease so a crashed Lambda can't leak concurrency.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.ConditionalCheckFailed = table.meta.client.exceptions.ConditionalCheckFailedException
+
+    def _item(self, name):
+        key = {"limiter_key": name}
+        item = self.table.get_item(Key=key, ConsistentRead=True).get("Item")
+        if item:
+            return item
+        try:
+            self.table.put_item(
+                Item={**key, "limit": Decimal(str(INITIAL_CONCURRENCY)), "slots": {}},
+                ConditionExpression="attribute_not_exists(limiter_key)",
+            )
+        except self.ConditionalCheckFailed:
+            pass
+        return self.table.get_item(Key=key, ConsistentRead=True)["Item"]
+
+    def try_acquire(self, name, holder, session, now):
+        item  = self._item(name)
+        limit = float(item["limit"])
+        slots = item.get("slots") or {}
+
+        expired = [h for h, v in slots.items() if float(v["e"]) < now]
+        if expired:
+            self._purge(name, expired)
+            slots = {h: v for h, v in slots.items() if h not in expired}
+
+        if len(slots) >= math.floor(limit):
+            return False
+        if _over_session_cap((v["s"] for v in slots.values()), session, limit):
+            return False
+        try:
+            self.table.update_item(
+                Key={"limiter_key": name},
+                UpdateExpression="SET slots.#h = :slot",
+                ConditionExpression="size(slots) < :cap",
+                ExpressionAttributeNames={"#h": holder},
+                ExpressionAttributeValues={
+                    ":slot": {"s": session or "-", "e": Decimal(str(int(now + SLOT_LEASE_SECONDS)))},
+                    ":cap":  math.floor(limit),
+                },
+            )
+            return True
+        except self.ConditionalCheckFailed:
+            return False
+
+    def _purge(self, name, holders):
+        names = {f"#h{i}": h for i, h in enumerate(holders)}
+        self.table.update_item(
+            Key={"limiter_key": name},
+            UpdateExpression="REMOVE " + ", ".join(f"slots.{n}" for n in names),
+            ExpressionAttributeNames=names,
+        )
+
+    def release(self, name, holder):
+        self._purge(name, [holder])
+
+    def adjust(self, name, fn):
+        # optimistic read-modify-write on the shared limit
+        for _ in range(5):
+            old = self._item(name)["limit"]
+            new = Decimal(str(round(fn(float(old)), 3)))
+            if new == old:
+                return float(old)
+            try:
+                self.table.update_item(
+                    Key={"limiter_key": name},
+                    UpdateExpression="SET #l = :new",
+                    ConditionExpression="#l = :old",
+                    ExpressionAttributeNames={"#l": "limit"},
+                    ExpressionAttributeValues={":new": new, ":old": old},
+                )
+                return float(new)
+            except self.ConditionalCheckFailed:
+                continue
+        return float(old)
+
+    def limit(self, name):
+        return float(self._item(name)["limit"])
+
+
+def _session_cap(limit):
+    return max(1, math.ceil(limit * SESSION_SHARE))
+
+
+def _over_session_cap(held_by, session, limit):
+    """True when `session` already holds its share of the slots (None: no cap)."""
+    if session is None:
+        return False
+    return sum(1 for s in held_by if s == session) >= _session_cap(limit)
+
+
+def _increase(limit, successes):
+    """The additive increase of `successes` calls, one +1/limit step each."""
+    for _ in range(successes):
+        limit = min(MAX_CONCURRENCY, limit + 1.0 / max(limit, 1.0))
+    return limit
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Limiter
+# ──────────────────────────────────────────────────────────────────────────────
+class AdaptiveLimiter:
+
+    def __init__(self, name, store):
+        self.name  = name
+        self.store = store
+        self.lock  = threading.Lock()
+        self.stats = {"calls": 0, "throttles": 0, "retries": 0, "queue_delay_ms_total": 0.0}
+        self.successes     = 0                  # not yet applied to the shared limit
+        self.increased_at  = time.monotonic()
+        self.current_limit = None               # last limit read from / written to the store
+
+    # ---- slots ---------------------------------------------------------
+    def acquire(self, session_id, timeout=ACQUIRE_TIMEOUT):
+        """Wait for a slot; returns (holder, queueing delay in ms)."""
+        holder  = uuid.uuid4().hex
+        start   = time.monotonic()
+        attempt = 0
+        while not self.store.try_acquire(self.name, holder, session_id or None, time.time()):
+            if time.monotonic() - start > timeout:
+                raise LimiterTimeout(f"No {self.name} slot free after {timeout:.0f}s")
+            time.sleep(min(1.0, 0.05 * (2 ** attempt)) * random.uniform(0.5, 1.0))
+            attempt += 1
+        return holder, (time.monotonic() - start) * 1000
+
+    def release(self, holder):
+        self.store.release(self.name, holder)
+
+    # ---- AIMD ----------------------------------------------------------
+    def on_success(self):
+        """Count the success; the increase reaches the store once per INCREASE_WINDOW."""
+        with self.lock:
+            self.successes += 1
+            if time.monotonic() - self.increased_at < INCREASE_WINDOW:
+                return self.limit()
+            n, self.successes, self.increased_at = self.successes, 0, time.monotonic()
+        self.current_limit = self.store.adjust(self.name, lambda l: _increase(l, n))
+        return self.current_limit
+
+    def on_throttle(self):
+        with self.lock:
+            self.successes, self.increased_at = 0, time.monotonic()
+        self.current_limit = self.store.adjust(self.name, lambda l: max(MIN_CONCURRENCY, l * DECREASE_FACTOR))
+        return self.current_limit
+
+    def limit(self):
+        if self.current_limit is None:
+            self.current_limit = self.store.limit(self.name)
+        return self.current_limit
+
+    # ---- calls ---------------------------------------------------------
+    def call(self, fn, session_id=None, max_attempts=MAX_ATTEMPTS, can_retry=None):
+        """
+        Run fn() under a concurrency slot with backoff on throttling and
+        transient errors.  can_retry() lets the caller veto a retry, e.g.
+        once part of a streamed answer has already reached the client.
+        """
+        for attempt in range(max_attempts):
+            holder, delay_ms = self.acquire(session_id)
+            wait = None
+            try:
+                result = fn()
+            except Exception as exc:
+                throttled = is_throttle(exc)
+                retryable = throttled or is_transient(exc)
+                limit = self.on_throttle() if throttled else self.limit()
+                self._record(delay_ms, throttled, limit)
+                last = attempt == max_attempts - 1
+                if not retryable or last or (can_retry and not can_retry()):
+                    raise
+                wait = backoff_delay(attempt)
+                print(f"[BEDROCK] {self.name} {error_code(exc) or type(exc).__name__} – "
+                      f"retry {attempt + 1}/{max_attempts - 1} in {wait:.2f}s (limit {limit:.2f})")
+                with self.lock:
+                    self.stats["retries"] += 1
+            finally:
+                self.release(holder)
+
+            if wait is None:
+                self._record(delay_ms, False, self.on_success())
+                return result
+            # back off without holding a slot, so others can use it meanwhile
+            time.sleep(wait)
+
+    # ---- metrics -------------------------------------------------------
+    def _record(self, delay_ms, throttled, limit):
+        with self.lock:
+            self.stats["calls"] += 1
+            self.stats["throttles"] += int(throttled)
+            self.stats["queue_delay_ms_total"] += delay_ms
+        print(json.dumps({
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace":  METRICS_NAMESPACE,
+                    "Dimensions": [["Limiter"]],
+                    "Metrics": [
+                        {"Name": "QueueDelay",       "Unit": "Milliseconds"},
+                        {"Name": "Throttled",        "Unit": "Count"},
+                        {"Name": "ConcurrencyLimit", "Unit": "Count"},
+                    ],
+                }],
+            },
+            "Limiter":          self.name,
+            "QueueDelay":       round(delay_ms, 2),
+            "Throttled":        int(throttled),
+            "ConcurrencyLimit": round(limit, 2),
+        }))
+
+    def metrics(self):
+        with self.lock:
+            calls = self.stats["calls"] or 1
+            return {
+                "limiter":           self.name,
+                "calls":             self.stats["calls"],
+                "throttles":         self.stats["throttles"],
+                "retries":           self.stats["retries"],
+                "throttle_rate":     self.stats["throttles"] / calls,
+                "avg_queue_delay_ms": self.stats["queue_delay_ms_total"] / calls,
+                "limit":             self.store.limit(self.name),
+            }
+
+
+_store    = None
+_limiters = {}
+_registry_lock = threading.Lock()
+
+
+def _default_store():
+    if LIMITER_STORE == "dynamodb" and LIMITER_TABLE:
+        from blueberry_common import aws
+        return DynamoDBLimiterStore(aws.resource("dynamodb").Table(LIMITER_TABLE))
+    return LocalLimiterStore()
+
+
+def get_limiter(name, store=None):
+    """One limiter per Bedrock resource (agent, model id, ...) per container."""
+    global _store
+    with _registry_lock:
+        if name not in _limiters:
+            if store is None:
+                _store = _store or _default_store()
+                store = _store
+            _limiters[name] = AdaptiveLimiter(name, store)
+        return _limiters[name]
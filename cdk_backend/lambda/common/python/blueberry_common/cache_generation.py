@@ -0,0 +1,24 @@
+"""
+Generation counter of cfEvaluator's semantic answer cache.
+
+Cache entries are written with the generation current at the time; the
+cache ignores every entry from an older one, so bumping the counter drops
+the whole cache at once.  kbSync bumps it whenever an ingestion job
+completes, i.e. once new content is actually searchable.
+
+The counter is one item of the answer cache table (PK cache_key).
+"""
+GENERATION_KEY = "__generation__"
+
+
+def current_generation(table):
+    item = table.get_item(Key={"cache_key": GENERATION_KEY}).get("Item") or {}
+    return int(item.get("generation", 0))
+
+
+def bump_generation(table):
+    table.update_item(
+        Key={"cache_key": GENERATION_KEY},
+        UpdateExpression="ADD generation :one",
+        ExpressionAttributeValues={":one": 1},
+    )
@@ -0,0 +1,216 @@
+"""
+Manifest of the documents in the BlueberryData bucket for the admin listing.
+
+Listing the bucket itself is O(bucket) per page load, truncates at 1,000
+keys and mixes in the answers emailReply writes under admin_answers/.  This
+index keeps one row per document in DynamoDB instead:
+
+    pk = "doc", key = <object key>, name, name_lower, size, last_modified, etag
+
+written by adminFile on every upload and delete (and by emailReply for the
+attachments it files), so the ManageDocuments page is a single Query
+whatever the bucket size.  The table's local secondary indexes ByModified
+(last_modified) and BySize (size) give the other sort orders; prefix
+("folder/") and name filters are applied in the query and pages are
+resumed with an opaque continuation token.
+
+A "meta"/"stats" row holds the document count and total bytes.  When it is
+missing (first deploy) or objects were written outside the API, rebuild()
+re-lists the bucket once and replaces the manifest.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+DOC_PK            = "doc"
+META_PK           = "meta"
+STATS_KEY         = "stats"
+STAGING_PREFIX    = "_staging/"          # batch-upload archives awaiting extraction
+EXCLUDED_PREFIXES = ("admin_answers/", STAGING_PREFIX)   # emailReply answers, staged archives
+
+SORTS = {                                  # sort -> (local secondary index, its sort key)
+    "name":          (None, "key"),
+    "last_modified": ("ByModified", "last_modified"),
+    "size":          ("BySize", "size"),
+}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE     = 500
+FILTER_BATCH      = 1000  # rows evaluated per query when a filter discards most of them
+MAX_QUERIES       = 10    # per page
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def is_document(key):
+    return bool(key) and not key.endswith("/") and not key.startswith(EXCLUDED_PREFIXES)
+
+
+def _row(key, size, last_modified, etag=""):
+    if hasattr(last_modified, "isoformat"):
+        last_modified = last_modified.isoformat()
+    name = key.rsplit("/", 1)[-1]
+    return {
+        "pk":            DOC_PK,
+        "key":           key,
+        "name":          name,
+        "name_lower":    name.lower(),
+        "size":          int(size),
+        "last_modified": last_modified,
+        "etag":          (etag or "").strip('"'),
+    }
+
+
+def _plain(value):
+    return int(value) if isinstance(value, Decimal) else value
+
+
+def encode_token(last_key, sort, order):
+    payload = {"k": {k: _plain(v) for k, v in last_key.items()}, "s": sort, "o": order}
+    return urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+
+
+def decode_token(token, sort, order):
+    try:
+        payload = json.loads(urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidToken("Malformed continuation token") from e
+    if payload.get("s") != sort or payload.get("o") != order:
+        raise InvalidToken("Continuation token belongs to a different sort order")
+    return payload["k"]
+
+
+class DocumentIndex:
+
+    def __init__(self, table, s3=None, bucket=""):
+        self.table  = table
+        self.s3     = s3
+        self.bucket = bucket
+
+    # ---- writes ----------------------------------------------------------
+    def _adjust_stats(self, count, size):
+        if not (count or size):
+            return
+        try:
+            # only once built – a stats row from increments alone would skip the rebuild
+            self.table.update_item(
+                Key={"pk": META_PK, "key": STATS_KEY},
+                UpdateExpression="ADD #count :count, #bytes :bytes",
+                ConditionExpression="attribute_exists(pk)",
+                ExpressionAttributeNames={"#count": "count", "#bytes": "bytes"},
+                ExpressionAttributeValues={":count": count, ":bytes": size},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+    def put(self, key, size, last_modified, etag=""):
+        if not is_document(key):
+            return
+        old = self.table.put_item(Item=_row(key, size, last_modified, etag), ReturnValues="ALL_OLD").get("Attributes")
+        self._adjust_stats(0 if old else 1, int(size) - int(old["size"] if old else 0))
+
+    def put_head(self, key, head):
+        """Index an object from its HeadObject response."""
+        self.put(key, head["ContentLength"], head["LastModified"], head.get("ETag", ""))
+
+    def delete(self, key):
+        if not is_document(key):
+            return
+        old = self.table.delete_item(Key={"pk": DOC_PK, "key": key}, ReturnValues="ALL_OLD").get("Attributes")
+        if old:
+            self._adjust_stats(-1, -int(old["size"]))
+
+    def rebuild(self):
+        """Replace the manifest with a full listing of the bucket."""
+        listed = {}
+        for page in self.s3.get_paginator("list_objects_v2").paginate(Bucket=self.bucket):
+            for obj in page.get("Contents", []):
+                if is_document(obj["Key"]):
+                    listed[obj["Key"]] = _row(obj["Key"], obj["Size"], obj["LastModified"], obj.get("ETag"))
+        stale = [k for k in self._all_keys() if k not in listed]
+        with self.table.batch_writer(overwrite_by_pkeys=["pk", "key"]) as batch:
+            for row in listed.values():
+                batch.put_item(Item=row)
+            for key in stale:
+                batch.delete_item(Key={"pk": DOC_PK, "key": key})
+        stats = {"count": len(listed), "bytes": sum(r["size"] for r in listed.values())}
+        self.table.put_item(Item={"pk": META_PK, "key": STATS_KEY, **stats})
+        return {**stats, "removed": len(stale)}
+
+    def _all_keys(self):
+        kwargs = {"KeyConditionExpression": Key("pk").eq(DOC_PK), "ProjectionExpression": "#k",
+                  "ExpressionAttributeNames": {"#k": "key"}}
+        while True:
+            resp = self.table.query(**kwargs)
+            yield from (item["key"] for item in resp.get("Items", []))
+            if "LastEvaluatedKey" not in resp:
+                return
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    # ---- reads -----------------------------------------------------------
+    def stats(self):
+        """{"count", "bytes"}, building the manifest first if it never was."""
+        item = self.table.get_item(Key={"pk": META_PK, "key": STATS_KEY}).get("Item")
+        if item is None:
+            built = self.rebuild()
+            return {"count": built["count"], "bytes": built["bytes"]}
+        return {"count": int(item["count"]), "bytes": int(item["bytes"])}
+
+    def list(self, prefix="", search="", sort="name", order="asc", limit=DEFAULT_PAGE_SIZE, token=None):
+        """
+        One page of documents:  {"files": [...], "next_token": str|None}.
+        Raises ValueError for an unknown sort/order and InvalidToken for a
+        token from another query.
+        """
+        if sort not in SORTS:
+            raise ValueError(f"sort must be one of {', '.join(SORTS)}")
+        if order not in ("asc", "desc"):
+            raise ValueError("order must be asc or desc")
+        index, sort_attr = SORTS[sort]
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        condition, filters = Key("pk").eq(DOC_PK), []
+        if prefix and index is None:
+            condition &= Key("key").begins_with(prefix)
+        elif prefix:
+            filters.append(Attr("key").begins_with(prefix))
+        if search:
+            filters.append(Attr("name_lower").contains(search.lower()))
+
+        kwargs = {"KeyConditionExpression": condition, "ScanIndexForward": order == "asc"}
+        if index:
+            kwargs["IndexName"] = index
+        if filters:
+            expression = filters[0]
+            for extra in filters[1:]:
+                expression &= extra
+            kwargs["FilterExpression"] = expression
+        if token:
+            kwargs["ExclusiveStartKey"] = decode_token(token, sort, order)
+
+        files, last_key = [], None
+        for _ in range(MAX_QUERIES):
+            resp = self.table.query(Limit=FILTER_BATCH if filters else limit - len(files), **kwargs)
+            files.extend(resp.get("Items", []))
+            last_key = resp.get("LastEvaluatedKey")
+            if len(files) > limit:
+                # resume right after the last row returned, not after the last row read
+                files = files[:limit]
+                last_key = {a: files[-1][a] for a in {"pk", "key", sort_attr}}
+            if not last_key or len(files) >= limit:
+                break
+            kwargs["ExclusiveStartKey"] = last_key
+
+        return {
+            "files": [
+                {"key": f["key"], "name": f["name"], "size": int(f["size"]),
+                 "last_modified": f["last_modified"], "etag": f.get("etag", "")}
+                for f in files
+            ],
+            "next_token": encode_token(last_key, sort, order) if last_key else None,
+        }
@@ -0,0 +1,238 @@
+"""
+Offline geocoding of the free-text locations growers type into the chat
+("Hammonton NJ", "I'm in Bacon Co., Georgia", "south jersey", "Gerogia").
+
+A Gazetteer resolves a string to a Place – a city, a county or a state –
+using only in-memory tables:
+
+  * the states are built in (centroids below), so state-level resolution
+    always works;
+  * counties and cities come from an optional gzip'd JSON artifact built
+    from the Census Bureau gazetteer files (retrieveSessionLogs/
+    build_gazetteer.py):  {"version": ..., "places": [[kind, name, state,
+    lat, lon], ...]}.
+
+Resolution prefers the most specific match: an exact city, then a county
+("<name> county/parish"), then a close (difflib) city spelling within the
+state, then the state itself, then a close state spelling.  A state is
+taken from its full name or, when unambiguous, its USPS code; city and
+county names without a state only resolve when the name is unique.
+"""
+import difflib
+import gzip
+import json
+import re
+from collections import defaultdict, namedtuple
+
+GEO_VERSION = 1   # bump when the resolution rules change (invalidates cached resolutions)
+
+US_STATES = [
+    ("AL", "Alabama", 32.806671, -86.791130),        ("AK", "Alaska", 61.370716, -152.404419),
+    ("AZ", "Arizona", 33.729759, -111.431221),       ("AR", "Arkansas", 34.969704, -92.373123),
+    ("CA", "California", 36.116203, -119.681564),    ("CO", "Colorado", 39.059811, -105.311104),
+    ("CT", "Connecticut", 41.597782, -72.755371),    ("DE", "Delaware", 39.318523, -75.507141),
+    ("DC", "District of Columbia", 38.897438, -77.026817),
+    ("FL", "Florida", 27.766279, -81.686783),        ("GA", "Georgia", 33.040619, -83.643074),
+    ("HI", "Hawaii", 21.094318, -157.498337),        ("ID", "Idaho", 44.240459, -114.478828),
+    ("IL", "Illinois", 40.349457, -88.986137),       ("IN", "Indiana", 39.849426, -86.258278),
+    ("IA", "Iowa", 42.011539, -93.210526),           ("KS", "Kansas", 38.526600, -96.726486),
+    ("KY", "Kentucky", 37.668140, -84.670067),       ("LA", "Louisiana", 31.169546, -91.867805),
+    ("ME", "Maine", 44.693947, -69.381927),          ("MD", "Maryland", 39.063946, -76.802101),
+    ("MA", "Massachusetts", 42.230171, -71.530106),  ("MI", "Michigan", 43.326618, -84.536095),
+    ("MN", "Minnesota", 45.694454, -93.900192),      ("MS", "Mississippi", 32.741646, -89.678696),
+    ("MO", "Missouri", 38.456085, -92.288368),       ("MT", "Montana", 46.921925, -110.454353),
+    ("NE", "Nebraska", 41.125370, -98.268082),       ("NV", "Nevada", 38.313515, -117.055374),
+    ("NH", "New Hampshire", 43.452492, -71.563896),  ("NJ", "New Jersey", 40.298904, -74.521011),
+    ("NM", "New Mexico", 34.840515, -106.248482),    ("NY", "New York", 42.165726, -74.948051),
+    ("NC", "North Carolina", 35.630066, -79.806419), ("ND", "North Dakota", 47.528912, -99.784012),
+    ("OH", "Ohio", 40.388783, -82.764915),           ("OK", "Oklahoma", 35.565342, -96.928917),
+    ("OR", "Oregon", 44.572021, -122.070938),        ("PA", "Pennsylvania", 40.590752, -77.209755),
+    ("RI", "Rhode Island", 41.680893, -71.511780),   ("SC", "South Carolina", 33.856892, -80.945007),
+    ("SD", "South Dakota", 44.299782, -99.438828),   ("TN", "Tennessee", 35.747845, -86.692345),
+    ("TX", "Texas", 31.054487, -97.563461),          ("UT", "Utah", 40.150032, -111.862434),
+    ("VT", "Vermont", 44.045876, -72.710686),        ("VA", "Virginia", 37.769337, -78.169968),
+    ("WA", "Washington", 47.400902, -121.490494),    ("WV", "West Virginia", 38.491226, -80.954453),
+    ("WI", "Wisconsin", 44.268543, -89.616508),      ("WY", "Wyoming", 42.755966, -107.302490),
+    ("PR", "Puerto Rico", 18.220833, -66.590149),
+]
+
+# informal names for a whole state
+STATE_ALIASES = {"jersey": "NJ", "south jersey": "NJ", "north jersey": "NJ", "cali": "CA",
+                 "socal": "CA", "norcal": "CA", "upstate new york": "NY", "washington state": "WA"}
+
+# two-letter codes that are also common words – only trusted when written in capitals
+AMBIGUOUS_CODES = {"in", "me", "or", "oh", "hi", "ok", "de", "la", "pa", "ma", "al", "id", "co"}
+
+ABBREVIATIONS = {"st": "saint", "ste": "sainte", "mt": "mount", "ft": "fort", "pt": "port",
+                 "co": "county", "cnty": "county", "cty": "county", "twp": "township"}
+
+COUNTY_WORDS = ("county", "parish", "borough", "census area", "municipality")
+
+STOPWORDS = {"i", "im", "am", "we", "are", "in", "from", "near", "the", "of", "a", "an", "at", "by",
+             "live", "living", "located", "based", "my", "our", "farm", "farms", "grower", "growers",
+             "area", "around", "outside", "just", "usa", "us", "united", "states", "america",
+             "north", "south", "east", "west", "northern", "southern", "eastern", "western",
+             "central", "upstate", "downstate", "and", "state", "region"}
+
+FUZZY_CITY_CUTOFF  = 0.88
+FUZZY_STATE_CUTOFF = 0.8
+MAX_NGRAM          = 4
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9']+")
+
+
+class Place(namedtuple("Place", "kind name state lat lon")):
+    __slots__ = ()
+
+    @property
+    def id(self):
+        return f"{self.kind}:{self.state}" if self.kind == "state" else f"{self.kind}:{self.state}:{self.name}"
+
+    @property
+    def label(self):
+        return self.name if self.kind == "state" else f"{self.name}, {self.state}"
+
+
+def _tokens(text):
+    """(lower-case token, token as typed) pairs with abbreviations expanded."""
+    out = []
+    for raw in _TOKEN_RE.findall(text or ""):
+        raw = raw.replace("'", "")
+        low = raw.lower()
+        if low in ABBREVIATIONS and not (low == "co" and raw == "CO"):   # "CO" is Colorado
+            low = ABBREVIATIONS[low]
+        if low:
+            out.append((low, raw))
+    return out
+
+
+def normalize_location(text):
+    """Lower-case, punctuation-free, abbreviation-expanded form used as index key."""
+    return " ".join(low for low, _ in _tokens(text))
+
+
+def strip_county_word(name):
+    norm = normalize_location(name)
+    for word in COUNTY_WORDS:
+        if norm.endswith(" " + word):
+            return norm[: -len(word) - 1]
+    return norm
+
+
+class Gazetteer:
+
+    def __init__(self, places=(), version="builtin"):
+        self.version = version
+        self.states = {code: Place("state", name, code, lat, lon) for code, name, lat, lon in US_STATES}
+        self.state_names = {normalize_location(p.name): code for code, p in self.states.items()}
+        self.state_names.update(STATE_ALIASES)
+        self.counties = {}                      # (key, state) -> Place
+        self.cities = {}
+        self.county_states = defaultdict(set)   # key -> states having it
+        self.city_states = defaultdict(set)
+        self.cities_by_state = defaultdict(list)
+        for kind, name, state, lat, lon in places:
+            place = Place(kind, name, state, lat, lon)
+            if kind == "county":
+                key = strip_county_word(name)
+                self.counties[(key, state)] = place
+                self.county_states[key].add(state)
+            elif kind == "city":
+                key = normalize_location(name)
+                # first entry wins (the builder sorts larger places first)
+                if (key, state) not in self.cities:
+                    self.cities[(key, state)] = place
+                    self.city_states[key].add(state)
+                    self.cities_by_state[state].append(key)
+
+    @classmethod
+    def loads(cls, blob):
+        data = json.loads(gzip.decompress(blob))
+        return cls(data["places"], data.get("version", "unknown"))
+
+    # ---- resolution ------------------------------------------------------
+    def _find_state(self, tokens):
+        """(state code, (start, end)) of the right-most state mention, else (None, None)."""
+        lows, best, start = [t[0] for t in tokens], (None, None), 0
+        while start < len(tokens):
+            for size in range(min(MAX_NGRAM, len(tokens) - start), 0, -1):
+                code = self.state_names.get(" ".join(lows[start:start + size]))
+                if code:
+                    best = (code, (start, start + size))
+                    start += size
+                    break
+            else:
+                raw  = tokens[start][1]
+                last = start == len(tokens) - 1
+                if len(raw) == 2 and raw.upper() in self.states and \
+                        (raw.isupper() or (last and raw.lower() not in AMBIGUOUS_CODES)):
+                    best = (raw.upper(), (start, start + 1))
+                start += 1
+        return best
+
+    @staticmethod
+    def _ngrams(words):
+        for size in range(min(MAX_NGRAM, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                gram = words[start:start + size]
+                if gram[0] in STOPWORDS or gram[-1] in STOPWORDS:
+                    continue
+                yield start, " ".join(gram)
+
+    def _lookup(self, table, states_by_key, key, state):
+        if state:
+            return table.get((key, state))
+        states = states_by_key.get(key)
+        if states and len(states) == 1:
+            return table[(key, next(iter(states)))]
+        return None
+
+    def resolve(self, text):
+        tokens = _tokens(text)
+        if not tokens:
+            return None
+        state, span = self._find_state(tokens)
+        words = [low for i, (low, _) in enumerate(tokens) if not span or not span[0] <= i < span[1]]
+
+        # exact city
+        for _, gram in self._ngrams(words):
+            place = self._lookup(self.cities, self.city_states, gram, state)
+            if place:
+                return place
+
+        # "<name> county"
+        for i, word in enumerate(words):
+            if word in ("county", "parish", "borough"):
+                for size in range(min(3, i), 0, -1):
+                    place = self._lookup(self.counties, self.county_states, " ".join(words[i - size:i]), state)
+                    if place:
+                        return place
+
+        # misspelt city within a known state
+        if state and self.cities_by_state.get(state):
+            for _, gram in self._ngrams(words):
+                if len(gram) >= 4:
+                    match = difflib.get_close_matches(gram, self.cities_by_state[state], 1, FUZZY_CITY_CUTOFF)
+                    if match:
+                        return self.cities[(match[0], state)]
+
+        if state:
+            return self.states[state]
+
+        # misspelt state name
+        for _, gram in self._ngrams(words):
+            if len(gram) >= 4:
+                match = difflib.get_close_matches(gram, list(self.state_names), 1, FUZZY_STATE_CUTOFF)
+                if match:
+                    return self.states[self.state_names[match[0]]]
+        return None
+
+
+def load_gazetteer(s3=None, bucket=None, key=None):
+    """Full gazetteer from S3 when configured, else (or on error) the built-in states."""
+    if s3 is not None and bucket and key:
+        try:
+            return Gazetteer.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+        except Exception as e:
+            print(f"[geocode] gazetteer {key} unavailable ({e}) – states only")
+    return Gazetteer()
@@ -0,0 +1,443 @@
+"""
+Debounced, coalescing knowledge-base sync.
+
+Writers never call start_ingestion_job themselves.  They record the change
+
+    request_sync(table, kb_id, ds_id, keys=["bulletins/mummy-berry.pdf"])
+
+on one state row per data source ("ds#<kb>#<ds>"), and the kbSync
+scheduler calls tick() every minute.  tick()
+
+  1. follows the running job and, once it has finished, clears it –
+     re-queueing its changes if it failed;
+  2. starts one new job when changes are pending and have been quiet for
+     the debounce window (or have waited max_wait in total, or a sync was
+     forced), moving them from "pending" to "job" in the same conditional
+     update so changes arriving mid-job stay queued for the next run.
+
+A job is either a full data-source ingestion (start_ingestion_job) or,
+when tick() is given the bucket and an incremental_max, a document-level
+one: only the changed keys are ingested / deleted through
+ingest_knowledge_base_documents / delete_knowledge_base_documents and
+followed with get_knowledge_base_documents.  A content-hash manifest (one
+"doc#<kb>#<ds>#<key>" row per indexed document holding its S3 ETag) lets
+re-uploads of identical bytes be skipped entirely.  Forced syncs, changes
+without keys and change sets larger than incremental_max fall back to a
+full ingestion, and so does the last retry of changes whose job could not
+be started.
+
+State row attributes:
+
+    pending_count / pending_keys     changes not yet in a job (keys: string set, dropped
+                                     once it outgrows PLAN_MAX_KEYS – the job is full then)
+    first_pending_at / last_change_at / force_at   epoch seconds
+    full_at                          a change without keys (or a forced sync) is pending
+    job_id, job_count, job_keys, job_started_at    the running (or claimed) job
+    job_mode, job_full               "full" | "docs"; the job's changes included full_at
+    job_etags / job_deletes          manifest updates applied when the job succeeds
+    attempts                         consecutive failed jobs (or job starts) for the queued changes
+    last_job                         {id, status, finished_at, statistics}
+"""
+import hashlib
+import time
+import uuid
+
+from botocore.exceptions import ClientError
+
+STATE_PREFIX  = "ds#"
+DOC_PREFIX    = "doc#"
+CLAIMING      = "claiming"      # job_id while the job is being started
+CLAIM_TIMEOUT = 300             # a claim older than this was abandoned by a crashed run
+ACTIVE        = {"STARTING", "IN_PROGRESS", "STOPPING"}
+MAX_ATTEMPTS  = 3
+
+DOC_BATCH      = 10             # documents per document-level API call
+DOC_ACTIVE     = {"STARTING", "IN_PROGRESS", "PENDING", "DELETING", "DELETE_IN_PROGRESS"}
+DOC_INDEXED    = "INDEXED"      # an upsert in any other final state (FAILED, IGNORED, …) is retried
+DOC_GONE       = {"NOT_FOUND", None}   # what a finished delete reports (None: not in the response)
+PLAN_MAX_KEYS  = 100            # above this the manifest is not consulted
+
+
+def log(*msg):
+    print("[KB-SYNC]", *msg)
+
+
+def state_key(kb_id, ds_id):
+    return f"{STATE_PREFIX}{kb_id}#{ds_id}"
+
+
+def doc_key(kb_id, ds_id, key):
+    return f"{DOC_PREFIX}{kb_id}#{ds_id}#{key}"
+
+
+def request_sync(table, kb_id, ds_id, keys=(), force=False, now=None):
+    """
+    Record a change to the data source; the scheduler picks it up.  Keys
+    are only kept while the pending set can still be planned (PLAN_MAX_KEYS):
+    past that the change becomes a full sync and the set is dropped, so the
+    state row stays small however many writers report changes.
+    """
+    now = int(now or time.time())
+    keys = {k for k in keys if k}
+    full = force or not keys or len(keys) > PLAN_MAX_KEYS
+    try:
+        _record_change(table, kb_id, ds_id, None if full else keys, force, now)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        full = True
+        _record_change(table, kb_id, ds_id, None, force, now)
+    log("Change recorded", sorted(keys) if len(keys) <= 10 else f"{len(keys)} keys",
+        "(forced)" if force else "(full)" if full else "")
+    return {"status": "queued", "keys": len(keys), "full": full}
+
+
+def _record_change(table, kb_id, ds_id, keys, force, now):
+    """ADD the keys while the pending set has room for them, else mark a full sync."""
+    values = {":one": 1, ":now": now}
+    sets = ["last_change_at = :now", "first_pending_at = if_not_exists(first_pending_at, :now)"]
+    if force:
+        sets.append("force_at = :now")
+    kwargs = {}
+    if keys:
+        expression = "ADD pending_count :one, pending_keys :keys"
+        values.update({":keys": keys, ":room": PLAN_MAX_KEYS - len(keys)})
+        kwargs["ConditionExpression"] = "attribute_not_exists(pending_keys) OR size(pending_keys) <= :room"
+    else:
+        sets.append("full_at = :now")
+        expression = "ADD pending_count :one"
+    table.update_item(
+        Key={"sync_key": state_key(kb_id, ds_id)},
+        UpdateExpression=f"{expression} SET {', '.join(sets)}" + ("" if keys else " REMOVE pending_keys"),
+        ExpressionAttributeValues=values,
+        **kwargs,
+    )
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Content-hash manifest
+# ──────────────────────────────────────────────────────────────────────────────
+def _etag(s3, bucket, key):
+    """Current ETag of the object, or None when it no longer exists."""
+    try:
+        return s3.head_object(Bucket=bucket, Key=key)["ETag"].strip('"')
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+def plan_changes(table, s3, bucket, kb_id, ds_id, keys):
+    """
+    Split changed keys into {"upsert": {key: etag}, "delete": {keys},
+    "unchanged": {keys}} by comparing S3 with the manifest.
+    """
+    plan = {"upsert": {}, "delete": set(), "unchanged": set()}
+    for key in sorted(keys):
+        etag = _etag(s3, bucket, key)
+        indexed = table.get_item(Key={"sync_key": doc_key(kb_id, ds_id, key)}).get("Item")
+        if etag is None:
+            plan["delete"].add(key)
+        elif indexed and indexed.get("etag") == etag:
+            plan["unchanged"].add(key)
+        else:
+            plan["upsert"][key] = etag
+    return plan
+
+
+def update_manifest(table, kb_id, ds_id, indexed=None, deleted=(), now=None):
+    now = int(now or time.time())
+    with table.batch_writer(overwrite_by_pkeys=["sync_key"]) as batch:
+        for key, etag in (indexed or {}).items():
+            batch.put_item(Item={"sync_key": doc_key(kb_id, ds_id, key), "etag": etag, "indexed_at": now})
+        for key in deleted:
+            batch.delete_item(Key={"sync_key": doc_key(kb_id, ds_id, key)})
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Document-level jobs
+# ──────────────────────────────────────────────────────────────────────────────
+def _identifier(bucket, key):
+    return {"dataSourceType": "S3", "s3": {"uri": f"s3://{bucket}/{key}"}}
+
+
+def _chunks(items, size=DOC_BATCH):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _client_token(job_id, salt, chunk):
+    """Idempotency token: 64 hex characters (the API allows [a-zA-Z0-9-], 33 to 256)."""
+    return hashlib.sha256(f"{job_id}|{salt}|{'|'.join(chunk)}".encode("utf-8")).hexdigest()
+
+
+def start_document_job(bedrock_agent, kb_id, ds_id, bucket, upserts, deletes):
+    job_id = f"docs-{uuid.uuid4().hex[:12]}"
+    for chunk in _chunks(sorted(upserts)):
+        bedrock_agent.ingest_knowledge_base_documents(
+            knowledgeBaseId=kb_id, dataSourceId=ds_id,
+            clientToken=_client_token(job_id, "ingest", chunk),
+            documents=[{"content": {"dataSourceType": "S3",
+                                    "s3": {"s3Location": {"uri": f"s3://{bucket}/{key}"}}}}
+                       for key in chunk],
+        )
+    for chunk in _chunks(sorted(deletes)):
+        bedrock_agent.delete_knowledge_base_documents(
+            knowledgeBaseId=kb_id, dataSourceId=ds_id,
+            clientToken=_client_token(job_id, "delete", chunk),
+            documentIdentifiers=[_identifier(bucket, key) for key in chunk],
+        )
+    return job_id
+
+
+def document_statuses(bedrock_agent, kb_id, ds_id, bucket, keys):
+    """{key: status} from get_knowledge_base_documents."""
+    prefix, statuses = f"s3://{bucket}/", {}
+    for chunk in _chunks(sorted(keys)):
+        resp = bedrock_agent.get_knowledge_base_documents(
+            knowledgeBaseId=kb_id, dataSourceId=ds_id,
+            documentIdentifiers=[_identifier(bucket, key) for key in chunk],
+        )
+        for detail in resp.get("documentDetails", []):
+            uri = detail.get("identifier", {}).get("s3", {}).get("uri", "")
+            statuses[uri[len(prefix):] if uri.startswith(prefix) else uri] = detail.get("status")
+    return statuses
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Scheduler
+# ──────────────────────────────────────────────────────────────────────────────
+def _requeue(table, key, item, job_id, bump_attempts, now, keys=None, count=None):
+    """Move the job's (or just `keys`') changes back to pending and clear the job."""
+    keys = set(item.get("job_keys") or ()) if keys is None else set(keys)
+    count = int(item.get("job_count", 0)) if count is None else count
+    values = {":job": job_id, ":n": count, ":now": now}
+    adds, sets = ["pending_count :n"], ["first_pending_at = if_not_exists(first_pending_at, :now)",
+                                        "last_change_at = if_not_exists(last_change_at, :now)"]
+    if keys:
+        adds.append("pending_keys :keys")
+        values[":keys"] = keys
+    if bump_attempts:
+        adds.append("attempts :one")
+        values[":one"] = 1
+    if item.get("job_full"):
+        sets.append("full_at = :now")
+    table.update_item(
+        Key={"sync_key": key},
+        UpdateExpression=(f"ADD {', '.join(adds)} SET {', '.join(sets)} "
+                          "REMOVE job_id, job_count, job_keys, job_started_at, "
+                          "job_mode, job_full, job_etags, job_deletes"),
+        ConditionExpression="job_id = :job",
+        ExpressionAttributeValues=values,
+    )
+
+
+def _finish(table, key, job_id, status, now, statistics=None):
+    table.update_item(
+        Key={"sync_key": key},
+        UpdateExpression=("SET last_job = :last REMOVE job_id, job_count, job_keys, job_started_at, "
+                          "job_mode, job_full, job_etags, job_deletes, attempts"),
+        ConditionExpression="job_id = :job",
+        ExpressionAttributeValues={
+            ":job":  job_id,
+            ":last": {
+                "id":          job_id,
+                "status":      status,
+                "finished_at": now,
+                "statistics":  {k: int(v) for k, v in (statistics or {}).items() if isinstance(v, int)},
+            },
+        },
+    )
+
+
+def _follow_full_job(table, bedrock_agent, kb_id, ds_id, item, now, on_complete):
+    key, job_id = state_key(kb_id, ds_id), item["job_id"]
+    job = bedrock_agent.get_ingestion_job(
+        knowledgeBaseId=kb_id, dataSourceId=ds_id, ingestionJobId=job_id,
+    )["ingestionJob"]
+    if job["status"] in ACTIVE:
+        log("Job", job_id, "still", job["status"])
+        return True
+
+    log("Job", job_id, "finished:", job["status"], job.get("statistics"))
+    if job["status"] == "COMPLETE":
+        update_manifest(table, kb_id, ds_id, item.get("job_etags"), item.get("job_deletes") or (), now)
+        _finish(table, key, job_id, job["status"], now, job.get("statistics"))
+        if on_complete:
+            on_complete(job)
+    elif int(item.get("attempts", 0)) + 1 < MAX_ATTEMPTS:
+        _requeue(table, key, item, job_id, True, now)
+    else:
+        log("Giving up on", int(item.get("job_count", 0)), "change(s) after", MAX_ATTEMPTS, "failed jobs")
+        _finish(table, key, job_id, job["status"], now, job.get("statistics"))
+    return False
+
+
+def _follow_document_job(table, bedrock_agent, kb_id, ds_id, bucket, item, now, on_complete):
+    key, job_id = state_key(kb_id, ds_id), item["job_id"]
+    etags   = dict(item.get("job_etags") or {})
+    deletes = set(item.get("job_deletes") or ())
+    statuses = document_statuses(bedrock_agent, kb_id, ds_id, bucket, set(etags) | deletes)
+    running = sorted(k for k, s in statuses.items() if s in DOC_ACTIVE)
+    if running:
+        log("Documents job", job_id, "–", len(running), "document(s) still in progress")
+        return True
+
+    failed = {k for k in etags if statuses.get(k) != DOC_INDEXED}
+    failed |= {k for k in deletes if statuses.get(k) not in DOC_GONE}
+    indexed = {k: v for k, v in etags.items() if k not in failed}
+    removed = deletes - failed
+    log("Documents job", job_id, "finished:", len(indexed), "indexed,", len(removed), "deleted,",
+        len(failed), "failed")
+    update_manifest(table, kb_id, ds_id, indexed, removed, now)
+    if failed and int(item.get("attempts", 0)) + 1 < MAX_ATTEMPTS:
+        _requeue(table, key, item, job_id, True, now, keys=failed, count=len(failed))
+    else:
+        _finish(table, key, job_id, "FAILED" if failed else "COMPLETE", now,
+                {"numberOfDocumentsIndexed": len(indexed), "numberOfDocumentsDeleted": len(removed),
+                 "numberOfDocumentsFailed": len(failed)})
+    if (indexed or removed) and on_complete:
+        on_complete({"ingestionJobId": job_id, "status": "COMPLETE"})
+    return False
+
+
+def _follow_job(table, bedrock_agent, kb_id, ds_id, bucket, item, now, on_complete):
+    """Returns True while a job is still running (nothing else may start)."""
+    if item["job_id"] == CLAIMING:
+        if now - int(item.get("job_started_at", now)) < CLAIM_TIMEOUT:
+            return True
+        log("Abandoned claim – re-queueing", int(item.get("job_count", 0)), "change(s)")
+        _requeue(table, state_key(kb_id, ds_id), item, CLAIMING, False, now)
+        return False
+    if item.get("job_mode") == "docs":
+        return _follow_document_job(table, bedrock_agent, kb_id, ds_id, bucket, item, now, on_complete)
+    return _follow_full_job(table, bedrock_agent, kb_id, ds_id, item, now, on_complete)
+
+
+def _due(item, now, debounce, max_wait):
+    if int(item.get("pending_count", 0)) <= 0:
+        return False
+    if item.get("force_at") is not None:
+        return True
+    return (now - int(item.get("last_change_at", now)) >= debounce
+            or now - int(item.get("first_pending_at", now)) >= max_wait)
+
+
+def _claim(table, key, item, now):
+    """Move pending -> job, unless something changed since we read the row."""
+    values = {":n": item["pending_count"], ":claim": CLAIMING, ":now": now}
+    sets = ["job_id = :claim", "job_count = :n", "job_started_at = :now"]
+    if item.get("pending_keys"):
+        sets.append("job_keys = :keys")
+        values[":keys"] = item["pending_keys"]
+    if item.get("full_at") is not None:
+        sets.append("job_full = :full")
+        values[":full"] = True
+    try:
+        table.update_item(
+            Key={"sync_key": key},
+            UpdateExpression=(f"SET {', '.join(sets)} "
+                              "REMOVE pending_count, pending_keys, first_pending_at, last_change_at, "
+                              "force_at, full_at"),
+            ConditionExpression="pending_count = :n AND attribute_not_exists(job_id)",
+            ExpressionAttributeValues=values,
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def _start(table, bedrock_agent, kb_id, ds_id, claimed, now, s3, bucket, incremental_max):
+    """Start the claimed changes as a document-level or full job (or skip them)."""
+    key, keys, full = state_key(kb_id, ds_id), set(claimed.get("job_keys") or ()), bool(claimed.get("job_full"))
+    plan = None
+    if s3 is not None and bucket and keys and len(keys) <= PLAN_MAX_KEYS:
+        plan = plan_changes(table, s3, bucket, kb_id, ds_id, keys)
+        if not full and not plan["upsert"] and not plan["delete"]:
+            log("All", len(keys), "changed document(s) are unchanged re-uploads – nothing to ingest")
+            _finish(table, key, CLAIMING, "SKIPPED", now, {"numberOfDocumentsSkipped": len(keys)})
+            return {"status": "skipped", "unchanged": len(keys)}
+
+    changed = len(plan["upsert"]) + len(plan["delete"]) if plan else None
+    # document-level APIs need a recent botocore; older runtimes fall back to a full sync
+    if plan and not full and changed <= incremental_max and \
+            hasattr(bedrock_agent, "ingest_knowledge_base_documents"):
+        mode = "docs"
+        job_id = start_document_job(bedrock_agent, kb_id, ds_id, bucket, plan["upsert"], plan["delete"])
+    else:
+        mode = "full"
+        job_id = bedrock_agent.start_ingestion_job(
+            knowledgeBaseId=kb_id, dataSourceId=ds_id,
+        )["ingestionJob"]["ingestionJobId"]
+
+    sets, values = ["job_id = :job", "job_mode = :mode"], {":job": job_id, ":mode": mode, ":claim": CLAIMING}
+    if plan and plan["upsert"]:
+        sets.append("job_etags = :etags")
+        values[":etags"] = plan["upsert"]
+    if plan and plan["delete"]:
+        sets.append("job_deletes = :dels")
+        values[":dels"] = plan["delete"]
+    table.update_item(
+        Key={"sync_key": key},
+        UpdateExpression=f"SET {', '.join(sets)}",
+        ConditionExpression="job_id = :claim",
+        ExpressionAttributeValues=values,
+    )
+    log(f"Started {mode} job", job_id, "for", int(claimed["job_count"]), "change(s)",
+        f"({len(plan['upsert'])} upsert, {len(plan['delete'])} delete, {len(plan['unchanged'])} unchanged)"
+        if plan else "")
+    return {"status": "started", "job_id": job_id, "mode": mode, "changes": int(claimed["job_count"])}
+
+
+def tick(table, bedrock_agent, kb_id, ds_id, debounce=120, max_wait=900, on_complete=None, now=None,
+         s3=None, bucket=None, incremental_max=0):
+    """
+    One scheduler pass; returns a short summary for the logs.  With s3,
+    bucket and incremental_max > 0, change sets of at most incremental_max
+    documents are ingested document by document.
+    """
+    now = int(now or time.time())
+    key = state_key(kb_id, ds_id)
+    item = table.get_item(Key={"sync_key": key}, ConsistentRead=True).get("Item") or {}
+
+    if item.get("job_id"):
+        if _follow_job(table, bedrock_agent, kb_id, ds_id, bucket, item, now, on_complete):
+            return {"status": "running", "job_id": item["job_id"]}
+        item = table.get_item(Key={"sync_key": key}, ConsistentRead=True).get("Item") or {}
+
+    if not _due(item, now, debounce, max_wait):
+        return {"status": "idle" if not item.get("pending_count") else "waiting",
+                "pending": int(item.get("pending_count", 0))}
+    if not _claim(table, key, item, now):
+        return {"status": "changed", "pending": int(item.get("pending_count", 0))}
+
+    claimed = {**item, "job_count": item["pending_count"], "job_keys": item.get("pending_keys"),
+               "job_full": item.get("full_at") is not None}
+    try:
+        return _start(table, bedrock_agent, kb_id, ds_id, claimed, now, s3, bucket, incremental_max)
+    except Exception as e:
+        reason = e.response["Error"]["Code"] if isinstance(e, ClientError) else type(e).__name__
+        log("Starting the job failed:", reason, e)
+        return _start_failed(table, key, claimed, reason, now)
+
+
+def _start_failed(table, key, claimed, reason, now):
+    """Release the claim: retry later, then as a full sync, then give up."""
+    # ConflictException: a job started elsewhere (console, old code) – not our failure
+    if reason == "ConflictException":
+        _requeue(table, key, claimed, CLAIMING, False, now)
+        return {"status": "deferred", "reason": reason}
+    attempts = int(claimed.get("attempts", 0)) + 1
+    if attempts < MAX_ATTEMPTS:
+        # the last attempt is always a full ingestion
+        fallback = not claimed.get("job_full") and attempts == MAX_ATTEMPTS - 1
+        if fallback:
+            log("Falling back to a full sync for", int(claimed.get("job_count", 0)), "change(s)")
+        _requeue(table, key, {**claimed, "job_full": True} if fallback else claimed, CLAIMING, True, now)
+        return {"status": "deferred", "reason": reason, "attempts": attempts, "full": fallback}
+    log("Giving up on", int(claimed.get("job_count", 0)), "change(s) after", attempts, "failed starts")
+    _finish(table, key, CLAIMING, "FAILED", now)
+    return {"status": "failed", "reason": reason, "attempts": attempts}
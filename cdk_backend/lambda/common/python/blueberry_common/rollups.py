@@ -0,0 +1,252 @@
+"""
+Pre-aggregated analytics rollups for the session-logs table.
+
+One rollup row per day ("day#2025-06-01") and per hour ("hour#2025-06-01T13"):
+
+    turns           N    number of chat turns
+    c:<category>    N    turns per category
+    l:<location>    N    turns per location
+
+plus one sketch row per day ("sketch#2025-06-01") holding a serialised
+AnalyticsSketch (distinct sessions, top locations, top questions).
+
+logclassifier writes each batch of log rows and the matching rollup deltas
+in one TransactWriteItems call.  Every row Put is conditional on the row not
+existing yet and row keys are deterministic, so a retried batch cancels the
+transaction; the rows that already exist are dropped and the rest are
+re-sent – counters are applied exactly once per row.  The sketch rows are
+updated afterwards with an optimistic read-modify-write; they are
+approximate by design, so a crash between the two steps only loses that
+batch's contribution to the top lists.
+"""
+import time
+from collections import Counter
+
+from blueberry_common.session_buckets import DAY_ATTR, HOUR_ATTR, bucket_attributes
+from blueberry_common.sketches import AnalyticsSketch
+from blueberry_common.text import normalize_query
+
+TURNS_ATTR    = "turns"
+SKETCH_ATTR   = "sketch"
+CATEGORY_PREFIX = "c:"
+LOCATION_PREFIX = "l:"
+
+TXN_ROWS      = 25   # rows per transaction: 25 Puts + at most 50 rollup Updates < 100 actions
+TXN_ATTEMPTS  = 6
+BATCH_GET_MAX = 100
+
+
+def day_key(day):
+    return f"day#{day}"
+
+
+def hour_key(hour):
+    return f"hour#{hour}"
+
+
+def sketch_key(day):
+    return f"sketch#{day}"
+
+
+def _day_of(row):
+    return row[DAY_ATTR] if DAY_ATTR in row else bucket_attributes(row["original_ts"])[DAY_ATTR]
+
+
+def row_rollup_keys(row):
+    buckets = row if DAY_ATTR in row else bucket_attributes(row["original_ts"])
+    return [day_key(buckets[DAY_ATTR]), hour_key(buckets[HOUR_ATTR])]
+
+
+class RollupDelta:
+    """Counters accumulated for one rollup row."""
+
+    def __init__(self):
+        self.turns    = 0
+        self.counters = Counter()
+
+    def add(self, row):
+        self.turns += 1
+        if row.get("category"):
+            self.counters[CATEGORY_PREFIX + row["category"]] += 1
+        if row.get("location"):
+            self.counters[LOCATION_PREFIX + row["location"]] += 1
+
+    def as_item(self, key):
+        """Full rollup row (used by the rebuild, which overwrites instead of adding)."""
+        return {"rollup_key": key, TURNS_ATTR: self.turns, **self.counters}
+
+    def update_expression(self):
+        names, values, adds = {"#t": TURNS_ATTR}, {":t": self.turns}, ["#t :t"]
+        for i, (attr, n) in enumerate(sorted(self.counters.items())):
+            names[f"#a{i}"], values[f":a{i}"] = attr, n
+            adds.append(f"#a{i} :a{i}")
+        return "ADD " + ", ".join(adds), names, values
+
+
+def rollup_deltas(rows):
+    """{rollup_key: RollupDelta} for a list of log rows."""
+    deltas = {}
+    for row in rows:
+        for key in row_rollup_keys(row):
+            deltas.setdefault(key, RollupDelta()).add(row)
+    return deltas
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Write path
+# ──────────────────────────────────────────────────────────────────────────────
+def _transaction(table_name, rollup_table, rows):
+    actions = [
+        {"Put": {
+            "TableName": table_name,
+            "Item": row,
+            "ConditionExpression": "attribute_not_exists(session_id)",
+        }}
+        for row in rows
+    ]
+    for key, delta in rollup_deltas(rows).items():
+        expression, names, values = delta.update_expression()
+        actions.append({"Update": {
+            "TableName": rollup_table,
+            "Key": {"rollup_key": key},
+            "UpdateExpression": expression,
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": values,
+        }})
+    return actions
+
+
+def write_rows_with_rollups(client, table_name, rollup_table, rows):
+    """
+    Write log rows and their rollup increments exactly once.
+
+    client must be a resource-level client (ddb.meta.client) so plain Python
+    values are serialised.  Returns (written, duplicates, failed) row lists.
+    """
+    written, duplicates, failed = [], [], []
+    # one transaction may not touch the same row twice
+    unique = {}
+    for row in rows:
+        key = (row["session_id"], row["timestamp"])
+        if key in unique:
+            duplicates.append(row)
+        else:
+            unique[key] = row
+    rows = list(unique.values())
+
+    for start in range(0, len(rows), TXN_ROWS):
+        pending = rows[start:start + TXN_ROWS]
+        for attempt in range(TXN_ATTEMPTS):
+            try:
+                client.transact_write_items(TransactItems=_transaction(table_name, rollup_table, pending))
+                written.extend(pending)
+                pending = []
+                break
+            except client.exceptions.TransactionCanceledException as e:
+                reasons = e.response.get("CancellationReasons") or []
+                # reasons line up with the actions; the Puts come first
+                dup = {i for i, r in enumerate(reasons[:len(pending)]) if r.get("Code") == "ConditionalCheckFailed"}
+                if dup:
+                    print(f"[rollups] {len(dup)} row(s) already written – skipping their counters")
+                    duplicates.extend(pending[i] for i in sorted(dup))
+                    pending = [row for i, row in enumerate(pending) if i not in dup]
+                    if not pending:
+                        break
+                    continue
+                print(f"[rollups] transaction cancelled ({[r.get('Code') for r in reasons]}) – retry {attempt + 1}")
+            except (client.exceptions.TransactionConflictException,
+                    client.exceptions.ProvisionedThroughputExceededException) as e:
+                print(f"[rollups] {type(e).__name__} – retry {attempt + 1}")
+            time.sleep(min(2.0, 0.05 * (2 ** attempt)))
+        failed.extend(pending)
+    return written, duplicates, failed
+
+
+def add_to_sketch(sketch, row):
+    sketch.add(row.get("session_id"), row.get("location"), normalize_query(row.get("query")))
+
+
+def day_sketches(rows):
+    """{day: AnalyticsSketch} for a list of log rows."""
+    sketches = {}
+    for row in rows:
+        add_to_sketch(sketches.setdefault(_day_of(row), AnalyticsSketch()), row)
+    return sketches
+
+
+def update_day_sketches(rollup_table, rows, seen_rows=()):
+    """
+    Fold rows into their day's sketch row (conditional put on a version
+    number, re-read on conflict).  seen_rows were stored by an earlier
+    attempt: only their sessions are re-added, since the HyperLogLog is
+    idempotent but the frequency sketches are not.
+    """
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(_day_of(row), ([], []))[0].append(row)
+    for row in seen_rows:
+        by_day.setdefault(_day_of(row), ([], []))[1].append(row)
+
+    ConditionFailed = rollup_table.meta.client.exceptions.ConditionalCheckFailedException
+    for day, (new_rows, old_rows) in by_day.items():
+        key = sketch_key(day)
+        for attempt in range(TXN_ATTEMPTS):
+            item    = rollup_table.get_item(Key={"rollup_key": key}, ConsistentRead=True).get("Item")
+            sketch  = load_sketch(item) if item else AnalyticsSketch()
+            version = int(item.get("version", 0)) if item else 0
+            for row in new_rows:
+                add_to_sketch(sketch, row)
+            for row in old_rows:
+                sketch.sessions.add(row["session_id"])
+            try:
+                rollup_table.put_item(
+                    Item={"rollup_key": key, SKETCH_ATTR: sketch.dumps(), "version": version + 1},
+                    ConditionExpression="attribute_not_exists(rollup_key) OR version = :v",
+                    ExpressionAttributeValues={":v": version},
+                )
+                break
+            except ConditionFailed:
+                time.sleep(min(2.0, 0.05 * (2 ** attempt)))
+        else:
+            print(f"[rollups] gave up updating {key} after {TXN_ATTEMPTS} conflicts")
+
+
+def load_sketch(item):
+    blob = item[SKETCH_ATTR]
+    return AnalyticsSketch.loads(getattr(blob, "value", blob))   # boto3 wraps B values in Binary
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Read path
+# ──────────────────────────────────────────────────────────────────────────────
+def load_rollups(ddb, rollup_table, keys):
+    """BatchGetItem the given rollup keys (missing rows are simply absent)."""
+    rows = []
+    for start in range(0, len(keys), BATCH_GET_MAX):
+        request = {rollup_table: {"Keys": [{"rollup_key": k} for k in keys[start:start + BATCH_GET_MAX]]}}
+        for attempt in range(TXN_ATTEMPTS):
+            resp = ddb.batch_get_item(RequestItems=request)
+            rows.extend(resp.get("Responses", {}).get(rollup_table, []))
+            request = resp.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            time.sleep(min(2.0, 0.05 * (2 ** attempt)))
+        else:
+            raise RuntimeError(f"Could not read {len(request[rollup_table]['Keys'])} rollup row(s)")
+    return rows
+
+
+def merge_rollups(rows):
+    """Fold rollup and sketch rows into {turns, categories, locations, sketch}."""
+    turns, categories, locations, sketch = 0, Counter(), Counter(), AnalyticsSketch()
+    for row in rows:
+        if SKETCH_ATTR in row:
+            sketch.merge(load_sketch(row))
+            continue
+        turns += int(row.get(TURNS_ATTR, 0))
+        for attr, value in row.items():
+            if attr.startswith(CATEGORY_PREFIX):
+                categories[attr[len(CATEGORY_PREFIX):]] += int(value)
+            elif attr.startswith(LOCATION_PREFIX):
+                locations[attr[len(LOCATION_PREFIX):]] += int(value)
+    return {"turns": turns, "categories": categories, "locations": locations, "sketch": sketch}
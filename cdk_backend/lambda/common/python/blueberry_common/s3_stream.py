@@ -0,0 +1,114 @@
+"""
+Write a large object to S3 as a stream, with bounded memory.
+
+    with S3MultipartWriter(s3, bucket, key, content_type="application/x-ndjson",
+                           gzip_level=6) as out:
+        for line in lines():
+            out.write(line.encode())
+
+Bytes (gzip-compressed when gzip_level is set) are buffered until a part is
+full and then uploaded with UploadPart, so memory stays at roughly one part
+whatever the object size.  close() completes the upload (or falls back to a
+single PutObject for small objects); an exception inside the with-block
+aborts the multipart upload so no orphaned parts are left behind.
+"""
+import gzip
+
+MIN_PART_BYTES     = 5 * 1024 * 1024   # S3 minimum for every part but the last
+DEFAULT_PART_BYTES = 8 * 1024 * 1024
+
+
+class _PartSink:
+    """File-like target for GzipFile that forwards full parts to the writer."""
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, data):
+        self.writer._buffer_raw(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class S3MultipartWriter:
+
+    def __init__(self, s3, bucket, key, content_type="application/octet-stream",
+                 gzip_level=None, part_bytes=DEFAULT_PART_BYTES):
+        self.s3           = s3
+        self.bucket       = bucket
+        self.key          = key
+        self.content_type = content_type
+        self.part_bytes   = max(part_bytes, MIN_PART_BYTES)
+        self.upload_id    = None
+        self.parts        = []
+        self.buffer       = bytearray()
+        self.bytes_in     = 0
+        self.bytes_out    = 0
+        self.closed       = False
+        self.gzip = gzip.GzipFile(fileobj=_PartSink(self), mode="wb", compresslevel=gzip_level) \
+            if gzip_level is not None else None
+
+    # ---- writing -------------------------------------------------------
+    def write(self, data):
+        self.bytes_in += len(data)
+        if self.gzip is not None:
+            self.gzip.write(data)
+        else:
+            self._buffer_raw(data)
+
+    def _buffer_raw(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.part_bytes:
+            self._upload_part(bytes(self.buffer))
+            self.buffer.clear()
+
+    def _upload_part(self, body):
+        if self.upload_id is None:
+            self.upload_id = self.s3.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type,
+            )["UploadId"]
+        number = len(self.parts) + 1
+        resp = self.s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=number, Body=body,
+        )
+        self.parts.append({"PartNumber": number, "ETag": resp["ETag"]})
+        self.bytes_out += len(body)
+
+    # ---- finishing -----------------------------------------------------
+    def close(self):
+        if self.closed:
+            return
+        if self.gzip is not None:
+            self.gzip.close()          # flushes the gzip trailer into the buffer
+        if self.upload_id is None:
+            # everything fitted in one part – a plain PutObject is cheaper
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self.buffer),
+                               ContentType=self.content_type)
+            self.bytes_out += len(self.buffer)
+        else:
+            if self.buffer:
+                self._upload_part(bytes(self.buffer))
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+        self.buffer.clear()
+        self.closed = True
+
+    def abort(self):
+        if self.upload_id is not None and not self.closed:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
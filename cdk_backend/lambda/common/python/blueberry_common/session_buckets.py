@@ -0,0 +1,89 @@
+"""
+Time buckets for the session-logs table.
+
+logclassifier stamps every chat turn with a day bucket ("2025-06-01") and an
+hour bucket ("2025-06-01T13").  The day bucket is the partition key of the
+DATE_INDEX GSI (sort key original_ts), so analytics for a timeframe Query
+only the days in range instead of scanning the whole table.
+
+The first turn of each session per day also carries session_day (the same
+day), the partition key of the sparse SESSION_DAY_INDEX: one index entry
+per session and day, so listing the sessions of a day needs no dedupe.
+"""
+from datetime import datetime, timedelta
+
+from boto3.dynamodb.conditions import Key
+
+DATE_INDEX  = "ByDateBucket"
+DAY_ATTR    = "date_bucket"
+HOUR_ATTR   = "hour_bucket"
+
+SESSION_DAY_INDEX = "BySessionDay"
+SESSION_DAY_ATTR  = "session_day"
+
+
+def _parse(ts):
+    if isinstance(ts, datetime):
+        return ts
+    # SK values look like "<iso>#<suffix>"; tolerate a trailing "Z"
+    return datetime.fromisoformat(str(ts).split("#", 1)[0].rstrip("Z"))
+
+
+def day_bucket(ts):
+    return _parse(ts).strftime("%Y-%m-%d")
+
+
+def hour_bucket(ts):
+    return _parse(ts).strftime("%Y-%m-%dT%H")
+
+
+def bucket_attributes(ts):
+    """{date_bucket, hour_bucket} for an ISO timestamp (or datetime)."""
+    dt = _parse(ts)
+    return {DAY_ATTR: dt.strftime("%Y-%m-%d"), HOUR_ATTR: dt.strftime("%Y-%m-%dT%H")}
+
+
+def day_buckets(start, end):
+    """Every day bucket from start to end inclusive, oldest first."""
+    day  = _parse(start).replace(hour=0, minute=0, second=0, microsecond=0)
+    last = _parse(end)
+    out = []
+    while day <= last:
+        out.append(day.strftime("%Y-%m-%d"))
+        day += timedelta(days=1)
+    return out
+
+
+def mark_session_days(table, rows):
+    """
+    Set session_day on the rows (about to be written) that are the first
+    turn of their session that day.  A turn that arrives after a later one
+    of the same day takes the mark over from it.
+    """
+    first = {}
+    for row in rows:
+        group = (row["session_id"], row[DAY_ATTR])
+        if group not in first or row["timestamp"] < first[group]["timestamp"]:
+            first[group] = row
+    for (session_id, day), row in first.items():
+        kwargs = {
+            "KeyConditionExpression": Key("session_id").eq(session_id) & Key("timestamp").begins_with(day),
+            "ProjectionExpression": "#ts, #mark",
+            "ExpressionAttributeNames": {"#ts": "timestamp", "#mark": SESSION_DAY_ATTR},
+            "ConsistentRead": True,
+        }
+        stored = []
+        while True:
+            resp = table.query(**kwargs)
+            stored += resp.get("Items", [])
+            if "LastEvaluatedKey" not in resp:
+                break
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+        if any(it["timestamp"] < row["timestamp"] for it in stored):
+            continue
+        row[SESSION_DAY_ATTR] = day
+        for it in stored:
+            if it["timestamp"] > row["timestamp"] and SESSION_DAY_ATTR in it:
+                table.update_item(Key={"session_id": session_id, "timestamp": it["timestamp"]},
+                                  UpdateExpression="REMOVE #mark",
+                                  ExpressionAttributeNames={"#mark": SESSION_DAY_ATTR})
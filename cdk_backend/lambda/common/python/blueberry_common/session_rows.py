@@ -0,0 +1,71 @@
+"""
+Full session-log rows for a range of days, streamed.
+
+The ByDateBucket index only projects a few attributes, so the keys of the
+matching rows are read from the index (filters on projected attributes are
+applied there) and the full items are fetched with BatchGetItem, 100 at a
+time.  Memory stays at one chunk whatever the range.
+"""
+import time
+
+from boto3.dynamodb.conditions import Attr, Key
+
+from blueberry_common.session_buckets import DATE_INDEX, DAY_ATTR, day_buckets
+
+BATCH_GET_MAX      = 100
+BATCH_GET_ATTEMPTS = 8
+
+
+def index_keys(table, start, end, category=None, location=None):
+    """Primary keys of matching rows, day by day (oldest first), start/end inclusive days."""
+    start_iso = start.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+    end_iso   = end.replace(hour=23, minute=59, second=59, microsecond=999999).isoformat()
+    filters = None
+    if category:
+        filters = Attr("category").eq(category)
+    if location:
+        filters = Attr("location").eq(location) if filters is None else filters & Attr("location").eq(location)
+
+    for day in day_buckets(start, end):
+        kwargs = {
+            "IndexName": DATE_INDEX,
+            "KeyConditionExpression": Key(DAY_ATTR).eq(day) & Key("original_ts").between(start_iso, end_iso),
+            "ProjectionExpression": "session_id, #ts",
+            "ExpressionAttributeNames": {"#ts": "timestamp"},
+        }
+        if filters is not None:
+            kwargs["FilterExpression"] = filters
+        while True:
+            resp = table.query(**kwargs)
+            yield from resp.get("Items", [])
+            if "LastEvaluatedKey" not in resp:
+                break
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def fetch_rows(ddb, table_name, keys):
+    """BatchGetItem one chunk of keys, returned in the order of `keys`."""
+    found, request = {}, {table_name: {"Keys": keys}}
+    for attempt in range(BATCH_GET_ATTEMPTS):
+        resp = ddb.batch_get_item(RequestItems=request)
+        for item in resp.get("Responses", {}).get(table_name, []):
+            found[(item["session_id"], item["timestamp"])] = item
+        request = resp.get("UnprocessedKeys") or {}
+        if not request:
+            break
+        time.sleep(min(2.0, 0.05 * (2 ** attempt)))
+    else:
+        raise RuntimeError(f"{len(request[table_name]['Keys'])} row(s) still unprocessed")
+    return [found[k] for k in ((k["session_id"], k["timestamp"]) for k in keys) if k in found]
+
+
+def iter_rows(ddb, table_name, start, end, category=None, location=None):
+    """Full items between start and end (inclusive days), optionally filtered."""
+    table, chunk = ddb.Table(table_name), []
+    for key in index_keys(table, start, end, category, location):
+        chunk.append(key)
+        if len(chunk) == BATCH_GET_MAX:
+            yield from fetch_rows(ddb, table_name, chunk)
+            chunk = []
+    if chunk:
+        yield from fetch_rows(ddb, table_name, chunk)
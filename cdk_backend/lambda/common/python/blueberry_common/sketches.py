@@ -0,0 +1,248 @@
+"""
+Mergeable streaming sketches for the analytics endpoints.
+
+Every sketch has bounded size, serialises to a few KB and merges with
+another sketch of the same shape, so one sketch per day can be combined
+into any timeframe.
+
+HyperLogLog(p)        distinct count.  2**p one-byte registers; relative
+                      standard error ~ 1.04 / sqrt(2**p)  (p=12: 4 KiB, ~1.6 %).
+SpaceSaving(k)        top-k heavy hitters.  Each reported count overestimates
+                      the true count by at most its `error` field, which is
+                      <= N / k (N = total weight); every item with true
+                      count > N / k is guaranteed to be present.
+CountMinSketch(w, d)  point frequencies.  estimate >= true count and, with
+                      probability 1 - e**-d, estimate <= true + (e / w) * N
+                      (w=512, d=4: +0.53 % of N with 98 % confidence).
+
+AnalyticsSketch bundles the ones retrieveSessionLogs needs: distinct
+sessions, top locations and top normalised questions.
+"""
+import base64
+import hashlib
+import json
+import math
+import zlib
+from array import array
+
+SKETCH_VERSION = 1
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+
+
+def _pack(raw):
+    return base64.b64encode(zlib.compress(raw)).decode()
+
+
+def _unpack(text):
+    return zlib.decompress(base64.b64decode(text))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  HyperLogLog
+# ──────────────────────────────────────────────────────────────────────────────
+class HyperLogLog:
+
+    def __init__(self, p=12, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+    def add(self, value):
+        h   = _hash64(value)
+        idx = h >> (64 - self.p)
+        rest = (h << self.p) & 0xFFFFFFFFFFFFFFFF
+        # rank = position of the first 1-bit in the remaining 64 - p bits
+        rank = min(64 - rest.bit_length(), 64 - self.p) + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)   # linear counting for small cardinalities
+        return int(round(estimate))
+
+    def to_dict(self):
+        return {"p": self.p, "r": _pack(bytes(self.registers))}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["p"], _unpack(data["r"]))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Space-Saving
+# ──────────────────────────────────────────────────────────────────────────────
+class SpaceSaving:
+
+    def __init__(self, k=64, counters=None):
+        self.k = k
+        self.counters = counters or {}   # item -> [count, error]
+
+    def _min_count(self):
+        return min(c for c, _ in self.counters.values()) if len(self.counters) >= self.k else 0
+
+    def add(self, item, weight=1):
+        if not item:
+            return
+        if item in self.counters:
+            self.counters[item][0] += weight
+        elif len(self.counters) < self.k:
+            self.counters[item] = [weight, 0]
+        else:
+            victim = min(self.counters, key=lambda x: self.counters[x][0])
+            floor = self.counters.pop(victim)[0]
+            self.counters[item] = [floor + weight, floor]
+
+    def merge(self, other):
+        """
+        Mergeable summary (Agarwal et al.): an item missing from a full sketch
+        may have had up to that sketch's minimum count, so it is charged that
+        much as both count and error.  The top k survive.
+        """
+        floor_a, floor_b = self._min_count(), other._min_count()
+        merged = {}
+        for item in set(self.counters) | set(other.counters):
+            ca, ea = self.counters.get(item, (floor_a, floor_a))
+            cb, eb = other.counters.get(item, (floor_b, floor_b))
+            merged[item] = [ca + cb, ea + eb]
+        self.k = max(self.k, other.k)
+        self.counters = dict(sorted(merged.items(), key=lambda kv: -kv[1][0])[:self.k])
+        return self
+
+    def top(self, n=10):
+        """[(item, count, max_overestimate)] by descending count."""
+        ranked = sorted(self.counters.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        return [(item, c, e) for item, (c, e) in ranked[:n]]
+
+    def to_dict(self):
+        return {"k": self.k, "c": self.counters}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["k"], {item: list(ce) for item, ce in data["c"].items()})
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Count-Min
+# ──────────────────────────────────────────────────────────────────────────────
+class CountMinSketch:
+
+    def __init__(self, width=512, depth=4, table=None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else array("I", bytes(4 * width * depth))
+        self.total = 0
+
+    def _cells(self, item):
+        digest = hashlib.blake2b(str(item).encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, item, weight=1):
+        for cell in self._cells(item):
+            self.table[cell] += weight
+        self.total += weight
+
+    def estimate(self, item):
+        return min(self.table[cell] for cell in self._cells(item))
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge Count-Min sketches of different shape")
+        for i, v in enumerate(other.table):
+            self.table[i] += v
+        self.total += other.total
+        return self
+
+    def to_dict(self):
+        return {"w": self.width, "d": self.depth, "n": self.total,
+                "t": _pack(self.table.tobytes())}
+
+    @classmethod
+    def from_dict(cls, data):
+        table = array("I")
+        table.frombytes(_unpack(data["t"]))
+        sketch = cls(data["w"], data["d"], table)
+        sketch.total = data["n"]
+        return sketch
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Analytics bundle
+# ──────────────────────────────────────────────────────────────────────────────
+class AnalyticsSketch:
+    """Distinct sessions + top locations + top (normalised) questions."""
+
+    def __init__(self, sessions=None, locations=None, questions=None, question_counts=None):
+        self.sessions        = sessions or HyperLogLog()
+        self.locations       = locations or SpaceSaving(k=64)
+        self.questions       = questions or SpaceSaving(k=128)
+        self.question_counts = question_counts or CountMinSketch()
+
+    def add(self, session_id=None, location=None, question=None):
+        if session_id:
+            self.sessions.add(session_id)
+        if location:
+            self.locations.add(location)
+        if question:
+            self.questions.add(question)
+            self.question_counts.add(question)
+
+    def merge(self, other):
+        self.sessions.merge(other.sessions)
+        self.locations.merge(other.locations)
+        self.questions.merge(other.questions)
+        self.question_counts.merge(other.question_counts)
+        return self
+
+    def user_count(self):
+        return self.sessions.count()
+
+    def top_questions(self, n=10):
+        """
+        Space-Saving picks the candidates; Count-Min usually gives the tighter
+        (still never low) count after many merges, so report the smaller one.
+        """
+        out = []
+        for question, count, error in self.questions.top(n):
+            cms = self.question_counts.estimate(question)
+            best = min(count, cms)
+            out.append({"question": question, "count": best, "max_error": min(error, best)})
+        return sorted(out, key=lambda q: -q["count"])
+
+    def top_locations(self, n=10):
+        return [{"location": loc, "count": c, "max_error": e} for loc, c, e in self.locations.top(n)]
+
+    def dumps(self):
+        return zlib.compress(json.dumps({
+            "v": SKETCH_VERSION,
+            "sessions":  self.sessions.to_dict(),
+            "locations": self.locations.to_dict(),
+            "questions": self.questions.to_dict(),
+            "question_counts": self.question_counts.to_dict(),
+        }, separators=(",", ":")).encode())
+
+    @classmethod
+    def loads(cls, blob):
+        data = json.loads(zlib.decompress(blob))
+        if data.get("v") != SKETCH_VERSION:
+            raise ValueError(f"Unsupported sketch version {data.get('v')}")
+        return cls(
+            HyperLogLog.from_dict(data["sessions"]),
+            SpaceSaving.from_dict(data["locations"]),
+            SpaceSaving.from_dict(data["questions"]),
+            CountMinSketch.from_dict(data["question_counts"]),
+        )
@@ -0,0 +1,56 @@
+"""Text normalisation shared by the answer caches, the analytics sketches and the notification digest."""
+import re
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_query(text):
+    """Lower-case, strip punctuation and collapse whitespace."""
+    text = _PUNCT_RE.sub(" ", (text or "").lower())
+    return " ".join(text.split())
+
+
+_STOPWORDS = frozenset("""
+a an and are as at be been but by can could do does did for from had has have
+how i if in into is it its me my of on or our should so than that the their
+them then there these they this to was we were what when where which who why
+will with would you your
+""".split())
+
+
+def _stem(word):
+    # deliberately light: plural forms only, so "varieties" ~ "variety"
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Content words of the text: normalised, stop words dropped, plurals folded."""
+    return [_stem(w) for w in normalize_query(text).split() if w not in _STOPWORDS]
+
+
+# Words that point back into the conversation ("how do I prune them?") and
+# openers that continue it ("what about Oregon?", "tell me more").
+_REFERENCE_WORDS = frozenset("""
+it its that this these those they them their there he she his her
+above previous same else more again instead former latter
+""".split())
+_FOLLOW_UP_OPENERS = ("and ", "but ", "also ", "so ", "then ", "what about", "how about", "why not")
+
+
+def is_follow_up(text):
+    """
+    True when the question probably leans on earlier turns of its chat, so
+    an answer given in another conversation must not be reused for it.
+    Errs on the side of True: a false positive only costs a cache miss.
+    """
+    normalized = normalize_query(text)
+    words = normalized.split()
+    if normalized.startswith(_FOLLOW_UP_OPENERS) or any(w in _REFERENCE_WORDS for w in words):
+        return True
+    return len(tokenize(normalized)) < 2
@@ -0,0 +1,230 @@
+"""
+Digest mode for the notify-admin action group.
+
+Instead of one SES send_email per escalation, escalations are recorded in
+the escalations table and the agent gets its success right away.  A
+scheduled flush (EventBridge) then sends ONE digest per closed time window,
+with near-identical questions collapsed into one entry:
+
+    pk = "pending", sk = <window>#<received_at>#<id>   escalations to send
+    pk = "rate",    sk = <hour>                        emails sent that hour
+    pk = "lock",    sk = "flush"                       one flush at a time
+
+Emails (digests and urgent notifications alike) are capped at
+NOTIFY_MAX_EMAILS_PER_HOUR.  Urgent escalations – the agent's `urgent` flag
+or a NOTIFY_URGENT_KEYWORDS match – skip the window and are sent at once
+while the cap allows; otherwise they lead the next digest.  Windows that
+cannot be sent yet simply stay pending until a later flush.
+"""
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from blueberry_common.text import normalize_query, tokenize
+
+NOTIFY_MODE          = os.environ.get("NOTIFY_MODE", "immediate").lower()
+ESCALATIONS_TABLE    = os.environ.get("ESCALATIONS_TABLE", "")
+WINDOW_SECONDS       = int(os.environ.get("DIGEST_WINDOW_MINUTES", "60")) * 60
+DEDUPE_SIMILARITY    = float(os.environ.get("DIGEST_DEDUPE_SIMILARITY", "0.8"))
+MAX_DIGEST_QUESTIONS = int(os.environ.get("DIGEST_MAX_QUESTIONS", "50"))
+MAX_EMAILS_PER_HOUR  = int(os.environ.get("NOTIFY_MAX_EMAILS_PER_HOUR", "12"))    # 0 = unlimited
+URGENT_KEYWORDS      = tuple(
+    k.strip().lower() for k in os.environ.get("NOTIFY_URGENT_KEYWORDS", "urgent,emergency,asap").split(",") if k.strip()
+)
+RETENTION_SECONDS    = 14 * 24 * 3600   # unsent escalations are dropped (TTL) after two weeks
+LOCK_SECONDS         = 300
+
+PENDING_PK = "pending"
+RATE_PK    = "rate"
+LOCK_PK    = "lock"
+
+
+def is_urgent(flag, querytext):
+    if str(flag).lower() in ("true", "1", "yes"):
+        return True
+    text = normalize_query(querytext)
+    return any(word in text.split() for word in URGENT_KEYWORDS)
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+
+
+class EscalationStore:
+
+    def __init__(self, table, window_seconds=WINDOW_SECONDS, max_emails_per_hour=MAX_EMAILS_PER_HOUR):
+        self.table               = table
+        self.window_seconds      = window_seconds
+        self.max_emails_per_hour = max_emails_per_hour
+
+    # ---- escalations -----------------------------------------------------
+    def record(self, email, querytext, agent_response, urgent=False, now=None):
+        now    = now or time.time()
+        window = int(now // self.window_seconds)
+        item = {
+            "pk":             PENDING_PK,
+            "sk":             f"{window:010d}#{now:.3f}#{uuid.uuid4().hex[:8]}",
+            "window":         window,
+            "received_at":    str(now),
+            "email":          email,
+            "querytext":      querytext,
+            "agent_response": agent_response,
+            "urgent":         bool(urgent),
+            "ttl":            int(now + RETENTION_SECONDS),
+        }
+        self.table.put_item(Item=item)
+        return item
+
+    def pending(self):
+        kwargs = {"KeyConditionExpression": Key("pk").eq(PENDING_PK)}
+        while True:
+            resp = self.table.query(**kwargs)
+            yield from resp.get("Items", [])
+            if "LastEvaluatedKey" not in resp:
+                return
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    def remove(self, items):
+        with self.table.batch_writer() as batch:
+            for item in items:
+                batch.delete_item(Key={"pk": item["pk"], "sk": item["sk"]})
+
+    # ---- send rate -------------------------------------------------------
+    def take_send_slot(self, now=None):
+        """Count one email against this hour's cap; False when it is used up."""
+        if self.max_emails_per_hour <= 0:
+            return True
+        now  = now or time.time()
+        hour = int(now // 3600)
+        try:
+            self.table.update_item(
+                Key={"pk": RATE_PK, "sk": str(hour)},
+                UpdateExpression="ADD sent :one SET #ttl = :ttl",
+                ConditionExpression="attribute_not_exists(sent) OR sent < :limit",
+                ExpressionAttributeNames={"#ttl": "ttl"},
+                ExpressionAttributeValues={":one": 1, ":limit": self.max_emails_per_hour,
+                                           ":ttl": (hour + 2) * 3600},
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    # ---- flush lock ------------------------------------------------------
+    def acquire(self, owner, now=None):
+        now = now or time.time()
+        try:
+            self.table.put_item(
+                Item={"pk": LOCK_PK, "sk": "flush", "owner": owner, "ttl": int(now + LOCK_SECONDS)},
+                ConditionExpression="attribute_not_exists(pk) OR #ttl < :now",
+                ExpressionAttributeNames={"#ttl": "ttl"},
+                ExpressionAttributeValues={":now": int(now)},
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def release(self, owner):
+        try:
+            self.table.delete_item(
+                Key={"pk": LOCK_PK, "sk": "flush"},
+                ConditionExpression="#owner = :owner",
+                ExpressionAttributeNames={"#owner": "owner"},
+                ExpressionAttributeValues={":owner": owner},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+
+def _similar(a, b, threshold):
+    if not a or not b:
+        return a == b
+    return len(a & b) / len(a | b) >= threshold
+
+
+def group_similar(items, threshold=DEDUPE_SIMILARITY):
+    """
+    Collapse near-identical questions (Jaccard similarity of their content
+    words >= threshold).  Urgent groups first, then by first appearance.
+    """
+    groups = []
+    for item in sorted(items, key=lambda it: it["sk"]):
+        terms = frozenset(tokenize(item["querytext"])) or frozenset([normalize_query(item["querytext"])])
+        group = next((g for g in groups if _similar(g["terms"], terms, threshold)), None)
+        if group is None:
+            group = {"terms": terms, "question": item["querytext"], "items": [], "urgent": False}
+            groups.append(group)
+        group["items"].append(item)
+        group["urgent"] = group["urgent"] or bool(item.get("urgent"))
+    return sorted(groups, key=lambda g: not g["urgent"])
+
+
+def format_digest(groups, start, end):
+    """(subject, body) of one digest email."""
+    asked   = sum(len(g["items"]) for g in groups)
+    shown   = groups[:MAX_DIGEST_QUESTIONS]
+    lines   = [
+        "Hello Admin,",
+        "",
+        f"Users needed assistance with {len(groups)} question(s) ({asked} request(s)) "
+        f"between {_iso(start)} and {_iso(end)}:",
+        "",
+    ]
+    for n, group in enumerate(shown, 1):
+        emails = sorted({it["email"] for it in group["items"]})
+        lines += [
+            f"{n}. {'[URGENT] ' if group['urgent'] else ''}{group['question']}",
+            f"  • Asked {len(group['items'])} time(s) by: {', '.join(emails)}",
+            f"  • Agent’s Response: {group['items'][0]['agent_response']}",
+            "",
+        ]
+    if len(groups) > len(shown):
+        lines += [f"… and {len(groups) - len(shown)} more question(s).", ""]
+    lines += ["Thanks,", "Blueberry BOT"]
+    subject = f"Agent Assistance Digest – {len(groups)} question(s)"
+    if any(g["urgent"] for g in groups):
+        subject = "[URGENT] " + subject
+    return subject, "\n".join(lines)
+
+
+def flush(store, send, now=None):
+    """
+    Send one digest per closed window (or per window holding an urgent
+    escalation), oldest first, while the hourly cap allows.  send(subject,
+    body) raises on failure; the window then stays pending.
+    """
+    now, owner = now or time.time(), uuid.uuid4().hex
+    if not store.acquire(owner, now):
+        return {"status": "busy"}
+    try:
+        current = int(now // store.window_seconds)
+        windows = {}
+        for item in store.pending():
+            windows.setdefault(int(item["window"]), []).append(item)
+
+        sent, deferred = [], 0
+        for window in sorted(windows):
+            items = windows[window]
+            if window >= current and not any(it.get("urgent") for it in items):
+                continue                                 # still collecting
+            if not store.take_send_slot(now):
+                deferred = sum(len(windows[w]) for w in windows if w >= window)
+                print(f"Digest send cap reached; {deferred} escalation(s) left pending")
+                break
+            groups = group_similar(items)
+            subject, body = format_digest(groups, window * store.window_seconds,
+                                          min(now, (window + 1) * store.window_seconds))
+            send(subject, body)
+            store.remove(items)
+            sent.append({"window": window, "escalations": len(items), "questions": len(groups)})
+        return {"status": "ok", "digests": sent, "deferred": deferred}
+    finally:
+        store.release(owner)
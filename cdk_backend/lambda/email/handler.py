@@ -1,18 +1,43 @@
 import os
 import json
-import boto3
 from datetime import datetime
 
+from blueberry_common import aws
+
+import digest
+
 # lambda function created based on https://docs.aws.amazon.com/bedrock/latest/userguide/agents-lambda.html#agents-lambda-response
-ses = boto3.client("ses")
+ses = aws.client("ses")
+ddb = aws.resource("dynamodb")
+
+# Digest mode (NOTIFY_MODE=digest): escalations are recorded and mailed in batches
+store = digest.EscalationStore(ddb.Table(digest.ESCALATIONS_TABLE)) if digest.ESCALATIONS_TABLE else None
+
+
+def send_admin_email(subject, body):
+    ses.send_email(
+        Source=os.environ["VERIFIED_SOURCE_EMAIL"],
+        Destination={"ToAddresses": [os.environ["ADMIN_EMAIL"]]},
+        Message={
+            "Subject": {"Data": subject},
+            "Body":    {"Text": {"Data": body}}
+        }
+    )
+
 
 def lambda_handler(event, context):
     print("Event keys:", list(event.keys()))
 
+    # Scheduled digest flush (EventBridge) – not an agent action-group call
+    if event.get("source") == "aws.events" or event.get("action") == "flush_digest":
+        result = digest.flush(store, send_admin_email) if store else {"status": "disabled"}
+        print("Digest flush:", result)
+        return result
+
     # ---------------------------------------------------------------------
     # 1.  GLUE DATA: Pull out the three user-facing fields we care about
     # ---------------------------------------------------------------------
-    email = querytext = agent_response = None
+    email = querytext = agent_response = urgent = None
 
     # ---- 1a) first look in the top-level parameters list -----------------
     for p in event.get("parameters", []):
@@ -24,6 +49,8 @@ def lambda_handler(event, context):
             querytext = val
         elif name in ("agentresponse", "response"):
             agent_response = val
+        elif name == "urgent":
+            urgent = val
 
     # ---- 1b) if any are missing, look inside the requestBody -------------
     if (email is None or querytext is None or agent_response is None) and "requestBody" in event:
@@ -37,6 +64,8 @@ def lambda_handler(event, context):
                     querytext = val
                 elif name in ("agentresponse", "response") and agent_response is None:
                     agent_response = val
+                elif name == "urgent" and urgent is None:
+                    urgent = val
 
     # graceful fallbacks
     email          = email or "<unknown>"
@@ -46,12 +75,9 @@ def lambda_handler(event, context):
     print(f"Parsed → email:{email}  querytext:{querytext}  agentResponse:{agent_response}")
 
     # ---------------------------------------------------------------------
-    # 2.  BUSINESS LOGIC: Notify admin via SES
+    # 2.  BUSINESS LOGIC: Notify admin via SES (now, or in the next digest)
     # ---------------------------------------------------------------------
     try:
-        src   = os.environ["VERIFIED_SOURCE_EMAIL"]
-        admin = os.environ["ADMIN_EMAIL"]
-
         body = (
             f"Hello Admin,\n\n"
             f"A user needs assistance with this question:\n\n"
@@ -62,15 +88,22 @@ def lambda_handler(event, context):
             "Thanks,\nBlueberry BOT"
         )
 
-        print("Sending SES …")
-        ses.send_email(
-            Source=src,
-            Destination={"ToAddresses": [admin]},
-            Message={
-                "Subject": {"Data": "Agent Assistance Requested"},
-                "Body":    {"Text": {"Data": body}}
-            }
-        )
+        if digest.NOTIFY_MODE == "digest" and store:
+            urgent = digest.is_urgent(urgent, querytext)
+            sent = False
+            if urgent and store.take_send_slot():
+                try:
+                    print("Sending urgent SES …")
+                    send_admin_email("[URGENT] Agent Assistance Requested", body)
+                    sent = True
+                except Exception as exc:
+                    print("SES error, queueing for digest:", exc, flush=True)
+            if not sent:
+                store.record(email, querytext, agent_response, urgent)
+                print(f"Escalation recorded for digest (urgent={urgent})")
+        else:
+            print("Sending SES …")
+            send_admin_email("Agent Assistance Requested", body)
         ses_fail = False
         result_msg = "Admin has been notified successfully."
 
@@ -1,14 +1,19 @@
 import os
 import json
 import re
-import boto3
-from email import policy
-from email.parser import BytesParser
+import hashlib
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from blueberry_common import aws, kb_sync
+from blueberry_common.answer_index import AnswerIndex
+from blueberry_common.document_index import DocumentIndex
+from mime_stream import open_message, spool_stream
+
 # AWS clients
-s3              = boto3.client('s3')
-bedrock_agent   = boto3.client('bedrock-agent')
+s3              = aws.client('s3')
+ddb             = aws.resource('dynamodb')
 
 # Environment variables
 SOURCE_BUCKET   = os.environ['SOURCE_BUCKET_NAME']       # your SES email bucket
@@ -16,90 +21,198 @@ DEST_BUCKET     = os.environ['DESTINATION_BUCKET_NAME']  # your BlueberryData bu
 KB_ID           = os.environ['KNOWLEDGE_BASE_ID']
 DS_ID           = os.environ['DATA_SOURCE_ID']
 ADMIN_EMAIL     = os.environ['ADMIN_EMAIL']
+SYNC_STATE_TABLE = os.environ['SYNC_STATE_TABLE']      # debounced KB sync (kbSync scheduler)
+DOCUMENT_INDEX_TABLE = os.environ.get('DOCUMENT_INDEX_TABLE', '')
+ATTACHMENT_PREFIX    = os.environ.get('ATTACHMENT_PREFIX', 'email_attachments/')
+MAX_ATTACHMENT_BYTES = int(os.environ.get('MAX_ATTACHMENT_MB', '50')) * 1024 * 1024   # KB file limit
+RECORD_WORKERS       = int(os.environ.get('RECORD_WORKERS', '4'))
+
+# attachments filed as knowledge documents (the KB parses them itself)
+DOCUMENT_TYPES = {
+    'application/pdf': '.pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
+}
+
 
 def lambda_handler(event, context):
+    """
+    Every record of the batch (SES receipt, S3 notification, or SQS messages
+    carrying S3 notifications) is processed concurrently; all the documents
+    written are queued for ONE knowledge-base sync.  Failed records are
+    listed in batchItemFailures so SQS retries only those.
+    """
+    records = event.get('Records') or []
+    with ThreadPoolExecutor(max_workers=max(1, min(RECORD_WORKERS, len(records) or 1))) as pool:
+        results = list(pool.map(process_record, records))
+
+    written = [key for r in results if r['status'] == 'SUCCESS' for key in r['keys']]
+    if written:
+        try:
+            # kbSync coalesces the whole batch (and bursts of batches) into one job
+            kb_sync.request_sync(ddb.Table(SYNC_STATE_TABLE), KB_ID, DS_ID, keys=written)
+        except Exception as e:
+            print("ERROR: KB sync request failed:", str(e))
+            for r in results:
+                if r['status'] == 'SUCCESS' and r['keys']:
+                    r.update(status='ERROR', message=f"KB sync request failed: {e}")
+
+    index_documents([d for r in results if r['status'] == 'SUCCESS' for d in r.pop('documents', [])])
+
+    failed = [r for r in results if r['status'] != 'SUCCESS']
+    for r in failed:
+        print("ERROR:", r['id'], r.get('message'))
+    if failed:
+        print("Event payload:", json.dumps(event))
+    return {
+        'status':  'SUCCESS' if not failed else ('ERROR' if len(failed) == len(results) else 'PARTIAL'),
+        'results': [{k: v for k, v in r.items() if k != 'documents'} for r in results],
+        'batchItemFailures': [{'itemIdentifier': r['id']} for r in failed],
+    }
+
+
+def _locations(rec):
+    """(record id, [(bucket, key), ...]) for one SES / S3 / SQS record."""
+    if 'ses' in rec:
+        # Invoked by SES receipt rule
+        msg_id = rec['ses']['mail']['messageId']
+        return msg_id, [(SOURCE_BUCKET, f"incoming/{msg_id}")]
+    if 's3' in rec:
+        # Invoked by a generic S3 ObjectCreated event
+        key = urllib.parse.unquote_plus(rec['s3']['object']['key'])
+        return f"{rec['s3']['bucket']['name']}/{key}", [(rec['s3']['bucket']['name'], key)]
+    if 'body' in rec:
+        # SQS message carrying an S3 notification (the test event has no Records)
+        inner = json.loads(rec['body']).get('Records') or []
+        return rec['messageId'], [loc for r in inner if 's3' in r for loc in _locations(r)[1]]
+    raise ValueError("Unsupported event type")
+
+
+def process_record(rec):
+    """Returns {id, status, keys, documents, message?} – never raises."""
     try:
-        rec = event['Records'][0]
-        
-        # 1) Fetch raw email bytes from S3
-        if 'ses' in rec:
-            # Invoked by SES receipt rule
-            mail      = rec['ses']['mail']
-            msg_id    = mail['messageId']
-            s3_key    = f"incoming/{msg_id}"
-            print(f"[SES] Pulling s3://{SOURCE_BUCKET}/{s3_key}")
-            raw_obj   = s3.get_object(Bucket=SOURCE_BUCKET, Key=s3_key)
-            raw_bytes = raw_obj['Body'].read()
-        
-        elif 's3' in rec:
-            # Invoked by a generic S3 ObjectCreated event
-            bucket    = rec['s3']['bucket']['name']
-            key       = rec['s3']['object']['key']
-            print(f"[S3 ] Pulling s3://{bucket}/{key}")
-            raw_obj   = s3.get_object(Bucket=bucket, Key=key)
-            raw_bytes = raw_obj['Body'].read()
-        
-        else:
-            raise ValueError("Unsupported event type")
-
-        # 2) Parse MIME and extract text/plain
-        msg = BytesParser(policy=policy.default).parsebytes(raw_bytes)
-        body = None
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_type() == 'text/plain':
-                    body = part.get_content()
-                    break
-        else:
-            if msg.get_content_type() == 'text/plain':
-                body = msg.get_content()
-
-        if not body:
-            raise ValueError("No text/plain part found in email")
-
-        # 3) Extract QUESTION / ANSWER
-        question, answer = extract_qna(body)
-        if not question or not answer:
-            raise ValueError("Failed to extract QUESTION/ANSWER")
+        rec_id, locations = _locations(rec)
+    except Exception as e:
+        return {'id': rec.get('messageId', '?'), 'status': 'ERROR', 'keys': [], 'message': str(e)}
+
+    result = {'id': rec_id, 'status': 'SUCCESS', 'keys': [], 'documents': []}
+    try:
+        for bucket, key in locations:
+            keys, documents = process_email(bucket, key)
+            result['keys'] += keys
+            result['documents'] += documents
+    except Exception as e:
+        result.update(status='ERROR', message=str(e))
+    return result
 
+
+def process_email(bucket, key):
+    """
+    Streams one raw email: the text/plain body becomes an approved Q&A under
+    admin_answers/, PDF/DOCX attachments are filed under ATTACHMENT_PREFIX.
+    Output keys derive from the message, so a retried record overwrites
+    rather than duplicates.
+    """
+    print(f"[S3 ] Pulling s3://{bucket}/{key}")
+    obj    = s3.get_object(Bucket=bucket, Key=key)
+    ts     = obj['LastModified'].strftime("%Y%m%d_%H%M%SZ")
+    digest = hashlib.sha1(f"{bucket}/{key}".encode('utf-8')).hexdigest()[:10]
+
+    body, keys, documents = None, [], []
+    with spool_stream(obj['Body']) as raw:
+        _, parts = open_message(raw)
+        for part in parts:
+            if part.is_attachment:
+                doc = store_attachment(part, f"{ts}_{digest}")
+                if doc:
+                    keys.append(doc['key'])
+                    documents.append(doc)
+            elif body is None and part.content_type == 'text/plain':
+                body = part.text()
+
+    # Extract QUESTION / ANSWER
+    question, answer = extract_qna(body) if body else (None, None)
+    if question and answer:
         print("Extracted Q:", question)
         print("Extracted A:", answer)
+        keys.append(store_answer(question, answer, f"admin_answers/{ts}_{digest}.txt"))
+    elif not documents:
+        raise ValueError("No text/plain QUESTION/ANSWER and no PDF/DOCX attachment in email")
+    return keys, documents
 
-        # 4) Write out to DEST_BUCKET under admin_answers/
-        ts       = datetime.utcnow().strftime("%Y%m%d_%H%M%SZ")
-        out_key  = f"admin_answers/{ts}.txt"
-        content  = (
-            f"Q: {question}\n"
-            f"A: {answer}\n\n"
-            f"Approved by: {ADMIN_EMAIL}\n"
-            f"Date: {datetime.utcnow().isoformat()}Z\n"
-        ).encode('utf-8')
-
-        s3.put_object(
-            Bucket      = DEST_BUCKET,
-            Key         = out_key,
-            Body        = content,
-            ContentType = 'text/plain',
-            Metadata    = {
-                'question':    question,
-                'approved_by': ADMIN_EMAIL
-            }
-        )
-        print(f"Uploaded Q&A to s3://{DEST_BUCKET}/{out_key}")
-
-        # 5) Trigger Bedrock ingestion
-        resp = bedrock_agent.start_ingestion_job(
-            knowledgeBaseId = KB_ID,
-            dataSourceId    = DS_ID
-        )
-
-        print("Bedrock ingestion response:", resp)
-        return { 'status': 'SUCCESS' }
 
+def store_answer(question, answer, out_key):
+    content  = (
+        f"Q: {question}\n"
+        f"A: {answer}\n\n"
+        f"Approved by: {ADMIN_EMAIL}\n"
+        f"Date: {datetime.utcnow().isoformat()}Z\n"
+    ).encode('utf-8')
+
+    s3.put_object(
+        Bucket      = DEST_BUCKET,
+        Key         = out_key,
+        Body        = content,
+        ContentType = 'text/plain',
+        Metadata    = {
+            # S3 metadata must be ASCII
+            'question':    question[:1024].encode('ascii', 'ignore').decode(),
+            'approved_by': ADMIN_EMAIL
+        }
+    )
+    print(f"Uploaded Q&A to s3://{DEST_BUCKET}/{out_key}")
+    index_answer(out_key, question, answer)
+    return out_key
+
+
+def index_answer(key, question, answer):
+    """Make the answer servable by cfEvaluator's approved-answer fast path (best effort)."""
+    if not DOCUMENT_INDEX_TABLE:
+        return
+    try:
+        AnswerIndex(ddb.Table(DOCUMENT_INDEX_TABLE), s3, DEST_BUCKET).put(key, question, answer)
     except Exception as e:
-        print("ERROR:", str(e))
-        print("Event payload:", json.dumps(event))
-        return { 'status': 'ERROR', 'message': str(e) }
+        print("Answer index update failed:", key, str(e))
+
+
+def _document_ext(part):
+    ext = os.path.splitext(part.filename or '')[1].lower()
+    if ext in DOCUMENT_TYPES.values():
+        return ext
+    return DOCUMENT_TYPES.get(part.content_type)
+
+
+def store_attachment(part, folder):
+    ext = _document_ext(part)
+    if not ext:
+        print(f"Skipping attachment {part.filename!r} ({part.content_type})")
+        return None
+    if not part.size or part.size > MAX_ATTACHMENT_BYTES:
+        print(f"Skipping attachment {part.filename!r}: {part.size} bytes")
+        return None
+
+    name = os.path.basename((part.filename or '').replace('\\', '/')) or f"attachment{ext}"
+    if not name.lower().endswith(ext):
+        name += ext
+    out_key = f"{ATTACHMENT_PREFIX}{folder}/{name}"
+    s3.upload_fileobj(part.body, DEST_BUCKET, out_key, ExtraArgs={
+        'ContentType': next(t for t, e in DOCUMENT_TYPES.items() if e == ext),
+        'Metadata':    {'approved_by': ADMIN_EMAIL},
+    })
+    head = s3.head_object(Bucket=DEST_BUCKET, Key=out_key)
+    print(f"Uploaded attachment to s3://{DEST_BUCKET}/{out_key} ({part.size} bytes)")
+    return {'key': out_key, 'head': head}
+
+
+def index_documents(documents):
+    """List the filed attachments on the admin documents page (best effort)."""
+    if not documents or not DOCUMENT_INDEX_TABLE:
+        return
+    index = DocumentIndex(ddb.Table(DOCUMENT_INDEX_TABLE))
+    for doc in documents:
+        try:
+            index.put_head(doc['key'], doc['head'])
+        except Exception as e:
+            print("Document index update failed:", doc['key'], str(e))
 
 
 def extract_qna(body_text):
@@ -0,0 +1,205 @@
+"""
+Incremental MIME parsing for emailReply.
+
+email.parser builds the whole message – every attachment as a decoded
+string – in memory.  iter_parts() instead reads the raw message line by
+line from a file object and yields one Part per leaf of the MIME tree,
+with its body already transfer-decoded (base64 / quoted-printable) into a
+SpooledTemporaryFile: small parts stay in memory, large attachments spill
+to /tmp.  An attached message (message/rfc822) is a single leaf.  Only
+one part is open at a time, so memory stays at about one spool plus one
+line however big the message is.
+
+    with spool_stream(s3.get_object(...)["Body"]) as raw:
+        headers, parts = open_message(raw)
+        for part in parts:
+            if part.is_attachment: s3.upload_fileobj(part.body, ...)
+            else:                  text = part.text()
+
+A part is only valid until the loop moves on to the next one.
+"""
+import binascii
+import re
+import shutil
+import tempfile
+from email import policy
+from email.parser import BytesHeaderParser
+
+SPOOL_BYTES  = 1024 * 1024    # per-part (and raw message) memory before spilling to disk
+MAX_LINE     = 64 * 1024      # longer lines are read in pieces
+MAX_HEADERS  = 256 * 1024     # header block size guard
+MAX_DEPTH    = 8              # nested multiparts
+
+_WS = re.compile(rb"\s+")
+
+
+def spool_stream(stream, chunk_size=256 * 1024, spool_bytes=SPOOL_BYTES):
+    """Copy a (non-seekable) stream such as an S3 body into a rewound spooled file."""
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    shutil.copyfileobj(stream, spool, chunk_size)
+    spool.seek(0)
+    return spool
+
+
+class Part:
+
+    def __init__(self, headers, spool_bytes=SPOOL_BYTES):
+        self.headers = headers
+        self.body    = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+        self.size    = 0
+
+    @property
+    def content_type(self):
+        return self.headers.get_content_type()
+
+    @property
+    def filename(self):
+        return self.headers.get_filename()
+
+    @property
+    def is_attachment(self):
+        return self.headers.get_content_disposition() == "attachment" or bool(self.filename)
+
+    def text(self, limit=SPOOL_BYTES):
+        self.body.seek(0)
+        data = self.body.read(limit)
+        charset = self.headers.get_content_charset() or "utf-8"
+        try:
+            return data.decode(charset, errors="replace")
+        except LookupError:
+            return data.decode("utf-8", errors="replace")
+
+    def close(self):
+        self.body.close()
+
+
+class _Decoder:
+    """Transfer-decodes a part body line by line into a file."""
+
+    def __init__(self, encoding, out):
+        self.encoding = (encoding or "7bit").lower()
+        self.out      = out
+        self.pending  = b""      # base64 characters not yet a multiple of 4
+        self.written  = 0
+
+    def _write(self, data):
+        if data:
+            self.out.write(data)
+            self.written += len(data)
+
+    def line(self, data):
+        if self.encoding == "base64":
+            self.pending += _WS.sub(b"", data)
+            cut = len(self.pending) - len(self.pending) % 4
+            if cut:
+                try:
+                    self._write(binascii.a2b_base64(self.pending[:cut]))
+                except binascii.Error:
+                    pass         # corrupt base64: drop the chunk, keep going
+                self.pending = self.pending[cut:]
+        elif self.encoding == "quoted-printable":
+            self._write(binascii.a2b_qp(data))
+        else:
+            self._write(data)
+
+    def finish(self):
+        if self.encoding == "base64" and self.pending:
+            try:
+                self._write(binascii.a2b_base64(self.pending + b"=" * (-len(self.pending) % 4)))
+            except binascii.Error:
+                pass
+        self.out.seek(0)
+        return self.written
+
+
+def _read_headers(fp):
+    lines, size = [], 0
+    while True:
+        line = fp.readline(MAX_LINE)
+        if not line or line in (b"\r\n", b"\n"):
+            break
+        size += len(line)
+        if size <= MAX_HEADERS:
+            lines.append(line)
+    return BytesHeaderParser(policy=policy.default).parsebytes(b"".join(lines))
+
+
+def _delimiter(line, boundaries):
+    """(boundary, closing) when the line is a delimiter of an open multipart."""
+    if not line.startswith(b"--"):
+        return None
+    stripped = line.rstrip()
+    for boundary in reversed(boundaries):
+        marker = b"--" + boundary
+        if stripped == marker:
+            return boundary, False
+        if stripped == marker + b"--":
+            return boundary, True
+    return None
+
+
+def _skip(fp, boundaries):
+    """Discard lines (preamble / epilogue) up to the next delimiter; None at EOF."""
+    while True:
+        line = fp.readline(MAX_LINE)
+        if not line:
+            return None
+        found = _delimiter(line, boundaries)
+        if found:
+            return found
+
+
+def _leaf(fp, headers, boundaries, spool_bytes):
+    """Read one leaf body; returns (part, delimiter that ended it or None)."""
+    part    = Part(headers, spool_bytes)
+    decoder = _Decoder(headers.get("Content-Transfer-Encoding"), part.body)
+    held    = None          # previous line – its line break belongs to a following delimiter
+    found   = None
+    while True:
+        line = fp.readline(MAX_LINE)
+        if not line:
+            break
+        found = _delimiter(line, boundaries) if boundaries else None
+        if found:
+            break
+        if held is not None:
+            decoder.line(held)
+        held = line
+    if held is not None:
+        decoder.line(held.rstrip(b"\r\n") if found else held)
+    part.size = decoder.finish()
+    return part, found
+
+
+def _walk(fp, headers, boundaries, spool_bytes):
+    """Yields leaf parts; returns the delimiter that ended this entity (or None at EOF)."""
+    boundary = headers.get_boundary() if headers.get_content_maintype() == "multipart" else None
+    if not boundary or len(boundaries) >= MAX_DEPTH:
+        part, found = _leaf(fp, headers, boundaries, spool_bytes)
+        try:
+            yield part
+        finally:
+            part.close()
+        return found
+
+    boundary = boundary.encode("utf-8", "replace")
+    stack    = boundaries + [boundary]
+    found    = _skip(fp, stack)
+    while found and found[0] == boundary and not found[1]:
+        found = yield from _walk(fp, _read_headers(fp), stack, spool_bytes)
+    if found and found[0] == boundary:        # our closing delimiter – skip the epilogue
+        found = _skip(fp, boundaries) if boundaries else None
+    return found
+
+
+def open_message(fp, spool_bytes=SPOOL_BYTES):
+    """
+    (top-level headers, generator of leaf Parts) for the raw RFC 5322
+    message in the binary file fp.
+    """
+    headers = _read_headers(fp)
+    return headers, _walk(fp, headers, [], spool_bytes)
+
+
+def iter_parts(fp, spool_bytes=SPOOL_BYTES):
+    return open_message(fp, spool_bytes)[1]
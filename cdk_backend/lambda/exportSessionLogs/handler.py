@@ -0,0 +1,205 @@
+"""
+Bulk export of BlueberriesDashboardSessionlogs.
+
+  POST /session-logs/export            {start, end, format, category?, location?}
+      validates the request, records a "running" status object and
+      re-invokes this function asynchronously; returns 202 + export_id.
+
+  GET  /session-logs/export/{exportId}
+      the status object; once done it carries row_count and a fresh
+      presigned download link.
+
+The export itself walks the ByDateBucket index day by day (category and
+location filters are applied on the index), fetches the full rows with
+BatchGetItem 100 at a time and streams them as gzip'd NDJSON or CSV into an
+S3 multipart upload – memory stays at about one 8 MiB part no matter how
+many rows are exported.
+"""
+import csv
+import io
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+from blueberry_common import aws
+from blueberry_common.s3_stream import S3MultipartWriter
+from blueberry_common.session_rows import iter_rows
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Env & AWS clients
+# ──────────────────────────────────────────────────────────────────────────────
+TABLE_NAME     = os.environ["DYNAMODB_TABLE"]
+EXPORT_BUCKET  = os.environ["EXPORT_BUCKET"]
+EXPORT_PREFIX  = os.environ.get("EXPORT_PREFIX", "exports/")
+URL_TTL        = int(os.environ.get("EXPORT_URL_TTL", "3600"))
+MAX_RANGE_DAYS = int(os.environ.get("EXPORT_MAX_DAYS", "731"))
+
+s3            = aws.client("s3")
+lambda_client = aws.client("lambda")
+ddb           = aws.resource("dynamodb")
+
+FORMATS = ("ndjson", "csv")
+COLUMNS = ["session_id", "original_ts", "location", "category", "confidence", "query", "response"]
+
+CORS_HEADERS = {
+    "Content-Type": "application/json",
+    "Access-Control-Allow-Origin": "*",
+}
+
+
+def log(*msg):
+    print("[EXPORT]", *msg)
+
+
+def respond(status_code, body):
+    return {"statusCode": status_code, "headers": CORS_HEADERS, "body": json.dumps(body, default=_json_default)}
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Status objects (exports/<id>/status.json)
+# ──────────────────────────────────────────────────────────────────────────────
+def status_key(export_id):
+    return f"{EXPORT_PREFIX}{export_id}/status.json"
+
+
+def put_status(export_id, status):
+    s3.put_object(Bucket=EXPORT_BUCKET, Key=status_key(export_id),
+                  Body=json.dumps(status).encode(), ContentType="application/json")
+
+
+def get_status(export_id):
+    try:
+        return json.loads(s3.get_object(Bucket=EXPORT_BUCKET, Key=status_key(export_id))["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        return None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Row stream
+# ──────────────────────────────────────────────────────────────────────────────
+def encode_lines(rows, fmt):
+    """Serialise rows one line at a time (CSV starts with a header line)."""
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow([_json_default(row[c]) if isinstance(row.get(c), Decimal) else row.get(c, "")
+                             for c in COLUMNS])
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():   # header only – no rows matched
+            yield buf.getvalue().encode()
+    else:
+        for row in rows:
+            yield (json.dumps({c: row.get(c) for c in COLUMNS}, default=_json_default) + "\n").encode()
+
+
+def run_export(export_id, params):
+    fmt   = params["format"]
+    key   = f"{EXPORT_PREFIX}{export_id}/session_logs_{params['start']}_{params['end']}.{fmt}.gz"
+    start = datetime.strptime(params["start"], "%Y-%m-%d")
+    end   = datetime.strptime(params["end"], "%Y-%m-%d")
+
+    status = get_status(export_id) or {"export_id": export_id, "params": params}
+    began, counter = time.time(), {"rows": 0}
+
+    def counted(rows):
+        for row in rows:
+            counter["rows"] += 1
+            yield row
+
+    try:
+        rows_in = counted(iter_rows(ddb, TABLE_NAME, start, end, params.get("category"), params.get("location")))
+        with S3MultipartWriter(s3, EXPORT_BUCKET, key, content_type="application/gzip", gzip_level=6) as out:
+            for line in encode_lines(rows_in, fmt):
+                out.write(line)
+        rows = counter["rows"]
+        status.update(state="done", key=key, row_count=rows, bytes=out.bytes_out,
+                      seconds=round(time.time() - began, 1), finished_at=datetime.utcnow().isoformat())
+        log(f"Export {export_id}: {rows} rows, {out.bytes_out} bytes gzip'd, {status['seconds']} s")
+    except Exception as e:
+        log(f"Export {export_id} failed: {e}")
+        status.update(state="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+    put_status(export_id, status)
+    return status
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  API
+# ──────────────────────────────────────────────────────────────────────────────
+def parse_request(body):
+    try:
+        start = datetime.strptime(body["start"], "%Y-%m-%d")
+        end   = datetime.strptime(body.get("end") or datetime.utcnow().strftime("%Y-%m-%d"), "%Y-%m-%d")
+    except (KeyError, ValueError):
+        raise ValueError("start (and optional end) must be YYYY-MM-DD")
+    if end < start:
+        raise ValueError("end is before start")
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f"range is limited to {MAX_RANGE_DAYS} days")
+    fmt = (body.get("format") or "ndjson").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    return {
+        "start":    start.strftime("%Y-%m-%d"),
+        "end":      end.strftime("%Y-%m-%d"),
+        "format":   fmt,
+        "category": body.get("category") or None,
+        "location": body.get("location") or None,
+    }
+
+
+def start_export(event, context):
+    try:
+        params = parse_request(json.loads(event.get("body") or "{}"))
+    except ValueError as e:
+        return respond(400, {"error": str(e)})
+
+    export_id = uuid.uuid4().hex
+    put_status(export_id, {
+        "export_id":  export_id,
+        "state":      "running",
+        "params":     params,
+        "created_at": datetime.utcnow().isoformat(),
+    })
+    lambda_client.invoke(
+        FunctionName=context.function_name,
+        InvocationType="Event",
+        Payload=json.dumps({"action": "run_export", "export_id": export_id, "params": params}),
+    )
+    log(f"Export {export_id} queued: {params}")
+    return respond(202, {"export_id": export_id, "state": "running"})
+
+
+def export_status(export_id):
+    status = get_status(export_id)
+    if status is None:
+        return respond(404, {"error": f"Unknown export {export_id}"})
+    if status.get("state") == "done":
+        status["download_url"] = s3.generate_presigned_url(
+            "get_object", Params={"Bucket": EXPORT_BUCKET, "Key": status["key"]}, ExpiresIn=URL_TTL,
+        )
+    return respond(200, status)
+
+
+def lambda_handler(event, context):
+    if event.get("action") == "run_export":
+        return run_export(event["export_id"], event["params"])
+
+    log("Method / resource :", event.get("httpMethod"), event.get("resource"))
+    if event.get("httpMethod") == "POST":
+        return start_export(event, context)
+    if export_id := (event.get("pathParameters") or {}).get("exportId"):
+        return export_status(export_id)
+    return respond(400, {"error": "POST an export request or GET /export/{exportId}"})
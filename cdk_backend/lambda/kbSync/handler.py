@@ -0,0 +1,50 @@
+"""
+Knowledge-base sync scheduler (EventBridge, every minute).
+
+adminFile and emailReply only record changes (blueberry_common.kb_sync);
+this function debounces them and runs at most one ingestion job at a time
+for the BlueberryData data source – document by document for up to
+KB_SYNC_INCREMENTAL_MAX changed objects (0 disables), a full data-source
+sync otherwise.  The answer cache is invalidated when a
+job completes, i.e. once the new content is actually searchable.
+"""
+import os
+
+from blueberry_common import aws, kb_sync
+from blueberry_common.cache_generation import bump_generation
+
+KNOWLEDGE_BASE_ID    = os.environ["KNOWLEDGE_BASE_ID"]
+DATA_SOURCE_ID       = os.environ["DATA_SOURCE_ID"]
+BUCKET_NAME          = os.environ.get("BUCKET_NAME", "")
+SYNC_STATE_TABLE     = os.environ["SYNC_STATE_TABLE"]
+SEMANTIC_CACHE_TABLE = os.environ.get("SEMANTIC_CACHE_TABLE", "")
+DEBOUNCE_SECONDS     = int(os.environ.get("KB_SYNC_DEBOUNCE_SECONDS", "120"))
+MAX_WAIT_SECONDS     = int(os.environ.get("KB_SYNC_MAX_WAIT_SECONDS", "900"))
+INCREMENTAL_MAX      = int(os.environ.get("KB_SYNC_INCREMENTAL_MAX", "25"))
+
+bedrock_agent = aws.client("bedrock-agent")
+s3            = aws.client("s3")
+ddb           = aws.resource("dynamodb")
+state_table   = ddb.Table(SYNC_STATE_TABLE)
+
+
+def invalidate_answer_cache(job):
+    """Bump the semantic-cache generation so cfEvaluator stops serving old answers."""
+    if not SEMANTIC_CACHE_TABLE:
+        return
+    try:
+        bump_generation(ddb.Table(SEMANTIC_CACHE_TABLE))
+        kb_sync.log("Answer cache invalidated after job", job["ingestionJobId"])
+    except Exception as exc:
+        kb_sync.log("Answer cache invalidate ERROR:", exc)
+
+
+def lambda_handler(event, context):
+    result = kb_sync.tick(
+        state_table, bedrock_agent, KNOWLEDGE_BASE_ID, DATA_SOURCE_ID,
+        debounce=DEBOUNCE_SECONDS, max_wait=MAX_WAIT_SECONDS,
+        on_complete=invalidate_answer_cache,
+        s3=s3, bucket=BUCKET_NAME, incremental_max=INCREMENTAL_MAX,
+    )
+    kb_sync.log("Tick:", result)
+    return result
@@ -0,0 +1,149 @@
+"""
+Stamp existing session-log rows with date_bucket / hour_bucket so they show
+up in the ByDateBucket index used by retrieveSessionLogs.
+
+    python backfill_buckets.py --table BlueberriesDashboardSessionlogs [--segments 8] [--dry-run]
+
+Parallel Scan with one worker per segment; each row missing date_bucket is
+updated with a conditional write, so re-running (or running while
+logclassifier is writing new rows) is safe.
+
+With --session-days (after the buckets are in place) the first turn of every
+session per day gets session_day instead, for the BySessionDay index of the
+sessions listing; a mark on any later turn of that day is removed.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+# run from a checkout: the shared layer lives in lambda/common/python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common", "python"))
+from blueberry_common.session_buckets import (  # noqa: E402
+    DAY_ATTR, HOUR_ATTR, SESSION_DAY_ATTR, bucket_attributes,
+)
+
+
+def backfill_segment(table_name, segment, total_segments, dry_run):
+    # resources are not thread-safe: one session per worker
+    table = boto3.session.Session().resource("dynamodb").Table(table_name)
+    ConditionFailed = table.meta.client.exceptions.ConditionalCheckFailedException
+    kwargs = {
+        "Segment":       segment,
+        "TotalSegments": total_segments,
+        "ProjectionExpression":     "session_id, #ts, original_ts, #day",
+        "FilterExpression":         "attribute_not_exists(#day)",
+        "ExpressionAttributeNames": {"#ts": "timestamp", "#day": DAY_ATTR},
+    }
+    updated = skipped = 0
+    while True:
+        resp = table.scan(**kwargs)
+        for item in resp.get("Items", []):
+            # original_ts is the index sort key; very old rows only carry it in the SK
+            original_ts = item.get("original_ts") or item.get("timestamp", "").split("#", 1)[0]
+            try:
+                buckets = bucket_attributes(original_ts)
+            except ValueError:
+                skipped += 1
+                continue
+            if dry_run:
+                updated += 1
+                continue
+            try:
+                table.update_item(
+                    Key={"session_id": item["session_id"], "timestamp": item["timestamp"]},
+                    UpdateExpression="SET #day = :day, #hour = :hour, original_ts = if_not_exists(original_ts, :ts)",
+                    ConditionExpression="attribute_exists(session_id) AND attribute_not_exists(#day)",
+                    ExpressionAttributeNames={"#day": DAY_ATTR, "#hour": HOUR_ATTR},
+                    ExpressionAttributeValues={
+                        ":day": buckets[DAY_ATTR], ":hour": buckets[HOUR_ATTR], ":ts": original_ts,
+                    },
+                )
+                updated += 1
+            except ConditionFailed:
+                skipped += 1
+        if "LastEvaluatedKey" not in resp:
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    print(f"segment {segment}: {updated} updated, {skipped} skipped")
+    return updated, skipped
+
+
+def scan_session_days(table_name, segment, total_segments):
+    """{(session_id, day): [(timestamp, marked), ...]} for one segment."""
+    table = boto3.session.Session().resource("dynamodb").Table(table_name)
+    kwargs = {
+        "Segment":       segment,
+        "TotalSegments": total_segments,
+        "ProjectionExpression":     "session_id, #ts, #day, #mark",
+        "FilterExpression":         "attribute_exists(#day)",
+        "ExpressionAttributeNames": {"#ts": "timestamp", "#day": DAY_ATTR, "#mark": SESSION_DAY_ATTR},
+    }
+    turns = {}
+    while True:
+        resp = table.scan(**kwargs)
+        for item in resp.get("Items", []):
+            turns.setdefault((item["session_id"], item[DAY_ATTR]), []).append(
+                (item["timestamp"], SESSION_DAY_ATTR in item))
+        if "LastEvaluatedKey" not in resp:
+            return turns
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def backfill_session_days(table_name, total_segments, dry_run):
+    with ThreadPoolExecutor(max_workers=total_segments) as pool:
+        segments = list(pool.map(lambda seg: scan_session_days(table_name, seg, total_segments),
+                                 range(total_segments)))
+    turns = {}
+    for segment in segments:
+        for group, rows in segment.items():
+            turns.setdefault(group, []).extend(rows)
+
+    table = boto3.resource("dynamodb").Table(table_name)
+    marked = unmarked = 0
+    for (session_id, day), rows in turns.items():
+        rows.sort()
+        (first_ts, first_marked), stale = rows[0], [ts for ts, mark in rows[1:] if mark]
+        marked, unmarked = marked + (not first_marked), unmarked + len(stale)
+        if dry_run:
+            continue
+        names = {"#mark": SESSION_DAY_ATTR}
+        if not first_marked:
+            table.update_item(Key={"session_id": session_id, "timestamp": first_ts},
+                              UpdateExpression="SET #mark = :day",
+                              ExpressionAttributeNames=names, ExpressionAttributeValues={":day": day})
+        for ts in stale:
+            table.update_item(Key={"session_id": session_id, "timestamp": ts},
+                              UpdateExpression="REMOVE #mark", ExpressionAttributeNames=names)
+    verb = "would mark" if dry_run else "marked"
+    print(f"Done: {verb} {marked} first turn(s), {unmarked} stale mark(s) of {len(turns)} session-day(s)")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", required=True, help="DynamoDB session-logs table")
+    parser.add_argument("--segments", type=int, default=8, help="parallel scan segments")
+    parser.add_argument("--dry-run", action="store_true", help="count rows without writing")
+    parser.add_argument("--session-days", action="store_true",
+                        help="mark the first turn of each session per day (BySessionDay index)")
+    args = parser.parse_args(argv)
+    if args.session_days:
+        return backfill_session_days(args.table, args.segments, args.dry_run)
+
+    with ThreadPoolExecutor(max_workers=args.segments) as pool:
+        results = list(pool.map(
+            lambda seg: backfill_segment(args.table, seg, args.segments, args.dry_run),
+            range(args.segments),
+        ))
+    updated = sum(u for u, _ in results)
+    skipped = sum(s for _, s in results)
+    verb = "would update" if args.dry_run else "updated"
+    print(f"Done: {verb} {updated} row(s), skipped {skipped}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
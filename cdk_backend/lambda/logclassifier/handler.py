@@ -1,19 +1,84 @@
 import os
 import json
+import hashlib
+import re
+import time
 import uuid
 from datetime import datetime
 from decimal import Decimal
-import boto3
 from botocore.exceptions import ClientError
 
+from blueberry_common import aws
+from blueberry_common.bedrock_limiter import LimiterTimeout, get_limiter
+from blueberry_common.rollups import update_day_sketches, write_rows_with_rollups
+from blueberry_common.session_buckets import bucket_attributes, mark_session_days
+from local_classifier import load_model
+
 # ─── Configuration ────────────────────────────────────────────────────────────
 DYNAMODB_TABLE   = os.environ['DYNAMODB_TABLE']
+ROLLUP_TABLE     = os.environ.get('ROLLUP_TABLE', '')   # per-day/hour analytics counters
 BEDROCK_MODEL_ID = os.environ.get('BEDROCK_MODEL_ID', 'us.amazon.nova-lite-v1:0')
+BATCH_PROMPT_SIZE = int(os.environ.get('BATCH_PROMPT_SIZE', '25'))   # questions per converse call
+WRITE_MAX_ATTEMPTS = 6
+
+# Local fast path: trained artifact (see train_classifier.py); Bedrock is only
+# asked when the local posterior is below the threshold.
+MODEL_BUCKET    = os.environ.get('BUCKET', '')
+MODEL_S3_KEY    = os.environ.get('CATEGORY_MODEL_S3_KEY', 'models/category_model.json.gz')
+MODEL_PATH      = os.environ.get('CATEGORY_MODEL_PATH',
+                                 os.path.join(os.path.dirname(__file__), 'category_model.json.gz'))
+LOCAL_THRESHOLD = float(os.environ.get('LOCAL_CLASSIFIER_THRESHOLD', '0.9'))
+
+CATEGORY_LIST = (
+    "[Chemical Registrations, Disease, Economics, Field Establishment, Harvest, Insects, "
+    "Irrigation, Nutrition, Pest Management Guide, Pollination, Post Harvest Handling, "
+    "Cold Chain, Production, Pruning, Sanitation, Varietal Information, Weeds]"
+)
+VALID_CATEGORIES = {
+    "Chemical Registrations","Disease","Economics","Field Establishment","Harvest","Insects",
+    "Irrigation","Nutrition","Pest Management Guide","Pollination","Post Harvest Handling",
+    "Cold Chain","Production","Pruning","Sanitation","Varietal Information","Weeds","Unknown"
+}
 
 # ─── AWS Clients ───────────────────────────────────────────────────────────────
-ddb      = boto3.resource('dynamodb')
+ddb      = aws.resource('dynamodb')
 table    = ddb.Table(DYNAMODB_TABLE)
-bedrock  = boto3.client('bedrock-runtime')
+bedrock  = aws.client('bedrock-runtime')
+limiter  = get_limiter(f"model:{BEDROCK_MODEL_ID}")
+s3       = aws.client('s3')
+
+# Loaded once per container; None → every question goes to Bedrock
+local_model = load_model(MODEL_PATH, s3, MODEL_BUCKET, MODEL_S3_KEY)
+print("[local_classifier] model", "loaded" if local_model else "not available")
+
+
+def classify_local(question: str):
+    """Local category if the model is confident enough, else None."""
+    if local_model is None:
+        return None
+    label, confidence = local_model.predict(question)
+    if confidence >= LOCAL_THRESHOLD and label in VALID_CATEGORIES:
+        return label
+    return None
+
+
+def categorize(question: str):
+    """(category, source) – local fast path first, Bedrock below the threshold."""
+    label = classify_local(question)
+    if label:
+        return label, "local"
+    return classify_question(question), "llm"
+
+
+def categorize_many(questions: list) -> list:
+    """Batch version of categorize(): only low-confidence questions reach Bedrock."""
+    results = [(label, "local") if label else None for label in map(classify_local, questions)]
+    pending = [i for i, r in enumerate(results) if r is None]
+    print(f"[categorize_many] local {len(questions) - len(pending)}, llm {len(pending)}")
+    if pending:
+        for i, label in zip(pending, classify_questions([questions[i] for i in pending])):
+            results[i] = (label, "llm")
+    return results
 
 
 def classify_question(question: str) -> str:
@@ -22,83 +87,209 @@ def classify_question(question: str) -> str:
     """
     prompt = (
         "Classify this blueberry farming question into exactly one category:\n\n"
-        "[Chemical Registrations, Disease, Economics, Field Establishment, Harvest, Insects, "
-        "Irrigation, Nutrition, Pest Management Guide, Pollination, Post Harvest Handling, "
-        "Cold Chain, Production, Pruning, Sanitation, Varietal Information, Weeds]\n\n"
+        f"{CATEGORY_LIST}\n\n"
         f"Question: {question}\n\n"
         "- Respond ONLY with the category name in quotes (e.g., \"Harvest\").\n"
         "- No explanations or additional text.\n"
         "- If it doesn't fit, return \"Unknown\"."
     )
     try:
-        resp = bedrock.converse(
+        # backoff + adaptive concurrency shared with the other Bedrock callers
+        resp = limiter.call(lambda: bedrock.converse(
             modelId=BEDROCK_MODEL_ID,
             messages=[{"role": "user", "content": [{"text": prompt}]}],
             inferenceConfig={"maxTokens": 16, "temperature": 0.0, "topP": 1.0}
-        )
+        ))
         out = resp["output"]["message"]["content"][0]["text"].strip().strip('"')
-    except ClientError as e:
+    except (ClientError, LimiterTimeout) as e:
         print(f"[classify_question] error: {e}")
         out = "Unknown"
 
-    valid = {
-        "Chemical Registrations","Disease","Economics","Field Establishment","Harvest","Insects",
-        "Irrigation","Nutrition","Pest Management Guide","Pollination","Post Harvest Handling",
-        "Cold Chain","Production","Pruning","Sanitation","Varietal Information","Weeds","Unknown"
-    }
-    return out if out in valid else "Unknown"
+    return out if out in VALID_CATEGORIES else "Unknown"
 
 
-def lambda_handler(event, context):
+def classify_questions(questions: list) -> list:
     """
-    Expects a single‐record event with keys:
-      session_id, timestamp, query, response, location, [confidence]
+    Classify many questions with one Converse call per BATCH_PROMPT_SIZE,
+    asking for a JSON array of categories in the same order.  A chunk whose
+    reply can't be parsed (or has the wrong length) falls back to
+    classify_question one by one.
     """
-    print("Received event:", json.dumps(event))
-
-    # 1) Session ID
-    session_id = event.get("session_id") or str(uuid.uuid4())
-
-    # 2) Timestamp + unique suffix for SK
-    iso_ts = event.get("timestamp") or datetime.utcnow().isoformat()
-    sort_key = f"{iso_ts}#{uuid.uuid4().hex[:8]}"
-
-    # 3) Pull fields
-    question      = event.get("query", "")
-    response_text = event.get("response", "")
-    location      = event.get("location", "")
-    confidence    = event.get("confidence", None)
+    categories = []
+    for start in range(0, len(questions), BATCH_PROMPT_SIZE):
+        chunk = questions[start:start + BATCH_PROMPT_SIZE]
+        numbered = "\n".join(f"{i + 1}. {q}" for i, q in enumerate(chunk))
+        prompt = (
+            "Classify each numbered blueberry farming question into exactly one category:\n\n"
+            f"{CATEGORY_LIST}\n\n"
+            f"Questions:\n{numbered}\n\n"
+            f"- Respond ONLY with a JSON array of {len(chunk)} category names, in question order "
+            "(e.g., [\"Harvest\", \"Pruning\"]).\n"
+            "- No explanations or additional text.\n"
+            "- If a question doesn't fit, use \"Unknown\"."
+        )
+        try:
+            resp = limiter.call(lambda: bedrock.converse(
+                modelId=BEDROCK_MODEL_ID,
+                messages=[{"role": "user", "content": [{"text": prompt}]}],
+                inferenceConfig={"maxTokens": 16 * len(chunk) + 16, "temperature": 0.0, "topP": 1.0}
+            ))
+            text = resp["output"]["message"]["content"][0]["text"]
+            match = re.search(r"\[.*\]", text, re.DOTALL)
+            labels = json.loads(match.group(0)) if match else None
+        except (ClientError, LimiterTimeout, ValueError) as e:
+            print(f"[classify_questions] error: {e}")
+            labels = None
 
-    if not question or not response_text:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Missing query or response"})
-        }
+        if not isinstance(labels, list) or len(labels) != len(chunk):
+            print(f"[classify_questions] unusable batch reply – classifying {len(chunk)} one by one")
+            categories.extend(classify_question(q) for q in chunk)
+            continue
+        categories.extend(
+            label if isinstance(label, str) and label in VALID_CATEGORIES else "Unknown"
+            for label in labels
+        )
+    return categories
 
-    # 4) Classify
-    category = classify_question(question)
 
-    # 5) Build item
+def build_item(record: dict, category: str, source: str = "llm") -> dict:
+    """DynamoDB item for one chat turn (PK session_id, SK timestamp#suffix)."""
+    session_id = record.get("session_id") or str(uuid.uuid4())
+    iso_ts     = record.get("timestamp") or datetime.utcnow().isoformat()
+    try:
+        buckets = bucket_attributes(iso_ts)
+    except ValueError:
+        buckets = bucket_attributes(datetime.utcnow())
+    # deterministic suffix: a retried record maps to the same key, so rollups count it once
+    suffix = hashlib.sha1(f"{session_id}|{iso_ts}|{record.get('query', '')}".encode()).hexdigest()[:8]
     item = {
-        "session_id": session_id,   # PK
-        "timestamp":  sort_key,     # SK
+        "session_id":  session_id,
+        "timestamp":   f"{iso_ts}#{suffix}",
         "original_ts": iso_ts,
-        "query":       question,
-        "response":    response_text,
-        "location":    location,
-        "category":    category
+        "query":       record.get("query", ""),
+        "response":    record.get("response", ""),
+        "location":    record.get("location", ""),
+        "category":    category,
+        # "local" labels are excluded when the local model is retrained
+        "category_source": source,
+        # day/hour buckets – the day is the PK of the ByDateBucket index
+        # (mark_session_days adds session_day to a session's first turn of the day)
+        **buckets
     }
+    confidence = record.get("confidence", None)
     if confidence is not None:
         try:
             item["confidence"] = Decimal(str(confidence))
         # amazonq-ignore-next-line
         except:
             pass
+    return item
+
+
+def batch_write(items: list) -> list:
+    """
+    BatchWriteItem in groups of 25, retrying UnprocessedItems with backoff.
+    Returns the items that still could not be written.
+    """
+    # one request may not put the same key twice (redelivered SQS messages)
+    unique = {}
+    for it in items:
+        unique.setdefault((it["session_id"], it["timestamp"]), it)
+    if len(unique) < len(items):
+        print(f"[batch_write] {len(items) - len(unique)} duplicate row(s) dropped")
+    items, failed = list(unique.values()), []
+    for start in range(0, len(items), 25):
+        requests = [{"PutRequest": {"Item": it}} for it in items[start:start + 25]]
+        for attempt in range(WRITE_MAX_ATTEMPTS):
+            resp = ddb.batch_write_item(RequestItems={DYNAMODB_TABLE: requests})
+            requests = resp.get("UnprocessedItems", {}).get(DYNAMODB_TABLE, [])
+            if not requests:
+                break
+            print(f"[batch_write] {len(requests)} unprocessed – retry {attempt + 1}")
+            time.sleep(min(2.0, 0.05 * (2 ** attempt)))
+        failed.extend(r["PutRequest"]["Item"] for r in requests)
+    return failed
 
-    # 6) Write to DynamoDB
+
+def store_items(items: list) -> list:
+    """Write rows (plus rollup counters when ROLLUP_TABLE is set); returns the unwritten rows."""
+    if not ROLLUP_TABLE:
+        return batch_write(items)
+    written, duplicates, failed = write_rows_with_rollups(ddb.meta.client, DYNAMODB_TABLE, ROLLUP_TABLE, items)
+    print(f"[store_items] {len(written)} new, {len(duplicates)} already stored")
     try:
-        # amazonq-ignore-next-line
-        table.put_item(Item=item)
+        update_day_sketches(ddb.Table(ROLLUP_TABLE), written, duplicates)
+    except Exception as e:
+        # rows and counters are stored; the sketches are best-effort
+        print(f"[store_items] sketch update failed: {e}")
+    return failed
+
+
+def handle_batch(event):
+    """
+    SQS batch (cfEvaluator → log queue, with a batching window): classify all
+    turns together, write them (plus rollup counters when configured) and
+    report records that could not be stored as batchItemFailures.
+    """
+    records = []
+    for rec in event["Records"]:
+        try:
+            body = json.loads(rec["body"])
+        except ValueError:
+            print(f"[handle_batch] dropping unparsable record {rec['messageId']}")
+            continue
+        if body.get("query") and body.get("response"):
+            records.append((rec["messageId"], body))
+
+    print(f"[handle_batch] {len(event['Records'])} records, {len(records)} classifiable")
+    if not records:
+        return {"batchItemFailures": []}
+
+    categories = categorize_many([body["query"] for _, body in records])
+    items = [build_item(body, cat, src) for (_, body), (cat, src) in zip(records, categories)]
+    by_sort_key = {it["timestamp"]: mid for (mid, _), it in zip(records, items)}
+
+    try:
+        mark_session_days(table, items)
+        unwritten = store_items(items)
+    except Exception as e:
+        print(f"[handle_batch] DynamoDB error: {e}")
+        unwritten = items
+    failures = [{"itemIdentifier": by_sort_key[it["timestamp"]]} for it in unwritten]
+    print(f"[handle_batch] wrote {len(items) - len(unwritten)}, failed {len(unwritten)}")
+    return {"batchItemFailures": failures}
+
+
+def lambda_handler(event, context):
+    """
+    Expects a single‐record event with keys:
+      session_id, timestamp, query, response, location, [confidence]
+    or an SQS batch whose bodies carry the same keys.
+    """
+    records = event.get("Records") or []
+    if records and records[0].get("eventSource") == "aws:sqs":
+        return handle_batch(event)
+
+    print("Received event:", json.dumps(event))
+
+    if not event.get("query") or not event.get("response"):
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": "Missing query or response"})
+        }
+
+    # 1) Classify, 2) build item
+    item = build_item(event, *categorize(event["query"]))
+
+    # 3) Write to DynamoDB
+    try:
+        mark_session_days(table, [item])
+        if ROLLUP_TABLE:
+            if store_items([item]):
+                raise RuntimeError("transaction retries exhausted")
+        else:
+            # amazonq-ignore-next-line
+            table.put_item(Item=item)
     except Exception as e:
         print(f"[lambda_handler] DynamoDB error: {e}")
         return {
@@ -109,8 +300,8 @@ def lambda_handler(event, context):
     return {
         "statusCode": 200,
         "body": json.dumps({
-            "session_id": session_id,
-            "timestamp":  sort_key,
-            "category":   category
+            "session_id": item["session_id"],
+            "timestamp":  item["timestamp"],
+            "category":   item["category"]
         })
     }
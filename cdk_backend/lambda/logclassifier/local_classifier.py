@@ -0,0 +1,176 @@
+"""
+Local fast-path category classifier.
+
+Multinomial naive Bayes over hashed word uni/bi-grams, trained offline
+(train_classifier.py) from questions the LLM already categorised.  The
+model is a small gzip'd JSON artifact loaded once per container; predict()
+is a handful of dict lookups, so it runs in microseconds and logclassifier
+only calls Bedrock when the posterior is below LOCAL_CLASSIFIER_THRESHOLD.
+"""
+import gzip
+import json
+import math
+import os
+import re
+import zlib
+from collections import Counter, defaultdict
+
+N_FEATURES = 2 ** 18
+MODEL_VERSION = 1
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "to", "of", "in", "on", "for", "and", "or",
+    "my", "i", "do", "does", "what", "how", "when", "can", "should", "it",
+    "be", "with", "at", "this", "that", "which", "best",
+}
+
+
+def features(text, n_features=N_FEATURES):
+    """Hashed unigram + bigram counts; crc32 keeps buckets stable across processes."""
+    words = [w for w in _WORD_RE.findall((text or "").lower()) if w not in _STOPWORDS]
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return Counter(zlib.crc32(g.encode()) % n_features for g in grams)
+
+
+class NaiveBayesModel:
+
+    def __init__(self, classes, log_prior, log_likelihood, log_unseen, n_features=N_FEATURES):
+        self.classes        = classes          # [label, ...]
+        self.log_prior      = log_prior        # {label: log P(label)}
+        self.log_likelihood = log_likelihood   # {label: {bucket: log P(bucket|label)}}
+        self.log_unseen     = log_unseen       # {label: log P(unseen bucket|label)}
+        self.n_features     = n_features
+
+    # ---- training ------------------------------------------------------
+    @classmethod
+    def train(cls, samples, alpha=0.5, n_features=N_FEATURES):
+        """samples: iterable of (question, category)."""
+        doc_counts  = Counter()
+        feat_counts = defaultdict(Counter)
+        for question, label in samples:
+            doc_counts[label] += 1
+            feat_counts[label].update(features(question, n_features))
+
+        total_docs = sum(doc_counts.values())
+        if not total_docs:
+            raise ValueError("No training samples")
+
+        classes = sorted(doc_counts)
+        log_prior, log_likelihood, log_unseen = {}, {}, {}
+        for label in classes:
+            counts = feat_counts[label]
+            denom  = sum(counts.values()) + alpha * n_features
+            log_prior[label]      = math.log(doc_counts[label] / total_docs)
+            log_likelihood[label] = {b: math.log((c + alpha) / denom) for b, c in counts.items()}
+            log_unseen[label]     = math.log(alpha / denom)
+        return cls(classes, log_prior, log_likelihood, log_unseen, n_features)
+
+    # ---- inference -----------------------------------------------------
+    def predict(self, text):
+        """Returns (label, confidence) where confidence is the posterior of label."""
+        feats = features(text, self.n_features)
+        if not feats:
+            return "Unknown", 0.0
+        scores = {}
+        for label in self.classes:
+            ll, unseen = self.log_likelihood[label], self.log_unseen[label]
+            scores[label] = self.log_prior[label] + sum(
+                n * ll.get(b, unseen) for b, n in feats.items()
+            )
+        best = max(scores, key=scores.get)
+        top  = scores[best]
+        norm = sum(math.exp(s - top) for s in scores.values())
+        return best, 1.0 / norm
+
+    # ---- (de)serialisation --------------------------------------------
+    def to_dict(self):
+        return {
+            "version":        MODEL_VERSION,
+            "n_features":     self.n_features,
+            "classes":        self.classes,
+            "log_prior":      self.log_prior,
+            "log_unseen":     self.log_unseen,
+            # JSON keys are strings; round to keep the artifact small
+            "log_likelihood": {
+                label: {str(b): round(v, 4) for b, v in ll.items()}
+                for label, ll in self.log_likelihood.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != MODEL_VERSION:
+            raise ValueError(f"Unsupported model version {data.get('version')}")
+        return cls(
+            data["classes"],
+            data["log_prior"],
+            {label: {int(b): v for b, v in ll.items()} for label, ll in data["log_likelihood"].items()},
+            data["log_unseen"],
+            data["n_features"],
+        )
+
+    def dumps(self):
+        return gzip.compress(json.dumps(self.to_dict(), separators=(",", ":")).encode())
+
+    @classmethod
+    def loads(cls, blob):
+        return cls.from_dict(json.loads(gzip.decompress(blob)))
+
+
+def load_model(path=None, s3=None, bucket=None, key=None):
+    """
+    Load the artifact from S3 (bucket/key) if configured, else from a local
+    path.  Returns None when neither exists so callers fall back to the LLM.
+    """
+    try:
+        if s3 is not None and bucket and key:
+            blob = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+            return NaiveBayesModel.loads(blob)
+    except Exception as e:
+        print(f"[local_classifier] S3 model unavailable ({e}) – trying local file")
+    if path and os.path.exists(path):
+        with open(path, "rb") as fh:
+            return NaiveBayesModel.loads(fh.read())
+    return None
+
+
+def evaluate(model, samples, threshold):
+    """
+    Agreement of the local model with the LLM labels on held-out samples:
+    overall, on the fast-path share (confidence >= threshold), and per class.
+    """
+    total = agree = covered = covered_agree = 0
+    per_class = defaultdict(Counter)   # label -> tp / fp / fn
+    for question, label in samples:
+        pred, conf = model.predict(question)
+        total += 1
+        hit = pred == label
+        agree += hit
+        if conf >= threshold:
+            covered += 1
+            covered_agree += hit
+        if hit:
+            per_class[label]["tp"] += 1
+        else:
+            per_class[pred]["fp"] += 1
+            per_class[label]["fn"] += 1
+
+    def ratio(a, b):
+        return round(a / b, 4) if b else None
+
+    return {
+        "samples":             total,
+        "threshold":           threshold,
+        "agreement":           ratio(agree, total),
+        "fast_path_coverage":  ratio(covered, total),
+        "fast_path_agreement": ratio(covered_agree, covered),
+        "per_category": {
+            label: {
+                "precision": ratio(c["tp"], c["tp"] + c["fp"]),
+                "recall":    ratio(c["tp"], c["tp"] + c["fn"]),
+                "support":   c["tp"] + c["fn"],
+            }
+            for label, c in sorted(per_class.items())
+        },
+    }
@@ -0,0 +1,88 @@
+"""
+Recompute the analytics rollups from the session-logs table.
+
+    python rebuild_rollups.py --table BlueberriesDashboardSessionlogs \
+        --rollup-table <AnalyticsRollupTable> --start 2025-01-01 [--end 2025-06-30]
+
+Each day is re-read from the ByDateBucket index and its day row, 24 hour
+rows and sketch row are overwritten (hours without traffic are deleted), so
+the command can be re-run at will.  Rows written by logclassifier while a
+day is being rebuilt may be missed for that day – rebuild past days, or
+re-run today's once traffic is quiet.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+# run from a checkout: the shared layer lives in lambda/common/python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common", "python"))
+from blueberry_common.rollups import (                                           # noqa: E402
+    SKETCH_ATTR, day_key, day_sketches, hour_key, rollup_deltas, sketch_key,
+)
+from blueberry_common.session_buckets import DATE_INDEX, DAY_ATTR, day_buckets  # noqa: E402
+
+
+def day_rows(table, day):
+    kwargs = {
+        "IndexName": DATE_INDEX,
+        "KeyConditionExpression": Key(DAY_ATTR).eq(day),
+        "ProjectionExpression": "session_id, original_ts, #loc, category, #q",
+        "ExpressionAttributeNames": {"#loc": "location", "#q": "query"},
+    }
+    while True:
+        resp = table.query(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def rebuild_day(table_name, rollup_table_name, day):
+    # resources are not thread-safe: one session per worker
+    ddb    = boto3.session.Session().resource("dynamodb")
+    rows   = list(day_rows(ddb.Table(table_name), day))
+    deltas = rollup_deltas(rows)
+    sketch = day_sketches(rows).get(day)
+    every_key = [day_key(day)] + [hour_key(f"{day}T{h:02d}") for h in range(24)]
+
+    with ddb.Table(rollup_table_name).batch_writer() as batch:
+        for key in every_key:
+            if key in deltas:
+                batch.put_item(Item=deltas[key].as_item(key))
+            else:
+                batch.delete_item(Key={"rollup_key": key})
+        if sketch:
+            # a fresh, larger version makes in-flight optimistic writers re-read
+            batch.put_item(Item={
+                "rollup_key": sketch_key(day), SKETCH_ATTR: sketch.dumps(), "version": int(time.time() * 1000),
+            })
+        else:
+            batch.delete_item(Key={"rollup_key": sketch_key(day)})
+    print(f"{day}: {len(rows)} turn(s), {len(deltas) - 1 if rows else 0} active hour(s)")
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", required=True, help="DynamoDB session-logs table")
+    parser.add_argument("--rollup-table", required=True, help="DynamoDB rollup table")
+    parser.add_argument("--start", required=True, help="first day, YYYY-MM-DD")
+    parser.add_argument("--end", default=datetime.utcnow().strftime("%Y-%m-%d"), help="last day (default today)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    days = day_buckets(args.start, args.end)
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        total = sum(pool.map(lambda d: rebuild_day(args.table, args.rollup_table, d), days))
+    print(f"Rebuilt {len(days)} day(s) from {total} turn(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
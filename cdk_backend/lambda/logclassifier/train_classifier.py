@@ -0,0 +1,107 @@
+"""
+Retrain the local category classifier from already-categorised chat turns.
+
+    # from the live table (needs AWS credentials)
+    python train_classifier.py --table BlueberriesDashboardSessionlogs \
+        --out category_model.json.gz --upload s3://<dashboard-logs-bucket>/models/category_model.json.gz
+
+    # offline, from an NDJSON/JSON export with "query" and "category" fields
+    python train_classifier.py --input sessions.ndjson --out category_model.json.gz
+
+Only labels produced by the LLM are used (category_source != "local"), so
+the model never trains on its own guesses.  A random hold-out is scored
+against those LLM labels and the evaluation report is printed (and written
+next to the model as <out>.report.json).
+"""
+import argparse
+import json
+import random
+import sys
+
+from local_classifier import NaiveBayesModel, evaluate
+
+
+def samples_from_table(table_name):
+    import boto3
+    table = boto3.resource("dynamodb").Table(table_name)
+    kwargs = {
+        "ProjectionExpression": "#q, category, category_source",
+        "ExpressionAttributeNames": {"#q": "query"},
+    }
+    while True:
+        resp = table.scan(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def samples_from_file(path):
+    with open(path) as fh:
+        head = fh.read(1)
+        fh.seek(0)
+        if head == "[":
+            yield from json.load(fh)
+        else:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def labelled(rows):
+    for row in rows:
+        question, category = row.get("query"), row.get("category")
+        if not question or not category or category == "Unknown":
+            continue
+        if row.get("category_source") == "local":
+            continue
+        yield question, category
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--table", help="DynamoDB session-logs table to scan")
+    src.add_argument("--input", help="JSON array or NDJSON file with query/category")
+    parser.add_argument("--out", default="category_model.json.gz")
+    parser.add_argument("--upload", help="s3://bucket/key to publish the model to")
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args(argv)
+
+    rows = samples_from_table(args.table) if args.table else samples_from_file(args.input)
+    samples = list(labelled(rows))
+    if len(samples) < 20:
+        print(f"Only {len(samples)} labelled samples – not enough to train", file=sys.stderr)
+        return 1
+
+    random.Random(args.seed).shuffle(samples)
+    cut = int(len(samples) * (1 - args.holdout))
+    train, test = samples[:cut], samples[cut:]
+
+    model  = NaiveBayesModel.train(train, alpha=args.alpha)
+    report = evaluate(model, test, args.threshold)
+    report["train_samples"] = len(train)
+    print(json.dumps(report, indent=2))
+
+    # ship a model trained on everything we have
+    final = NaiveBayesModel.train(samples, alpha=args.alpha)
+    blob  = final.dumps()
+    with open(args.out, "wb") as fh:
+        fh.write(blob)
+    with open(f"{args.out}.report.json", "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Wrote {args.out} ({len(blob) / 1024:.1f} KiB, {len(final.classes)} categories)")
+
+    if args.upload:
+        import boto3
+        bucket, _, key = args.upload[len("s3://"):].partition("/")
+        boto3.client("s3").put_object(Bucket=bucket, Key=key, Body=blob, ContentType="application/gzip")
+        print(f"Uploaded to {args.upload}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
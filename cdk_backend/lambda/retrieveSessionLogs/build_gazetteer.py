@@ -0,0 +1,76 @@
+"""
+Build the county/city gazetteer used by blueberry_common.geocode from the
+Census Bureau gazetteer files
+(https://www.census.gov/geographies/reference-files/time-series/geo/gazetteer-files.html):
+
+    python build_gazetteer.py \
+        --counties 2023_Gaz_counties_national.txt \
+        --places   2023_Gaz_place_national.txt \
+        --out us_gazetteer_2023.json.gz
+    aws s3 cp us_gazetteer_2023.json.gz s3://<dashboard-logs-bucket>/geo/us_gazetteer_2023.json.gz
+
+then point GAZETTEER_S3_KEY at the uploaded key (a new key name also
+invalidates the resolutions cached in the rollup table).
+"""
+import argparse
+import csv
+import gzip
+import json
+import re
+
+# Census place names carry their legal/statistical area description as a suffix
+PLACE_SUFFIX_RE = re.compile(
+    r"\s+(city and borough|consolidated government \(balance\)|metropolitan government \(balance\)|"
+    r"metro government \(balance\)|unified government \(balance\)|urban county|city|town|village|"
+    r"borough|township|municipality|comunidad|zona urbana|CDP)$"
+)
+
+
+def _rows(path):
+    with open(path, newline="", encoding="utf-8") as fh:
+        reader = csv.reader(fh, delimiter="\t")
+        header = [h.strip() for h in next(reader)]
+        for row in reader:
+            yield dict(zip(header, (v.strip() for v in row)))
+
+
+def _coord(value):
+    return round(float(value), 4)
+
+
+def build(counties_path, places_path, version):
+    places = []
+    for row in _rows(counties_path):
+        places.append(["county", row["NAME"], row["USPS"], _coord(row["INTPTLAT"]), _coord(row["INTPTLONG"])])
+
+    cities = []
+    for row in _rows(places_path):
+        name = PLACE_SUFFIX_RE.sub("", row["NAME"])
+        cities.append((int(row.get("ALAND") or 0), ["city", name, row["USPS"],
+                                                    _coord(row["INTPTLAT"]), _coord(row["INTPTLONG"])]))
+    # same name twice in a state (a city and a CDP): the larger land area wins
+    cities.sort(key=lambda c: -c[0])
+    places.extend(entry for _, entry in cities)
+    return {"version": version, "places": places}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline US gazetteer artifact")
+    parser.add_argument("--counties", required=True, help="Census *_Gaz_counties_national.txt")
+    parser.add_argument("--places", required=True, help="Census *_Gaz_place_national.txt")
+    parser.add_argument("--out", default="us_gazetteer.json.gz")
+    parser.add_argument("--version", default=None, help="defaults to the output file name")
+    args = parser.parse_args()
+
+    data = build(args.counties, args.places, args.version or args.out)
+    blob = gzip.compress(json.dumps(data, separators=(",", ":")).encode(), compresslevel=9)
+    with open(args.out, "wb") as fh:
+        fh.write(blob)
+    kinds = {}
+    for kind, *_ in data["places"]:
+        kinds[kind] = kinds.get(kind, 0) + 1
+    print(f"Wrote {args.out}: {kinds}, {len(blob)} bytes")
+
+
+if __name__ == "__main__":
+    main()
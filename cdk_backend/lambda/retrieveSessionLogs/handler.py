@@ -1,17 +1,40 @@
 import os
 import json
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import Counter, defaultdict
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
 
-import boto3
-from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.types import TypeDeserializer
+
+from blueberry_common import aws
+from blueberry_common.geocode import load_gazetteer
+from blueberry_common.rollups import add_to_sketch, day_key, load_rollups, merge_rollups, sketch_key
+from blueberry_common.session_buckets import DATE_INDEX, DAY_ATTR, day_buckets
+from blueberry_common.sketches import AnalyticsSketch
+from places import PlaceResolver, aggregate_places
+from sessions import BadRequest, page_size, parse_day, session_page, sessions_page
 
 # ──────────────────────────────────────────────────────────────────────────────
 #  Env & AWS clients
 # ──────────────────────────────────────────────────────────────────────────────
-TABLE_NAME = os.environ["DYNAMODB_TABLE"]
-ddb   = boto3.resource("dynamodb")
-table = ddb.Table(TABLE_NAME)
+TABLE_NAME        = os.environ["DYNAMODB_TABLE"]
+QUERY_CONCURRENCY = int(os.environ.get("QUERY_CONCURRENCY", "16"))
+ROLLUP_TABLE      = os.environ.get("ROLLUP_TABLE", "")   # pre-aggregated per-day counters
+TOP_N             = int(os.environ.get("ANALYTICS_TOP_N", "10"))
+GAZETTEER_BUCKET  = os.environ.get("GAZETTEER_BUCKET", "")
+GAZETTEER_S3_KEY  = os.environ.get("GAZETTEER_S3_KEY", "")   # counties + cities; states are built in
+MAP_PLACES_LIMIT  = int(os.environ.get("MAP_PLACES_LIMIT", "500"))
+
+# low-level client: unlike resources it is safe to share across threads
+ddb_client   = aws.client("dynamodb")
+deserializer = TypeDeserializer()
+ddb          = aws.resource("dynamodb")
+s3           = aws.client("s3")
+
+# resolutions are cached per container and in the rollup table
+place_resolver = PlaceResolver(lambda: load_gazetteer(s3, GAZETTEER_BUCKET, GAZETTEER_S3_KEY),
+                               GAZETTEER_S3_KEY, ddb, ROLLUP_TABLE)
 
 # ──────────────────────────────────────────────────────────────────────────────
 #  Helpers
@@ -38,10 +61,70 @@ def ok(body_dict):
             "Content-Type": "application/json",
             "Access-Control-Allow-Origin": "*",
         },
-        "body": json.dumps(body_dict),
+        "body": json.dumps(body_dict, default=_json_default),
     }
 
 
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def query_day(day, start_iso, end_iso):
+    """All items of one day bucket inside [start_iso, end_iso] (GSI Query, paginated)."""
+    paginator = ddb_client.get_paginator("query")
+    pages = paginator.paginate(
+        TableName=TABLE_NAME,
+        IndexName=DATE_INDEX,
+        KeyConditionExpression="#day = :day AND original_ts BETWEEN :start AND :end",
+        ProjectionExpression="session_id, #loc, category, #q",
+        ExpressionAttributeNames={"#day": DAY_ATTR, "#loc": "location", "#q": "query"},
+        ExpressionAttributeValues={
+            ":day":   {"S": day},
+            ":start": {"S": start_iso},
+            ":end":   {"S": end_iso},
+        },
+    )
+    return [
+        {k: deserializer.deserialize(v) for k, v in raw.items()}
+        for page in pages
+        for raw in page.get("Items", [])
+    ]
+
+
+def query_range(start, end):
+    """
+    Parallel Query over every day bucket between start and end, folded into
+    sketches one day at a time so memory stays bounded.
+    """
+    days = day_buckets(start, end)
+    start_iso, end_iso = start.isoformat(), end.isoformat()
+    sketch, cat_counts, loc_counts, total = AnalyticsSketch(), defaultdict(int), Counter(), 0
+    with ThreadPoolExecutor(max_workers=max(1, min(QUERY_CONCURRENCY, len(days)))) as pool:
+        for day_items in pool.map(lambda d: query_day(d, start_iso, end_iso), days):
+            for it in day_items:
+                add_to_sketch(sketch, it)
+                if cat := it.get("category"):
+                    cat_counts[cat] += 1
+                if loc := it.get("location"):
+                    loc_counts[loc] += 1
+            total += len(day_items)
+    log("Day buckets queried       :", len(days))
+    log("TOTAL items queried       :", total)
+    return sketch, cat_counts, loc_counts
+
+
+def aggregate_rollups(start, end):
+    """Merge one rollup row and one sketch row per day – at most 2 x 366 rows."""
+    days = day_buckets(start, end)
+    keys = [day_key(d) for d in days] + [sketch_key(d) for d in days]
+    rows = load_rollups(ddb, ROLLUP_TABLE, keys)
+    log("Rollup rows read          :", len(rows), "of", len(keys))
+    merged = merge_rollups(rows)
+    return merged["sketch"], merged["categories"], merged["locations"]
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 #  Lambda entry-point
 # ──────────────────────────────────────────────────────────────────────────────
@@ -49,8 +132,26 @@ def lambda_handler(event, context):
     log("=== NEW INVOCATION ============================================")
     log("Raw queryStringParameters :", event.get("queryStringParameters"))
 
-    # 1) Parse timeframe
     params = event.get("queryStringParameters") or {}
+    try:
+        # GET /session-logs/{sessionId} – one transcript, paged
+        if session_id := (event.get("pathParameters") or {}).get("sessionId"):
+            log("Transcript for session    :", session_id)
+            return ok(session_page(ddb_client, TABLE_NAME, session_id,
+                                   page_size(params.get("limit")), params.get("cursor")))
+
+        # GET /session-logs/sessions – sessions in a date range, paged
+        if (event.get("resource") or "").endswith("/sessions"):
+            today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            end   = parse_day(params.get("end"), today)
+            start = parse_day(params.get("start"), end - timedelta(days=6))
+            log("Session listing           :", start.date(), "→", end.date())
+            return ok(sessions_page(ddb_client, TABLE_NAME, start, end,
+                                    page_size(params.get("limit")), params.get("cursor")))
+    except BadRequest as e:
+        return bad_request(str(e))
+
+    # 1) Parse timeframe
     tf = (params.get("timeframe") or "today").lower()
 
     now = datetime.utcnow()
@@ -69,56 +170,34 @@ def lambda_handler(event, context):
     log("Timeframe                 :", tf)
     log("Start / End UTC           :", start, "/", end)
 
-    # 2) Build filter & projection
-    start_iso, end_iso = start.isoformat(), end.isoformat()
-    filter_exp = Attr("original_ts").between(start_iso, end_iso)
-    projection = "session_id, #loc, category"
-    expr_names = { "#loc": "location" }
-
-    # 3) Scan in pages
-    items = []
-    resp = table.scan(
-        FilterExpression=filter_exp,
-        ProjectionExpression=projection,
-        ExpressionAttributeNames=expr_names,
-    )
-    items.extend(resp.get("Items", []))
-    log("Page 1 items              :", len(resp.get("Items", [])))
-
-    while "LastEvaluatedKey" in resp:
-        resp = table.scan(
-            FilterExpression=filter_exp,
-            ProjectionExpression=projection,
-            ExpressionAttributeNames=expr_names,
-            ExclusiveStartKey=resp["LastEvaluatedKey"],
-        )
-        log("…Next page items          :", len(resp.get("Items", [])))
-        items.extend(resp.get("Items", []))
-
-    log("TOTAL items scanned       :", len(items))
-
-    # 4) Aggregate
-    sessions, loc_counts, cat_counts = set(), defaultdict(int), defaultdict(int)
-
-    for it in items:
-        if sid := it.get("session_id"):
-            sessions.add(sid)
-        if loc := it.get("location"):
-            loc_counts[loc] += 1
-        if cat := it.get("category"):
-            cat_counts[cat] += 1
+    # 2) Rollups when available, otherwise Query the day buckets in range.
+    #    Distinct users (HyperLogLog, ~1.6 % std error) and the top lists
+    #    (Space-Saving, each count carries its max overestimate) come from
+    #    bounded-size sketches; category and location counts are exact.
+    sketch, cat_counts, loc_counts = aggregate_rollups(start, end) if ROLLUP_TABLE else query_range(start, end)
+    top_locations = sketch.top_locations(sketch.locations.k)
+
+    # 3) Map markers: every location string resolved offline, summed per place
+    map_places, unresolved = aggregate_places(loc_counts, place_resolver.resolve_many(list(loc_counts)),
+                                              MAP_PLACES_LIMIT)
 
     result = {
         "timeframe":  tf,
         "start_date": start.strftime("%Y-%m-%d"),
         "end_date":   end.strftime("%Y-%m-%d"),
-        "user_count": len(sessions),
-        "locations":  list(loc_counts.keys()),
+        "user_count": sketch.user_count(),
+        # every distinct location (exact counters), not just the sketch's top-k
+        "locations":  [loc for loc, _ in loc_counts.most_common()],
         "categories": dict(cat_counts),
+        "top_locations": top_locations[:TOP_N],
+        "top_questions": sketch.top_questions(TOP_N),
+        "places":     map_places,
+        "unresolved_locations": unresolved,
     }
 
-    log("Distinct sessions         :", len(sessions))
-    log("Distinct locations        :", len(loc_counts))
+    log("Distinct sessions (est.)  :", result["user_count"])
+    log("Distinct locations        :", len(loc_counts), "→", len(map_places), "places,",
+        unresolved["locations"], "unresolved")
     log("Distinct categories       :", len(cat_counts))
     log("Returning 200")
     return ok(result)
@@ -0,0 +1,121 @@
+"""
+Per-place aggregation of the free-text locations for the analytics map.
+
+Each distinct location string is resolved to a gazetteer Place once and the
+result is cached
+
+  * in memory for the life of the container, and
+  * in the rollup table as "geo#<location>" rows (alongside the day
+    rollups), tagged with the gazetteer id so a new gazetteer or new
+    resolution rules re-resolve them.
+
+The full gazetteer is only loaded on a cache miss, so a warm dashboard
+never downloads it.  Counts of strings that resolve to the same place are
+summed, which keeps the response small: one entry per map marker.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from blueberry_common.geocode import GEO_VERSION, Place
+from blueberry_common.rollups import load_rollups
+
+GEO_PREFIX    = "geo#"
+MAX_KEY_CHARS = 512   # longer strings are resolved but not cached
+
+
+def geo_key(location):
+    return GEO_PREFIX + " ".join(location.split())
+
+
+class PlaceResolver:
+
+    def __init__(self, load_gazetteer, gazetteer_key="", ddb=None, cache_table=""):
+        self._load_gazetteer = load_gazetteer
+        self._gazetteer      = None
+        self.gazetteer_key   = gazetteer_key
+        self.gazetteer_id    = f"{GEO_VERSION}:{gazetteer_key or 'builtin'}"
+        self.ddb             = ddb
+        self.cache_table     = cache_table
+        self.memo            = {}            # location -> Place | None
+
+    @property
+    def gazetteer(self):
+        if self._gazetteer is None:
+            self._gazetteer = self._load_gazetteer()
+        return self._gazetteer
+
+    def _from_cache(self, locations):
+        keys = {geo_key(loc): loc for loc in locations if len(loc) <= MAX_KEY_CHARS}
+        if not keys:
+            return {}
+        found = {}
+        for row in load_rollups(self.ddb, self.cache_table, list(keys)):
+            if row.get("gazetteer") != self.gazetteer_id:
+                continue
+            place = None
+            if row.get("kind"):
+                place = Place(row["kind"], row["name"], row["state"], float(row["lat"]), float(row["lon"]))
+            found[keys[row["rollup_key"]]] = place
+        return found
+
+    def _to_cache(self, resolved):
+        with self.ddb.Table(self.cache_table).batch_writer(overwrite_by_pkeys=["rollup_key"]) as batch:
+            for loc, place in resolved.items():
+                if len(loc) > MAX_KEY_CHARS:
+                    continue
+                item = {"rollup_key": geo_key(loc), "gazetteer": self.gazetteer_id}
+                if place:
+                    item.update(kind=place.kind, name=place.name, state=place.state,
+                                lat=Decimal(str(place.lat)), lon=Decimal(str(place.lon)))
+                batch.put_item(Item=item)
+
+    def resolve_many(self, locations):
+        todo = [loc for loc in set(locations) if loc not in self.memo]
+        if todo and self.cache_table:
+            cached = self._from_cache(todo)
+            self.memo.update(cached)
+            todo = [loc for loc in todo if loc not in cached]
+        if todo:
+            fresh = {loc: self.gazetteer.resolve(loc) for loc in todo}
+            self.memo.update(fresh)
+            # a gazetteer that failed to load falls back to states – don't cache that
+            degraded = self.gazetteer_key and self.gazetteer.version == "builtin"
+            if self.cache_table and not degraded:
+                try:
+                    self._to_cache(fresh)
+                except Exception as e:
+                    print(f"[places] caching {len(fresh)} resolution(s) failed: {e}")
+        return {loc: self.memo.get(loc) for loc in locations}
+
+
+def aggregate_places(location_counts, resolved, limit=None):
+    """
+    [{place, name, kind, state, lat, lon, count, locations}] by count
+    (descending) plus {"turns", "locations"} for strings that did not resolve.
+    """
+    totals, strings = defaultdict(int), defaultdict(int)
+    by_id, unresolved = {}, {"turns": 0, "locations": 0}
+    for loc, count in location_counts.items():
+        place = resolved.get(loc)
+        if place is None:
+            unresolved["turns"] += int(count)
+            unresolved["locations"] += 1
+            continue
+        by_id[place.id] = place
+        totals[place.id] += int(count)
+        strings[place.id] += 1
+
+    places = [
+        {
+            "place":     pid,
+            "name":      by_id[pid].label,
+            "kind":      by_id[pid].kind,
+            "state":     by_id[pid].state,
+            "lat":       by_id[pid].lat,
+            "lon":       by_id[pid].lon,
+            "count":     count,
+            "locations": strings[pid],
+        }
+        for pid, count in sorted(totals.items(), key=lambda kv: (-kv[1], kv[0]))
+    ]
+    return places[:limit] if limit else places, unresolved
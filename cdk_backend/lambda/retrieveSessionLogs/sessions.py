@@ -0,0 +1,149 @@
+"""
+Paged reads of individual sessions.
+
+  GET /session-logs/{sessionId}?limit=&cursor=
+      one transcript, oldest turn first – a key-condition Query on the
+      session_id partition (sort key "timestamp").
+
+  GET /session-logs/sessions?start=YYYY-MM-DD&end=YYYY-MM-DD&limit=&cursor=
+      sessions active in a date range, most recent first – walks the
+      sparse BySessionDay index one day at a time, newest day first.
+
+Cursors are opaque URL-safe tokens wrapping DynamoDB's LastEvaluatedKey
+(plus, for the listing, the day being read).  Pass back the "next_cursor"
+of a response to get the following page; it is null on the last page.
+"""
+import base64
+import json
+from datetime import datetime
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from blueberry_common.session_buckets import SESSION_DAY_ATTR, SESSION_DAY_INDEX, day_buckets
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE     = 200
+TURN_PROJECTION   = "#ts, original_ts, #q, #r, category, #loc, confidence"
+TURN_NAMES        = {"#ts": "timestamp", "#q": "query", "#r": "response", "#loc": "location"}
+
+_deserializer = TypeDeserializer()
+
+
+class BadRequest(ValueError):
+    """Invalid paging parameter; the handler turns it into a 400."""
+
+
+def encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        raise BadRequest("Malformed cursor")
+
+
+def page_size(raw):
+    try:
+        size = int(raw) if raw else DEFAULT_PAGE_SIZE
+    except ValueError:
+        raise BadRequest(f'Invalid limit "{raw}"')
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _plain(raw):
+    return {k: _deserializer.deserialize(v) for k, v in raw.items()}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  One transcript
+# ──────────────────────────────────────────────────────────────────────────────
+def session_page(client, table_name, session_id, limit, cursor=None):
+    state = decode_cursor(cursor)
+    kwargs = {
+        "TableName": table_name,
+        "KeyConditionExpression": "session_id = :sid",
+        "ExpressionAttributeValues": {":sid": {"S": session_id}},
+        "ProjectionExpression": TURN_PROJECTION,
+        "ExpressionAttributeNames": TURN_NAMES,
+        "ScanIndexForward": True,
+        "Limit": limit,
+    }
+    if state:
+        if state.get("sid") != session_id:
+            raise BadRequest("Cursor belongs to a different session")
+        kwargs["ExclusiveStartKey"] = state["lek"]
+
+    resp = client.query(**kwargs)
+    lek  = resp.get("LastEvaluatedKey")
+    return {
+        "session_id":  session_id,
+        "turns":       [_plain(it) for it in resp.get("Items", [])],
+        "next_cursor": encode_cursor({"sid": session_id, "lek": lek}) if lek else None,
+    }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Sessions in a date range
+# ──────────────────────────────────────────────────────────────────────────────
+def sessions_page(client, table_name, start, end, limit, cursor=None):
+    """
+    Up to `limit` sessions, newest first by their first turn of the day.
+    The sparse BySessionDay index holds exactly one entry per session and
+    day, so the cursor is just the day being read and DynamoDB's
+    LastEvaluatedKey (a session that runs past midnight is listed under
+    both days).
+    """
+    days = list(reversed(day_buckets(start, end)))
+    if not days:
+        return {"start_date": None, "end_date": None, "sessions": [], "next_cursor": None}
+    state = decode_cursor(cursor) or {"day": days[0], "lek": None}
+    if state.get("day") not in days:
+        raise BadRequest("Cursor does not match the requested range")
+
+    sessions = []
+    day_index, lek = days.index(state["day"]), state.get("lek")
+    while day_index < len(days) and len(sessions) < limit:
+        kwargs = {
+            "TableName": table_name,
+            "IndexName": SESSION_DAY_INDEX,
+            "KeyConditionExpression": "#day = :day",
+            "ExpressionAttributeNames": {"#day": SESSION_DAY_ATTR, "#loc": "location"},
+            "ExpressionAttributeValues": {":day": {"S": days[day_index]}},
+            "ProjectionExpression": "session_id, original_ts, #loc",
+            "ScanIndexForward": False,
+            "Limit": limit - len(sessions),
+        }
+        if lek:
+            kwargs["ExclusiveStartKey"] = lek
+        resp = client.query(**kwargs)
+        for raw in resp.get("Items", []):
+            row = _plain(raw)
+            sessions.append({
+                "session_id":     row["session_id"],
+                "first_activity": row.get("original_ts"),
+                "location":       row.get("location", ""),
+            })
+        lek = resp.get("LastEvaluatedKey")
+        if lek is None:
+            day_index += 1
+
+    next_state = {"day": days[day_index], "lek": lek} if day_index < len(days) else None
+    return {
+        "start_date":  days[-1] if days else None,
+        "end_date":    days[0] if days else None,
+        "sessions":    sessions,
+        "next_cursor": encode_cursor(next_state) if next_state else None,
+    }
+
+
+def parse_day(raw, default):
+    if not raw:
+        return default
+    try:
+        return datetime.strptime(raw, "%Y-%m-%d")
+    except ValueError:
+        raise BadRequest(f'Invalid date "{raw}" (expected YYYY-MM-DD)')
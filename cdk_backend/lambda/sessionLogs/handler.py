@@ -1,111 +1,188 @@
-import boto3
+import gzip
 import json
 import time
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 import os
 
+from blueberry_common import aws
+
 # Configuration
 GROUP_NAME = os.environ['GROUP_NAME']
 BUCKET = os.environ['BUCKET']
-DYNAMODB_TABLE = os.environ['DYNAMODB_TABLE']
+PREFIX = os.environ.get('EXPORT_PREFIX', 'session_logs/')
+WATERMARK_KEY = f"{PREFIX}_watermark.json"
+
+SLICE_SECONDS = int(os.environ.get('SLICE_SECONDS', '300'))            # grid the window is cut on
+SETTLE_SECONDS = int(os.environ.get('SETTLE_SECONDS', '120'))          # let log ingestion catch up
+MAX_WINDOW_SECONDS = int(os.environ.get('MAX_WINDOW_SECONDS', str(6 * 3600)))  # per run; catch up over runs
+CONCURRENCY = int(os.environ.get('EXPORT_CONCURRENCY', '4'))           # Insights allows ~30 per account
+QUERY_TIMEOUT = int(os.environ.get('QUERY_TIMEOUT', '120'))
+INSIGHTS_CAP = 10000                                                    # max rows one query returns
+MIN_SLICE_MS = 1000
 
 # Initialize clients
-logs_client = boto3.client('logs')
-s3_client = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
+logs_client = aws.client('logs')
+s3_client = aws.client('s3')
 
-table = dynamodb.Table(DYNAMODB_TABLE)
+QUERY = """
+fields @timestamp, @message
+| filter @timestamp >= {start_ms} and @timestamp < {end_ms}
+| filter @message like /"session_id":/
+| filter @message like /"query":/
+| filter @message like /"response":/
+| filter @message like /"location":/
+| sort @timestamp asc
+| limit {limit}
+"""
 
-def store_session_logs():
-    """Store only session logs with specified fields"""
-    today = datetime.utcnow()
-    start_time = datetime(today.year, today.month, today.day)
-    end_time = today
-    
-    date_str = today.strftime('%Y-%m-%d')
-    
-    # Check if already processed
-    try:
-        response = table.get_item(Key={'date': date_str, 'session_id': 'SESSION_LOGS'})
-        if 'Item' in response:
-            print(f"Session logs for {date_str} already processed")
-            return {'success': False, 'message': 'Logs already processed'}
-    except Exception as e:
-        print(f"DynamoDB check failed: {str(e)}")
 
+# ─── Watermark ─────────────────────────────────────────────────────────────────
+def load_watermark(now_s):
+    """Epoch seconds up to which everything is exported (default: start of today)."""
     try:
-        # Query to find session logs
-        query = """
-        fields @message
-        | filter @message like /"session_id":/
-        | filter @message like /"query":/
-        | filter @message like /"response":/
-        | filter @message like /"location":/
-        | limit 10000
-        """
-        
-        query_response = logs_client.start_query(
-            logGroupName=GROUP_NAME,
-            startTime=int(start_time.timestamp()),
-            endTime=int(end_time.timestamp()),
-            queryString=query,
-            limit=10000
-        )
-        
-        query_id = query_response['queryId']
-        print(f"Started query: {query_id}")
-        
-        # Wait for completion
-        response = None
-        while response is None or response['status'] == 'Running':
-            time.sleep(1)
-            response = logs_client.get_query_results(queryId=query_id)
-        
-        if response['status'] != 'Complete':
-            raise Exception(f"Query failed: {response['status']}")
-        
-        # Collect matching logs
-        session_logs = []
-        for result in response['results']:
-            message = next((f['value'] for f in result if f['field'] == '@message'), None)
-            if message:
-                try:
-                    # Extract JSON part
-                    json_start = message.find('{')
-                    if json_start != -1:
-                        log_data = json.loads(message[json_start:])
-                        if all(field in log_data for field in ['session_id', 'query', 'response']):
-                            session_logs.append(log_data)
-                except json.JSONDecodeError:
-                    continue
-        
-        if not session_logs:
-            print("No matching session logs found")
-            return {'success': False, 'message': 'No matching logs found'}
-        
-        # Store raw logs in S3
-        file_key = f"session_logs/{date_str}.json"
+        body = s3_client.get_object(Bucket=BUCKET, Key=WATERMARK_KEY)['Body'].read()
+        return int(json.loads(body)['exported_until'])
+    except s3_client.exceptions.NoSuchKey:
+        return now_s - now_s % 86400
+
+
+def save_watermark(epoch_s):
+    s3_client.put_object(
+        Bucket=BUCKET,
+        Key=WATERMARK_KEY,
+        Body=json.dumps({
+            'exported_until': epoch_s,
+            'exported_until_iso': datetime.fromtimestamp(epoch_s, timezone.utc).isoformat(),
+            'updated_at': datetime.utcnow().isoformat(),
+        }),
+        ContentType='application/json'
+    )
+
+
+# ─── Insights ──────────────────────────────────────────────────────────────────
+def run_query(start_ms, end_ms):
+    """One Insights query over [start_ms, end_ms); returns the raw result rows."""
+    query_id = logs_client.start_query(
+        logGroupName=GROUP_NAME,
+        startTime=start_ms // 1000,
+        endTime=(end_ms + 999) // 1000,            # whole seconds; the filter trims exactly
+        queryString=QUERY.format(start_ms=start_ms, end_ms=end_ms, limit=INSIGHTS_CAP),
+        limit=INSIGHTS_CAP
+    )['queryId']
+
+    deadline, delay = time.monotonic() + QUERY_TIMEOUT, 0.25
+    while True:
+        response = logs_client.get_query_results(queryId=query_id)
+        if response['status'] not in ('Scheduled', 'Running'):
+            break
+        if time.monotonic() > deadline:
+            logs_client.stop_query(queryId=query_id)
+            raise TimeoutError(f"Insights query {query_id} timed out")
+        time.sleep(delay)
+        delay = min(delay * 2, 2.0)
+
+    if response['status'] != 'Complete':
+        raise Exception(f"Query failed: {response['status']}")
+    return response['results']
+
+
+def query_slice(start_ms, end_ms):
+    """Rows of [start_ms, end_ms); halves the range while a query comes back capped."""
+    results = run_query(start_ms, end_ms)
+    if len(results) < INSIGHTS_CAP:
+        return results
+    if end_ms - start_ms <= MIN_SLICE_MS:
+        print(f"WARNING: {INSIGHTS_CAP}+ rows within {start_ms}..{end_ms} ms – rows beyond the cap are lost")
+        return results
+    mid = (start_ms + end_ms) // 2
+    print(f"Slice {start_ms}..{end_ms} hit the cap – splitting at {mid}")
+    return query_slice(start_ms, mid) + query_slice(mid, end_ms)
+
+
+def parse_session_logs(results):
+    """Collect matching logs"""
+    session_logs = []
+    for result in results:
+        message = next((f['value'] for f in result if f['field'] == '@message'), None)
+        if message:
+            try:
+                # Extract JSON part
+                json_start = message.find('{')
+                if json_start != -1:
+                    log_data = json.loads(message[json_start:])
+                    if all(field in log_data for field in ['session_id', 'query', 'response']):
+                        session_logs.append(log_data)
+            except json.JSONDecodeError:
+                continue
+    return session_logs
+
+
+# ─── Slices ────────────────────────────────────────────────────────────────────
+def slice_key(start_s, end_s):
+    """Deterministic, date-partitioned object name – a re-run overwrites, never duplicates."""
+    day = datetime.fromtimestamp(start_s, timezone.utc).strftime('%Y-%m-%d')
+    return f"{PREFIX}date={day}/part-{start_s}-{end_s}.ndjson.gz"
+
+
+def export_slice(bounds):
+    start_s, end_s = bounds
+    session_logs = parse_session_logs(query_slice(start_s * 1000, end_s * 1000))
+    if session_logs:
+        body = gzip.compress(''.join(json.dumps(log) + '\n' for log in session_logs).encode())
         s3_client.put_object(
             Bucket=BUCKET,
-            Key=file_key,
-            Body=json.dumps(session_logs),
-            ContentType='application/json'
+            Key=slice_key(start_s, end_s),
+            Body=body,
+            ContentType='application/gzip'
         )
-        
-        print(f"Stored {len(session_logs)} session logs to s3://{BUCKET}/{file_key}")
-        return {
-            'success': True,
-            's3_path': f"s3://{BUCKET}/{file_key}",
-            'log_count': len(session_logs)
-        }
-        
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        raise
+    return len(session_logs)
+
+
+def store_session_logs():
+    """Export every complete slice between the watermark and now, then advance it."""
+    now_s = int(time.time())
+    watermark = load_watermark(now_s)
+    # slices sit on a fixed grid so a retried run produces the same object names
+    until = min(now_s - SETTLE_SECONDS, watermark + MAX_WINDOW_SECONDS)
+    until -= until % SLICE_SECONDS
+    edges = sorted({watermark, until, *range(watermark - watermark % SLICE_SECONDS + SLICE_SECONDS,
+                                             until, SLICE_SECONDS)})
+    slices = list(zip(edges, edges[1:])) if until > watermark else []
+    if not slices:
+        print(f"Nothing to export yet (watermark {watermark})")
+        return {'success': True, 'message': 'Up to date', 'log_count': 0}
+
+    print(f"Exporting {len(slices)} slice(s) from {watermark} to {until}")
+    counts, error = [], None
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        futures = [pool.submit(export_slice, bounds) for bounds in slices]
+        # the watermark only moves over the contiguous run of finished slices
+        for bounds, future in zip(slices, futures):
+            try:
+                counts.append(future.result())
+            except Exception as e:
+                error = e
+                print(f"Slice {bounds} failed: {str(e)}")
+                break
+
+    exported_until = slices[len(counts) - 1][1] if counts else watermark
+    if exported_until > watermark:
+        save_watermark(exported_until)
+
+    log_count = sum(counts)
+    print(f"Stored {log_count} session logs in {len(counts)} slice(s); watermark now {exported_until}")
+    if error is not None:
+        raise error
+    return {
+        'success': True,
+        'message': f"Exported until {exported_until}",
+        'log_count': log_count
+    }
 
 def lambda_handler(event, context):
     action = event.get('action', 'store_logs')
-    
+
     if action == 'store_logs':
         result = store_session_logs()
         return {
@@ -120,4 +197,4 @@ def lambda_handler(event, context):
         return {
             'statusCode': 400,
             'body': json.dumps({'error': 'Invalid action'})
-        }
\ No newline at end of file
+        }
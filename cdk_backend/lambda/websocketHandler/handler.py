@@ -1,12 +1,41 @@
 import json
-import boto3
 import traceback
 import os 
+import uuid
+
+from blueberry_common import aws
 
 # Initialize AWS clients
-lambda_client = boto3.client('lambda')
+lambda_client = aws.client('lambda')
+sqs_client = aws.client('sqs')
 response_function_arn = os.environ['RESPONSE_FUNCTION_ARN']
 
+# "invoke" = one async cfEvaluator invoke per message (default)
+# "queue"  = enqueue on the FIFO queue that cfEvaluator drains in batches
+DISPATCH_MODE = os.environ.get('DISPATCH_MODE', 'invoke').lower()
+QUEUE_URL = os.environ.get('QUEUE_URL', '')
+
+
+def enqueue_message(payload, connection_id):
+    """
+    Put the message on the FIFO queue (one message group per session keeps
+    a session's questions in order) and return the approximate queue
+    position, or 0 when workers are keeping up.
+    """
+    group_id = payload.get('session_id') or connection_id
+    sqs_client.send_message(
+        QueueUrl=QUEUE_URL,
+        MessageBody=json.dumps(payload),
+        MessageGroupId=group_id,
+        MessageDeduplicationId=f"{connection_id}-{uuid.uuid4().hex}",
+    )
+    attrs = sqs_client.get_queue_attributes(
+        QueueUrl=QUEUE_URL,
+        AttributeNames=['ApproximateNumberOfMessages'],
+    )['Attributes']
+    # messages still waiting for a worker, our own included
+    return int(attrs.get('ApproximateNumberOfMessages', 0))
+
 def lambda_handler(event, context):
     try:
         # 1. Extract WebSocket context
@@ -39,7 +68,21 @@ def lambda_handler(event, context):
             if location:
                 payload_to_cf_evaluator['location'] = location
 
-            # 5. Fire off the evaluator asynchronously
+            # 4. Client opted into incremental "delta" frames
+            if body.get('stream'):
+                payload_to_cf_evaluator['stream'] = True
+
+            # 5a. Queue mode: tell the client where it stands if there is a backlog
+            if DISPATCH_MODE == 'queue':
+                position = enqueue_message(payload_to_cf_evaluator, connection_id)
+                if position > 1:
+                    return {
+                        'statusCode': 200,
+                        'body': json.dumps({'type': 'queued', 'position': position})
+                    }
+                return {'statusCode': 200}
+
+            # 5b. Fire off the evaluator asynchronously
             lambda_client.invoke(
                 FunctionName=response_function_arn,
                 InvocationType='Event',
@@ -19,6 +19,9 @@ import * as apigateway from 'aws-cdk-lib/aws-apigateway';
 import * as dynamodb from 'aws-cdk-lib/aws-dynamodb';
 import * as events   from 'aws-cdk-lib/aws-events';
 import * as targets  from 'aws-cdk-lib/aws-events-targets';
+import * as sqs from 'aws-cdk-lib/aws-sqs';
+import * as lambdaEventSources from 'aws-cdk-lib/aws-lambda-event-sources';
+import * as s3n from 'aws-cdk-lib/aws-s3-notifications';
 import { Topic } from '@cdklabs/generative-ai-cdk-constructs/lib/cdk-lib/bedrock/guardrails/guardrail-filters';
 
 export class BlueberryStackLatest extends cdk.Stack {
@@ -64,6 +67,19 @@ export class BlueberryStackLatest extends cdk.Stack {
     const BlueberryData = new s3.Bucket(this, 'BlueberryData', {
       enforceSSL: true,
       removalPolicy: cdk.RemovalPolicy.RETAIN, 
+      // the admin UI PUTs documents straight to presigned URLs (adminFile /files/uploads)
+      cors: [{
+        allowedMethods: [s3.HttpMethods.PUT, s3.HttpMethods.GET],
+        allowedOrigins: ['*'],
+        allowedHeaders: ['*'],
+        exposedHeaders: ['ETag'],
+        maxAge: 3000,
+      }],
+      lifecycleRules: [
+        { abortIncompleteMultipartUploadAfter: cdk.Duration.days(1) },
+        // zip archives of batch uploads are deleted once extracted; this catches abandoned ones
+        { prefix: '_staging/', expiration: cdk.Duration.days(1) },
+      ],
     });
 
     const emailBucket = new s3.Bucket(this, 'emailBucket', {
@@ -112,6 +128,11 @@ export class BlueberryStackLatest extends cdk.Stack {
       const dashboardLogsBucket = new s3.Bucket(this, 'DashboardLogsBucket', {
         enforceSSL: true,
         removalPolicy: cdk.RemovalPolicy.RETAIN,
+        lifecycleRules: [
+          // multipart exports that died mid-way, and old export downloads
+          { abortIncompleteMultipartUploadAfter: cdk.Duration.days(1) },
+          { prefix: 'exports/', expiration: cdk.Duration.days(7) },
+        ],
       });
 
       const sessionLogsTable = new dynamodb.Table(this, 'SessionLogsTable', {
@@ -121,6 +142,91 @@ export class BlueberryStackLatest extends cdk.Stack {
         removalPolicy: cdk.RemovalPolicy.DESTROY,  //for production have retain
       });
 
+      // Day buckets written by logclassifier (see blueberry_common/session_buckets.py);
+      // retrieveSessionLogs queries only the days in the requested timeframe.
+      sessionLogsTable.addGlobalSecondaryIndex({
+        indexName: 'ByDateBucket',
+        partitionKey: { name: 'date_bucket', type: dynamodb.AttributeType.STRING },
+        sortKey:      { name: 'original_ts', type: dynamodb.AttributeType.STRING },
+        projectionType: dynamodb.ProjectionType.INCLUDE,
+        nonKeyAttributes: ['location', 'category', 'query'],
+      });
+
+      // Sparse: only the first turn of a session per day carries session_day,
+      // so the sessions listing reads one entry per session and day.
+      // Backfill existing rows with backfill_buckets.py --session-days.
+      sessionLogsTable.addGlobalSecondaryIndex({
+        indexName: 'BySessionDay',
+        partitionKey: { name: 'session_day', type: dynamodb.AttributeType.STRING },
+        sortKey:      { name: 'original_ts', type: dynamodb.AttributeType.STRING },
+        projectionType: dynamodb.ProjectionType.INCLUDE,
+        nonKeyAttributes: ['location'],
+      });
+
+      // Per-day / per-hour analytics counters kept in step with the session logs
+      // by logclassifier (blueberry_common/rollups.py); rebuild with
+      // lambda/logclassifier/rebuild_rollups.py.
+      const rollupTable = new dynamodb.Table(this, 'AnalyticsRollupTable', {
+        partitionKey: { name: 'rollup_key', type: dynamodb.AttributeType.STRING },
+        billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+        removalPolicy: cdk.RemovalPolicy.DESTROY,
+      });
+
+      // Semantic answer cache consulted by cfEvaluator before invoke_agent;
+      // "__generation__" is bumped by kbSync whenever an ingestion job completes.
+      const answerCacheTable = new dynamodb.Table(this, 'AnswerCacheTable', {
+        partitionKey: { name: 'cache_key', type: dynamodb.AttributeType.STRING },
+        billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+        timeToLiveAttribute: 'ttl',
+        removalPolicy: cdk.RemovalPolicy.DESTROY,
+      });
+
+      // Debounced KB sync state (blueberry_common/kb_sync.py): pending document
+      // changes and the one running ingestion job per data source.
+      const kbSyncStateTable = new dynamodb.Table(this, 'KbSyncStateTable', {
+        partitionKey: { name: 'sync_key', type: dynamodb.AttributeType.STRING },
+        billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+        removalPolicy: cdk.RemovalPolicy.DESTROY,
+      });
+
+      // Manifest of the admin documents (adminFile/document_index.py): one row per
+      // object, kept in step on upload/delete; LSIs give the other sort orders.
+      // Batch-operation reports live here too (pk "batch", expire after 7 days).
+      const documentIndexTable = new dynamodb.Table(this, 'DocumentIndexTable', {
+        partitionKey: { name: 'pk',  type: dynamodb.AttributeType.STRING },
+        sortKey:      { name: 'key', type: dynamodb.AttributeType.STRING },
+        billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+        timeToLiveAttribute: 'ttl',
+        removalPolicy: cdk.RemovalPolicy.DESTROY,
+      });
+      documentIndexTable.addLocalSecondaryIndex({
+        indexName: 'ByModified',
+        sortKey:   { name: 'last_modified', type: dynamodb.AttributeType.STRING },
+      });
+      documentIndexTable.addLocalSecondaryIndex({
+        indexName: 'BySize',
+        sortKey:   { name: 'size', type: dynamodb.AttributeType.NUMBER },
+      });
+
+      // Single-flight coordination: one leader per identical in-flight question,
+      // followers' connectionIds are collected here for the fan-out.
+      const inFlightTable = new dynamodb.Table(this, 'InFlightQuestionsTable', {
+        partitionKey: { name: 'flight_key', type: dynamodb.AttributeType.STRING },
+        billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+        timeToLiveAttribute: 'ttl',
+        removalPolicy: cdk.RemovalPolicy.DESTROY,
+      });
+
+      // Admin escalations awaiting the next digest email (lambda/email/digest.py),
+      // plus the hourly send counter and the flush lock.
+      const escalationsTable = new dynamodb.Table(this, 'AdminEscalationsTable', {
+        partitionKey: { name: 'pk', type: dynamodb.AttributeType.STRING },
+        sortKey:      { name: 'sk', type: dynamodb.AttributeType.STRING },
+        billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+        timeToLiveAttribute: 'ttl',
+        removalPolicy: cdk.RemovalPolicy.DESTROY,
+      });
+
     const bedrockRoleAgent = new iam.Role(this, 'BedrockRole3', {
       assumedBy: new iam.ServicePrincipal('bedrock.amazonaws.com'),
       managedPolicies: [
@@ -223,9 +329,16 @@ export class BlueberryStackLatest extends cdk.Stack {
       environment: {
         VERIFIED_SOURCE_EMAIL: adminEmail,
         ADMIN_EMAIL: adminEmail,
+        NOTIFY_MODE: 'digest',
+        ESCALATIONS_TABLE: escalationsTable.tableName,
+        DIGEST_WINDOW_MINUTES: '60',
+        NOTIFY_MAX_EMAILS_PER_HOUR: '12',
+        NOTIFY_URGENT_KEYWORDS: 'urgent,emergency,asap',
       },
       timeout: cdk.Duration.seconds(60),
     });
+
+    escalationsTable.grantReadWriteData(notificationFn);
     
     // 2) Create the Action Group
     const notifyActionGroup = new bedrock.AgentActionGroup({
@@ -257,18 +370,61 @@ export class BlueberryStackLatest extends cdk.Stack {
       autoDeploy: true,
     });
 
+    // Code shared by the Python Lambdas (lambda/common/python/blueberry_common)
+    const commonLayer = new lambda.LayerVersion(this, 'BlueberryCommonLayer', {
+      code: lambda.Code.fromAsset('lambda/common'),
+      compatibleRuntimes: [lambda.Runtime.PYTHON_3_12],
+      description: 'Shared helpers for the Blueberry Lambdas',
+    });
+
+    // Shared AIMD concurrency limit + slot leases for every Bedrock caller
+    const bedrockLimiterTable = new dynamodb.Table(this, 'BedrockLimiterTable', {
+      partitionKey: { name: 'limiter_key', type: dynamodb.AttributeType.STRING },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
+    const bedrockLimiterEnv = {
+      BEDROCK_LIMITER_STORE: 'dynamodb',
+      BEDROCK_LIMITER_TABLE: bedrockLimiterTable.tableName,
+      // slot lease: a little over the 120 s timeout of logclassifier / cfEvaluator
+      BEDROCK_SLOT_LEASE:    '130',
+    };
+
     const logclassifier = new lambda.Function(this, 'logclassifier', {
       runtime: lambda.Runtime.PYTHON_3_12,
       handler: 'handler.lambda_handler',
       code: lambda.Code.fromAsset('lambda/logclassifier'),  
-      timeout: cdk.Duration.seconds(30),
+      layers: [commonLayer],
+      timeout: cdk.Duration.seconds(120),
       environment: {  
         BUCKET:     dashboardLogsBucket.bucketName,
         DYNAMODB_TABLE: sessionLogsTable.tableName,
+        // artifact written by lambda/logclassifier/train_classifier.py
+        CATEGORY_MODEL_S3_KEY: 'models/category_model.json.gz',
+        LOCAL_CLASSIFIER_THRESHOLD: '0.9',
+        ROLLUP_TABLE: rollupTable.tableName,
+        ...bedrockLimiterEnv,
       },
     });
 
+    bedrockLimiterTable.grantReadWriteData(logclassifier);
+
+    // Chat turns are micro-batched: cfEvaluator enqueues, logclassifier
+    // classifies a whole batch per Converse call and writes with BatchWriteItem.
+    const logQueue = new sqs.Queue(this, 'LogClassifierQueue', {
+      visibilityTimeout: cdk.Duration.seconds(logclassifier.timeout!.toSeconds() * 6),
+      enforceSSL: true,
+    });
+
+    logclassifier.addEventSource(new lambdaEventSources.SqsEventSource(logQueue, {
+      batchSize: 100,
+      maxBatchingWindow: cdk.Duration.seconds(60),
+      reportBatchItemFailures: true,
+    }));
+
     sessionLogsTable.grantReadWriteData(logclassifier)
+    rollupTable.grantReadWriteData(logclassifier);
     dashboardLogsBucket.grantRead(logclassifier);  
     logclassifier.role?.addManagedPolicy(
       cdk.aws_iam.ManagedPolicy.fromAwsManagedPolicyName('AmazonBedrockFullAccess'),
@@ -279,17 +435,33 @@ export class BlueberryStackLatest extends cdk.Stack {
       handler: 'handler.lambda_handler',
       code: lambda.Code.fromDockerBuild('lambda/cfEvaluator'), 
       architecture: lambdaArchitecture,
+      layers: [commonLayer],
       environment: {
+        ...bedrockLimiterEnv,
         WS_API_ENDPOINT: webSocketStage.callbackUrl,
         AGENT_ID: agent.agentId,
         AGENT_ALIAS_ID: AgentAlias.aliasId,
-        LOG_CLASSIFIER_FN_NAME: logclassifier.functionName
+        LOG_CLASSIFIER_FN_NAME: logclassifier.functionName,
+        LOG_QUEUE_URL: logQueue.queueUrl,
+        SEMANTIC_CACHE: 'dynamodb',
+        SEMANTIC_CACHE_TABLE: answerCacheTable.tableName,
+        SINGLE_FLIGHT: 'dynamodb',
+        SINGLE_FLIGHT_TABLE: inFlightTable.tableName,
+        // BM25 index of admin-approved answers (rows in the document index table)
+        APPROVED_ANSWERS: 'on',
+        APPROVED_ANSWERS_TABLE: documentIndexTable.tableName,
+        APPROVED_ANSWER_THRESHOLD: '0.8',
       },
       timeout: cdk.Duration.seconds(120),
     });
 
     BlueberryData.grantRead(cfEvaluator);
     logclassifier.grantInvoke(cfEvaluator);
+    logQueue.grantSendMessages(cfEvaluator);
+    answerCacheTable.grantReadWriteData(cfEvaluator);
+    inFlightTable.grantReadWriteData(cfEvaluator);
+    documentIndexTable.grantReadData(cfEvaluator);
+    bedrockLimiterTable.grantReadWriteData(cfEvaluator);
 
     cfEvaluator.role?.addManagedPolicy(
       cdk.aws_iam.ManagedPolicy.fromAwsManagedPolicyName('AmazonBedrockFullAccess'),
@@ -299,17 +471,51 @@ export class BlueberryStackLatest extends cdk.Stack {
       cdk.aws_iam.ManagedPolicy.fromAwsManagedPolicyName('AmazonAPIGatewayInvokeFullAccess'),
     );
 
+    // Backpressure between the socket and the agent: websocketHandler enqueues,
+    // cfEvaluator drains in batches with bounded concurrency. One message group
+    // per chat session keeps a session's questions in order.
+    const chatQueue = new sqs.Queue(this, 'ChatMessageQueue', {
+      fifo: true,
+      visibilityTimeout: cdk.Duration.seconds(cfEvaluator.timeout!.toSeconds() * 6),
+      retentionPeriod: cdk.Duration.minutes(15),
+      enforceSSL: true,
+      // turns whose error frame could not be delivered are retried once, then parked
+      deadLetterQueue: {
+        queue: new sqs.Queue(this, 'ChatMessageDLQ', {
+          fifo: true,
+          retentionPeriod: cdk.Duration.days(14),
+          enforceSSL: true,
+        }),
+        maxReceiveCount: 2,
+      },
+    });
+
+    cfEvaluator.addEventSource(new lambdaEventSources.SqsEventSource(chatQueue, {
+      batchSize: 4,
+      maxConcurrency: 10,
+      reportBatchItemFailures: true,
+    }));
+    cfEvaluator.addEnvironment('QUEUE_WORKER_CONCURRENCY', '4');
+
     const webSocketHandler = new lambda.Function(this, 'web-socket-handler', {
       runtime: lambda.Runtime.PYTHON_3_12,
       code: lambda.Code.fromAsset('lambda/websocketHandler'),
       handler: 'handler.lambda_handler',
+      layers: [commonLayer],
       timeout: cdk.Duration.seconds(120),
       environment: {
-        RESPONSE_FUNCTION_ARN: cfEvaluator.functionArn
+        RESPONSE_FUNCTION_ARN: cfEvaluator.functionArn,
+        DISPATCH_MODE: 'queue',
+        QUEUE_URL: chatQueue.queueUrl,
       }
     });
 
     cfEvaluator.grantInvoke(webSocketHandler)
+    chatQueue.grantSendMessages(webSocketHandler);
+    webSocketHandler.addToRolePolicy(new iam.PolicyStatement({
+      actions: ['sqs:GetQueueAttributes'],
+      resources: [chatQueue.queueArn],
+    }));
 
     const webSocketIntegration = new apigatewayv2_integrations.WebSocketLambdaIntegration('web-socket-integration', webSocketHandler);
 
@@ -324,17 +530,53 @@ export class BlueberryStackLatest extends cdk.Stack {
       runtime: lambda.Runtime.PYTHON_3_12,
       code: lambda.Code.fromAsset('lambda/emailReply'),
       handler: 'handler.lambda_handler',
+      layers: [commonLayer],
       memorySize: 2048,
       timeout: cdk.Duration.minutes(2),
+      // large messages and attachments are spooled to /tmp while parsing
+      ephemeralStorageSize: cdk.Size.gibibytes(2),
       environment: {
         SOURCE_BUCKET_NAME: emailBucket.bucketName,
         DESTINATION_BUCKET_NAME: BlueberryData.bucketName,
         KNOWLEDGE_BASE_ID: kb.knowledgeBaseId,
         DATA_SOURCE_ID: blueberryDataSource.dataSourceId,
         ADMIN_EMAIL: adminEmail,
+        SYNC_STATE_TABLE: kbSyncStateTable.tableName,
+        DOCUMENT_INDEX_TABLE: documentIndexTable.tableName,
+        ATTACHMENT_PREFIX: 'email_attachments/',
+        RECORD_WORKERS: '4',
       },
     })
 
+    kbSyncStateTable.grantReadWriteData(emailHandler);
+    documentIndexTable.grantReadWriteData(emailHandler);
+
+    // Emails stored by the SES rule reach emailReply in batches through SQS;
+    // records that fail are reported individually and retried, then dead-lettered.
+    const emailQueue = new sqs.Queue(this, 'EmailReplyQueue', {
+      visibilityTimeout: cdk.Duration.seconds(emailHandler.timeout!.toSeconds() * 6),
+      enforceSSL: true,
+      deadLetterQueue: {
+        queue: new sqs.Queue(this, 'EmailReplyDLQ', {
+          retentionPeriod: cdk.Duration.days(14),
+          enforceSSL: true,
+        }),
+        maxReceiveCount: 5,
+      },
+    });
+
+    emailBucket.addEventNotification(
+      s3.EventType.OBJECT_CREATED,
+      new s3n.SqsDestination(emailQueue),
+      { prefix: 'incoming/' },
+    );
+
+    emailHandler.addEventSource(new lambdaEventSources.SqsEventSource(emailQueue, {
+      batchSize: 10,
+      maxBatchingWindow: cdk.Duration.seconds(20),
+      reportBatchItemFailures: true,
+    }));
+
     // Create SES Receipt Rule Set
     const sesRuleSet = new ses.ReceiptRuleSet(this, 'blueberry-email-receipt-rule-set', {
       receiptRuleSetName: 'blueberry-email-processing-rules',
@@ -348,16 +590,12 @@ export class BlueberryStackLatest extends cdk.Stack {
       tlsPolicy: ses.TlsPolicy.OPTIONAL,
     });
 
-    // Add actions to the rule
+    // Add actions to the rule – the stored object triggers emailReply via EmailReplyQueue
     sesRule.addAction(new sesActions.S3({
       bucket: emailBucket,
       objectKeyPrefix: 'incoming/',
     }));
 
-    sesRule.addAction(new sesActions.Lambda({
-      function: emailHandler,
-    }));
-
     const activate = new AwsCustomResource(this, 'ActivateReceiptRuleSet', {
       onCreate: {
         service: 'SES',
@@ -376,11 +614,6 @@ export class BlueberryStackLatest extends cdk.Stack {
 
     
 
-    emailHandler.addPermission('AllowSESInvoke', {
-      principal: new iam.ServicePrincipal('ses.amazonaws.com'),
-      action: 'lambda:InvokeFunction',
-      sourceAccount: this.account,
-    });
     
     BlueberryData.grantReadWrite(emailHandler)
     emailBucket.grantRead(emailHandler)
@@ -493,20 +726,87 @@ export class BlueberryStackLatest extends cdk.Stack {
       runtime: lambda.Runtime.PYTHON_3_12,
       handler: 'handler.lambda_handler',
       code: lambda.Code.fromAsset('lambda/adminFile'),  
+      layers: [commonLayer],
       memorySize: 1024,
-      timeout: cdk.Duration.seconds(30),
+      // zip batches and large deletes run in an async self-invocation (API calls stay under 29 s)
+      timeout: cdk.Duration.minutes(5),
+      ephemeralStorageSize: cdk.Size.gibibytes(4),
       environment: {
         BUCKET_NAME:         BlueberryData.bucketName,  
         KNOWLEDGE_BASE_ID:   kb.knowledgeBaseId,
         DATA_SOURCE_ID:      blueberryDataSource.dataSourceId,
+        SYNC_STATE_TABLE:    kbSyncStateTable.tableName,
+        DOCUMENT_INDEX_TABLE: documentIndexTable.tableName,
+        PRESIGNED_URL_TTL:    '3600',
+        MULTIPART_THRESHOLD_MB: '64',
+        MULTIPART_PART_MB:    '16',
+        BATCH_WORKERS:        '8',
+        MAX_BATCH_UPLOADS:    '200',
+        SYNC_DELETE_KEYS:     '100',
+        MAX_ARCHIVE_MB:       '3072',
       }
     });
 
     BlueberryData.grantReadWrite(fileHandler);
+    kbSyncStateTable.grantReadWriteData(fileHandler);
+    documentIndexTable.grantReadWriteData(fileHandler);
+    fileHandler.addToRolePolicy(new iam.PolicyStatement({
+      actions:   ['lambda:InvokeFunction'],
+      resources: [`arn:aws:lambda:${this.region}:${this.account}:function:*FileApiHandler*`],
+    }));
     fileHandler.role?.addManagedPolicy(
       cdk.aws_iam.ManagedPolicy.fromAwsManagedPolicyName('AmazonBedrockFullAccess'),
     );
 
+    // Debounced KB sync: every minute, start at most one ingestion job for the
+    // changes recorded by adminFile / emailReply, and follow it to completion.
+    // Small change sets are ingested document by document; unchanged re-uploads
+    // (same ETag as the manifest) are skipped.
+    const kbSyncFn = new lambda.Function(this, 'KbSyncScheduler', {
+      runtime: lambda.Runtime.PYTHON_3_12,
+      handler: 'handler.lambda_handler',
+      code: lambda.Code.fromAsset('lambda/kbSync'),
+      layers: [commonLayer],
+      timeout: cdk.Duration.seconds(60),
+      reservedConcurrentExecutions: 1,
+      environment: {
+        KNOWLEDGE_BASE_ID:        kb.knowledgeBaseId,
+        DATA_SOURCE_ID:           blueberryDataSource.dataSourceId,
+        BUCKET_NAME:              BlueberryData.bucketName,
+        SYNC_STATE_TABLE:         kbSyncStateTable.tableName,
+        SEMANTIC_CACHE_TABLE:     answerCacheTable.tableName,
+        KB_SYNC_DEBOUNCE_SECONDS: '120',
+        KB_SYNC_MAX_WAIT_SECONDS: '900',
+        KB_SYNC_INCREMENTAL_MAX:  '25',
+      },
+    });
+
+    kbSyncStateTable.grantReadWriteData(kbSyncFn);
+    answerCacheTable.grantWriteData(kbSyncFn);
+    BlueberryData.grantRead(kbSyncFn);
+    kbSyncFn.addToRolePolicy(new iam.PolicyStatement({
+      actions: [
+        'bedrock:StartIngestionJob',
+        'bedrock:GetIngestionJob',
+        'bedrock:IngestKnowledgeBaseDocuments',
+        'bedrock:DeleteKnowledgeBaseDocuments',
+        'bedrock:GetKnowledgeBaseDocuments',
+      ],
+      resources: [kb.knowledgeBaseArn],
+    }));
+
+    new events.Rule(this, 'KbSyncSchedule', {
+      description: 'Start debounced knowledge-base ingestion jobs',
+      schedule: events.Schedule.rate(cdk.Duration.minutes(1)),
+    }).addTarget(new targets.LambdaFunction(kbSyncFn, { retryAttempts: 0 }));
+
+    // Admin escalation digests: one email per closed window, capped per hour
+    notificationFn.addLayers(commonLayer);
+    new events.Rule(this, 'AdminDigestSchedule', {
+      description: 'Send the batched admin escalation digest',
+      schedule: events.Schedule.rate(cdk.Duration.minutes(15)),
+    }).addTarget(new targets.LambdaFunction(notificationFn, { retryAttempts: 0 }));
+
 
     const AdminApi = new apigateway.RestApi(this, 'admin_api', {
       restApiName: 'AdminApi',
@@ -526,6 +826,18 @@ export class BlueberryStackLatest extends cdk.Stack {
 
     const single = files.addResource('{key}');
 
+    // presigned direct-to-S3 uploads (POST /files/uploads, /complete, /abort)
+    const uploads = files.addResource('uploads');
+    const uploadComplete = uploads.addResource('complete');
+    const uploadAbort = uploads.addResource('abort');
+    // POST /files/reindex rebuilds the document manifest from a bucket listing
+    const reindex = files.addResource('reindex');
+    // batches: POST /files/batch/delete, /uploads, /uploads/complete; GET /files/batch/{batchId}
+    const batch = files.addResource('batch');
+    const batchDelete = batch.addResource('delete');
+    const batchUploads = batch.addResource('uploads');
+    const batchComplete = batchUploads.addResource('complete');
+
     const sync   = AdminApi.root.addResource('sync');
 
 
@@ -553,56 +865,81 @@ export class BlueberryStackLatest extends cdk.Stack {
       authorizationType: apigateway.AuthorizationType.COGNITO,
     });
 
+    [ uploads, uploadComplete, uploadAbort, reindex, batchDelete, batchUploads, batchComplete ].forEach(resource => {
+      resource.addMethod('POST', integ, {
+        authorizer: userPoolAuthorizer,
+        authorizationType: apigateway.AuthorizationType.COGNITO,
+      });
+    });
+
+    batch.addResource('{batchId}').addMethod('GET', integ, {
+      authorizer: userPoolAuthorizer,
+      authorizationType: apigateway.AuthorizationType.COGNITO,
+    });
+
     const logGroupNamecfEvaluator = `/aws/lambda/${cfEvaluator.functionName}`;
 
+    // Incremental exporter: every few minutes, from a watermark in the bucket,
+    // in Insights-sized time slices written as date-partitioned objects.
     const sessionLogsFn = new lambda.Function(this, 'SessionLogsHandler', {
       runtime: lambda.Runtime.PYTHON_3_12,
       handler: 'handler.lambda_handler',
       code: lambda.Code.fromAsset('lambda/sessionLogs'),  
-      timeout: cdk.Duration.seconds(30),
+      layers: [commonLayer],
+      timeout: cdk.Duration.minutes(5),
+      reservedConcurrentExecutions: 1,   // one run owns the watermark at a time
       environment: {
         GROUP_NAME: logGroupNamecfEvaluator,  
         BUCKET:     dashboardLogsBucket.bucketName,
-        DYNAMODB_TABLE: sessionLogsTable.tableName,
+        EXPORT_PREFIX: 'session_logs/',
       },
     });
 
     sessionLogsFn.addToRolePolicy(new iam.PolicyStatement({
       actions: [
         'logs:StartQuery',
-        'logs:GetQueryResults',
       ],
       resources: [`arn:aws:logs:${this.region}:${this.account}:log-group:${logGroupNamecfEvaluator}:*`],
     }));
+    // query-id based calls have no resource-level permissions
+    sessionLogsFn.addToRolePolicy(new iam.PolicyStatement({
+      actions: [
+        'logs:GetQueryResults',
+        'logs:StopQuery',
+      ],
+      resources: ['*'],
+    }));
 
-    dashboardLogsBucket.grantPut(sessionLogsFn);
-    sessionLogsTable.grantReadWriteData(sessionLogsFn);
-
-    const dailyRule = new events.Rule(this, 'DailySessionLogsScheduler', {
-      description: 'Trigger session-logs Lambda every night at 8:20 PM UTC',
-      schedule: events.Schedule.cron({
-        minute: '59',
-        hour:   '23',
-        day:    '*',    // every day of month
-        month:  '*',    // every month
-        year:   '*',    // every year
-      }),
+    dashboardLogsBucket.grantReadWrite(sessionLogsFn, 'session_logs/*');
+
+    const exportRule = new events.Rule(this, 'SessionLogsExportScheduler', {
+      description: 'Export new session logs to the dashboard bucket every 5 minutes',
+      schedule: events.Schedule.rate(cdk.Duration.minutes(5)),
     });
 
-    dailyRule.addTarget(new targets.LambdaFunction(sessionLogsFn));
+    exportRule.addTarget(new targets.LambdaFunction(sessionLogsFn, { retryAttempts: 0 }));
 
     const retrieveSessionLogsFn = new lambda.Function(this, 'RetrieveSessionLogsFn', {
       runtime: lambda.Runtime.PYTHON_3_12,
       handler: 'handler.lambda_handler',
       code:    lambda.Code.fromAsset('lambda/retrieveSessionLogs'),
-      timeout: cdk.Duration.seconds(10),
+      layers:  [commonLayer],
+      timeout: cdk.Duration.seconds(30),   // headroom for a cold geocoding cache
       environment: {
         DYNAMODB_TABLE: sessionLogsTable.tableName,
+        QUERY_CONCURRENCY: '16',
+        ROLLUP_TABLE: rollupTable.tableName,
+        // county/city gazetteer (build_gazetteer.py); states are built in
+        GAZETTEER_BUCKET: dashboardLogsBucket.bucketName,
+        GAZETTEER_S3_KEY: this.node.tryGetContext('gazetteerS3Key') ?? 'geo/us_gazetteer.json.gz',
       },
     });
 
     // Allow it to read from the sessions table
     sessionLogsTable.grantReadData(retrieveSessionLogsFn);
+    // rollups + the cached location resolutions ("geo#..." rows)
+    rollupTable.grantReadWriteData(retrieveSessionLogsFn);
+    dashboardLogsBucket.grantRead(retrieveSessionLogsFn, 'geo/*');
 
     // 2) Hook it into API Gateway
     const sessionLogs = AdminApi.root.addResource('session-logs');
@@ -620,6 +957,81 @@ export class BlueberryStackLatest extends cdk.Stack {
       authorizationType: apigateway.AuthorizationType.COGNITO,
     });
 
+    // Paged listing of sessions in a date range (?start=&end=&limit=&cursor=)
+    const sessionList = sessionLogs.addResource('sessions');
+    sessionList.addMethod('GET', statsIntegration, {
+      authorizer:        userPoolAuthorizer,
+      authorizationType: apigateway.AuthorizationType.COGNITO,
+    });
+
+    // Bulk export: POST starts an async job that streams gzip'd NDJSON/CSV
+    // into a multipart object; GET /export/{exportId} returns a presigned link.
+    const exportSessionLogsFn = new lambda.Function(this, 'ExportSessionLogsFn', {
+      runtime: lambda.Runtime.PYTHON_3_12,
+      handler: 'handler.lambda_handler',
+      code:    lambda.Code.fromAsset('lambda/exportSessionLogs'),
+      layers:  [commonLayer],
+      timeout: cdk.Duration.minutes(15),
+      memorySize: 1024,
+      environment: {
+        DYNAMODB_TABLE: sessionLogsTable.tableName,
+        EXPORT_BUCKET:  dashboardLogsBucket.bucketName,
+        EXPORT_PREFIX:  'exports/',
+      },
+    });
+
+    sessionLogsTable.grantReadData(exportSessionLogsFn);
+    dashboardLogsBucket.grantReadWrite(exportSessionLogsFn, 'exports/*');
+    // re-invokes itself asynchronously (name pattern avoids a circular reference)
+    exportSessionLogsFn.addToRolePolicy(new iam.PolicyStatement({
+      actions:   ['lambda:InvokeFunction'],
+      resources: [`arn:aws:lambda:${this.region}:${this.account}:function:*ExportSessionLogsFn*`],
+    }));
+
+    const exportIntegration = new apigateway.LambdaIntegration(exportSessionLogsFn, { proxy: true });
+    const sessionExport = sessionLogs.addResource('export');
+    sessionExport.addMethod('POST', exportIntegration, {
+      authorizer:        userPoolAuthorizer,
+      authorizationType: apigateway.AuthorizationType.COGNITO,
+    });
+    sessionExport.addResource('{exportId}').addMethod('GET', exportIntegration, {
+      authorizer:        userPoolAuthorizer,
+      authorizationType: apigateway.AuthorizationType.COGNITO,
+    });
+
+    // Nightly compaction of the table + raw log dumps into date-partitioned
+    // Parquet (archive/session_logs/date=YYYY-MM-DD/) for offline analysis.
+    // pyarrow comes from the AWS-managed "AWS SDK for pandas" layer.
+    const pandasLayer = lambda.LayerVersion.fromLayerVersionArn(this, 'AwsSdkPandasLayer',
+      `arn:aws:lambda:${this.region}:336392948345:layer:AWSSDKPandas-Python312:` +
+      (this.node.tryGetContext('awsSdkPandasLayerVersion') ?? '16'));
+
+    const archiveSessionLogsFn = new lambda.Function(this, 'ArchiveSessionLogsFn', {
+      runtime: lambda.Runtime.PYTHON_3_12,
+      handler: 'handler.lambda_handler',
+      code:    lambda.Code.fromAsset('lambda/archiveSessionLogs'),
+      layers:  [commonLayer, pandasLayer],
+      timeout: cdk.Duration.minutes(15),
+      memorySize: 2048,
+      environment: {
+        DYNAMODB_TABLE: sessionLogsTable.tableName,
+        BUCKET:         dashboardLogsBucket.bucketName,
+        LOGS_PREFIX:    'session_logs/',
+        ARCHIVE_PREFIX: 'archive/session_logs/',
+      },
+    });
+
+    sessionLogsTable.grantReadData(archiveSessionLogsFn);
+    dashboardLogsBucket.grantRead(archiveSessionLogsFn, 'session_logs/*');
+    dashboardLogsBucket.grantReadWrite(archiveSessionLogsFn, 'archive/*');
+
+    const archiveRule = new events.Rule(this, 'SessionLogsArchiveScheduler', {
+      description: 'Compact the previous day of session logs into Parquet',
+      schedule: events.Schedule.cron({ minute: '30', hour: '1' }),
+    });
+
+    archiveRule.addTarget(new targets.LambdaFunction(archiveSessionLogsFn));
+
 
     const amplifyApp = new amplify.App(this, 'ChatbotUIBlueberry', {
       sourceCodeProvider: new amplify.GitHubSourceCodeProvider({
@@ -60,12 +60,11 @@ const redPin = new L.Icon({
 export default function AdminAnalytics() {
   const [timeframe, setTimeframe] = useState("today");
   const [categoryCounts, setCounts] = useState({});
-  const [locations, setLocations] = useState([]);         // unique location strings
-  const [locationCounts, setLocationCounts] = useState({}); // { "Texas, US": 12, … }
-  const [coordsMap, setCoordsMap] = useState({});        // { "Texas, US": [lat, lng], … }
+  const [places, setPlaces] = useState([]);              // [{ place, name, lat, lon, count }]
   const [userCount, setUserCount] = useState(0);
+  const [topQuestions, setTopQuestions] = useState([]);  // [{ question, count, max_error }]
 
-  // 1) fetch analytics and build counts per-location
+  // fetch analytics; locations arrive geocoded and summed per place
   useEffect(() => {
     async function fetchAnalytics() {
       try {
@@ -82,16 +81,9 @@ export default function AdminAnalytics() {
         });
         setCounts(counts);
 
-        // aggregate raw locations
-        const raw = data.locations || [];
-        const locCounts = {};
-        raw.forEach((loc) => {
-          locCounts[loc] = (locCounts[loc] || 0) + 1;
-        });
-        setLocationCounts(locCounts);
-        setLocations(Object.keys(locCounts));
-
+        setPlaces(data.places || []);
         setUserCount(data.user_count || 0);
+        setTopQuestions(data.top_questions || []);
       } catch (err) {
         console.error("Analytics fetch failed:", err);
       }
@@ -99,35 +91,6 @@ export default function AdminAnalytics() {
     fetchAnalytics();
   }, [timeframe]);
 
-  // 2) geocode each unique location if needed
-  useEffect(() => {
-    locations.forEach((loc) => {
-      if (coordsMap[loc]) return;
-
-      const cached = localStorage.getItem(`coords:${loc}`);
-      if (cached) {
-        setCoordsMap((m) => ({ ...m, [loc]: JSON.parse(cached) }));
-        return;
-      }
-
-      fetch(
-        `https://nominatim.openstreetmap.org/search?format=json&q=${encodeURIComponent(
-          loc
-        )}`
-      )
-        .then((r) => r.json())
-        .then((results) => {
-          if (results && results.length) {
-            const { lat, lon } = results[0];
-            const pair = [parseFloat(lat), parseFloat(lon)];
-            setCoordsMap((m) => ({ ...m, [loc]: pair }));
-            localStorage.setItem(`coords:${loc}`, JSON.stringify(pair));
-          }
-        })
-        .catch((e) => console.error("Geocode error for", loc, e));
-    });
-  }, [locations, coordsMap]);
-
   return (
     <Box sx={{ minHeight: "100vh" }}>
       {/* fixed header */}
@@ -212,27 +175,37 @@ export default function AdminAnalytics() {
               url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
               attribution='&copy; <a href="https://www.openstreetmap.org/">OpenStreetMap</a>'
             />
-            {locations.map((loc) => {
-              const pos = coordsMap[loc];
-              return (
-                pos && (
-                  <Marker position={pos} icon={redPin} key={loc}>
-                    <Popup>
-                      <div>{loc}</div>
-                      <div>
-                        {locationCounts[loc]}{" "}
-                        {locationCounts[loc] === 1 ? "grower" : "growers"}
-                      </div>
-                    </Popup>
-                  </Marker>
-                )
-              );
-            })}
+            {places.map(({ place, name, lat, lon, count }) => (
+              <Marker position={[lat, lon]} icon={redPin} key={place}>
+                <Popup>
+                  <div>{name}</div>
+                  <div>
+                    {count} {count === 1 ? "question" : "questions"}
+                  </div>
+                </Popup>
+              </Marker>
+            ))}
           </MapContainer>
           <Box sx={{ textAlign: "center", mt: 3 }}>
             <Typography variant="h6">User Count</Typography>
             <Typography variant="h4">{userCount}</Typography>
           </Box>
+          {topQuestions.length > 0 && (
+            <Box sx={{ mt: 3 }}>
+              <Typography variant="h6" gutterBottom>
+                Top Questions:
+              </Typography>
+              {topQuestions.map(({ question, count }) => (
+                <Box
+                  key={question}
+                  sx={{ display: "flex", justifyContent: "space-between", py: 0.5 }}
+                >
+                  <Typography variant="body2">{question}</Typography>
+                  <Typography variant="body2">{count}</Typography>
+                </Box>
+              ))}
+            </Box>
+          )}
         </Grid>
       </Grid>
     </Box>
@@ -35,11 +35,27 @@ function ChatBody() {
   /* ─────────────────────────── helpers / UI ──────────────────────────── */
   const addMsg = (block) => setMessages((prev) => [...prev, block]);
 
-  const replaceProcessing = (text) =>
+  /* bot bubble still waiting for (the rest of) its answer */
+  const isPending = (m) => ["PROCESSING", "QUEUED", "STREAMING"].includes(m.state);
+
+  const replaceProcessing = (text, state = "RECEIVED") =>
+    setMessages((prev) =>
+      prev.map((m) =>
+        isPending(m) ? createMessageBlock(text, "BOT", "TEXT", state) : m
+      )
+    );
+
+  /* append a "delta" frame to the answer that is still arriving */
+  const appendStreaming = (text) =>
     setMessages((prev) =>
       prev.map((m) =>
-        m.state === "PROCESSING"
-          ? createMessageBlock(text, "BOT", "TEXT", "RECEIVED")
+        isPending(m)
+          ? createMessageBlock(
+              (m.state === "STREAMING" ? m.message : "") + text,
+              "BOT",
+              "TEXT",
+              "STREAMING"
+            )
           : m
       )
     );
@@ -80,6 +96,7 @@ function ChatBody() {
         querytext:  question,
         session_id: sessionId,
         location,
+        stream:     true,
       };
       console.log("🔵 Sent:", payload);
       socket.send(JSON.stringify(payload));
@@ -92,16 +109,32 @@ function ChatBody() {
         return;
       }
 
+      let done = true;
       try {
         console.log("📨 Raw:", event.data);
-        const { responsetext } = JSON.parse(event.data);
-        replaceProcessing(responsetext);
+        const frame = JSON.parse(event.data);
+
+        /* streamed answer: {type:"delta", seq, text} … {type:"end", responsetext} */
+        if (frame.type === "delta") {
+          appendStreaming(frame.text);
+          done = false;
+        } else if (frame.type === "queued") {
+          /* backlog on the server – answer follows on this socket */
+          replaceProcessing(`You're in the queue (position ${frame.position}). Your answer will appear here shortly…`, "QUEUED");
+          done = false;
+        } else if (frame.error) {
+          replaceProcessing(frame.error);
+        } else {
+          replaceProcessing(frame.responsetext);
+        }
       } catch (err) {
         console.error("❌ JSON parse error:", err);
         replaceProcessing("Error parsing response. Please try again.");
       } finally {
-        setProcessing(false);
-        socket.close();
+        if (done) {
+          setProcessing(false);
+          socket.close();
+        }
       }
     };
 
@@ -9,6 +9,7 @@ import {
   TableRow,
   TableCell,
   TableBody,
+  TableSortLabel,
   IconButton,
   Checkbox,
   Modal,
@@ -73,21 +74,36 @@ const formatDate = (isoString) => {
   });
 };
 
+const PAGE_SIZE = 50;
+
 export default function ManageDocuments() {
   const [documents, setDocuments]       = useState([]);
   const [selectedFiles, setSelectedFiles] = useState([]);
   const [uploadModalOpen, setUploadModalOpen] = useState(false);
   const [searchTerm, setSearchTerm]     = useState("");
+  const [prefix, setPrefix]             = useState("");
+  const [sort, setSort]                 = useState({ by: "name", order: "asc" });
+  const [nextToken, setNextToken]       = useState(null);
+  const [total, setTotal]               = useState(null);
   const [loading, setLoading]           = useState(false);
   const [error, setError]               = useState("");
 
-  // 1) List
-  const fetchDocuments = async () => {
+  // 1) List – one page of the server-side manifest; "Load more" appends the next
+  const fetchDocuments = async (pageToken = null) => {
     setLoading(true);
     setError("");
     try {
       const token = await getIdToken();
-      const res = await fetch(`${DOCUMENTS_API}/files`, {
+      const params = new URLSearchParams({
+        limit: PAGE_SIZE,
+        sort:  sort.by,
+        order: sort.order,
+      });
+      if (searchTerm.trim()) params.set("q", searchTerm.trim());
+      if (prefix) params.set("prefix", prefix);
+      if (pageToken) params.set("next_token", pageToken);
+
+      const res = await fetch(`${DOCUMENTS_API}files?${params}`, {
         method: "GET",
         headers: {
           "Content-Type":  "application/json",
@@ -97,17 +113,17 @@ export default function ManageDocuments() {
 
       if (!res.ok) throw new Error(`List failed: ${res.status}`);
       const data = await res.json();
-      // data.files is an array of filenames
       const parsed = (data.files || []).map((doc) => ({
         name: doc.key,
         type: doc.key.split(".").pop().toUpperCase(),
         size: formatSize(doc.size),
         lastModified: formatDate(doc.last_modified),
         url:            `${DOCUMENTS_API}files/${encodeURIComponent(doc.key)}`,
-        deleteEndpoint: `${DOCUMENTS_API}files/${encodeURIComponent(doc.key)}`,
       }));
 
-      setDocuments(parsed);
+      setDocuments((prev) => (pageToken ? [...prev, ...parsed] : parsed));
+      setNextToken(data.next_token || null);
+      setTotal(data.total?.count ?? null);
     } catch (err) {
       console.error(err);
       setError(err.message);
@@ -116,17 +132,21 @@ export default function ManageDocuments() {
     }
   };
 
-  // 2) Delete
+  const handleSort = (by) =>
+    setSort((prev) => ({
+      by,
+      order: prev.by === by && prev.order === "asc" ? "desc" : "asc",
+    }));
+
+  // 2) Delete – one batch request (DeleteObjects) and one KB sync for the selection
   const handleDeleteFiles = async () => {
     setLoading(true);
     setError("");
     try {
-      const token = await getIdToken();
-      for (const doc of documents.filter(d => selectedFiles.includes(d.name))) {
-        await fetch(doc.deleteEndpoint, {
-          method: "DELETE",
-          headers: { Authorization: `Bearer ${token}` },
-        });
+      let report = await authedPost("files/batch/delete", { keys: selectedFiles });
+      if (report.state === "running") report = await waitForBatch(report.batch_id);
+      if (report.failed?.length) {
+        setError(`${report.failed.length} file(s) could not be deleted`);
       }
       // refresh
       await fetchDocuments();
@@ -138,84 +158,164 @@ export default function ManageDocuments() {
     }
   };
 
-  // 3) Upload
-  const handleFileUpload = (e) => {
-    const file = e.target.files[0];
-    if (!file) return;
-    const reader = new FileReader();
-    reader.onloadend = async () => {
-      setLoading(true);
-      setError("");
-      try {
-        const token = await getIdToken();
-        const base64 = reader.result.split(",")[1];
-        await fetch(`${DOCUMENTS_API}/files`, {
-          method: "POST",
-          headers: {
-            "Content-Type": "application/json",
-            Authorization:   `Bearer ${token}`,
-          },
-          body: JSON.stringify({
-            filename:     file.name,
-            content_type: file.type,
-            content:      base64,
-          }),
-        });
-        setUploadModalOpen(false);
-        await fetchDocuments();
-      } catch (err) {
-        console.error(err);
-        setError(err.message);
-      } finally {
-        setLoading(false);
+  // 3) Upload – bytes go straight to S3 through presigned URLs
+  const authedPost = async (path, body) => {
+    const token = await getIdToken();
+    const res = await fetch(`${DOCUMENTS_API}${path}`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Authorization:   `Bearer ${token}`,
+      },
+      body: JSON.stringify(body),
+    });
+    if (!res.ok) throw new Error(`${path} failed: ${res.status}`);
+    return res.json();
+  };
+
+  // PUT the bytes of one file to its slot (single URL, or a few parts in flight)
+  const putToSlot = async (file, slot) => {
+    if (slot.mode === "single") {
+      const put = await fetch(slot.url, { method: "PUT", headers: slot.headers, body: file });
+      if (!put.ok) throw new Error(`Upload failed: ${put.status}`);
+      return { key: slot.key };
+    }
+
+    try {
+      const queue = [...slot.parts];
+      const worker = async () => {
+        for (let part = queue.shift(); part; part = queue.shift()) {
+          const start = (part.part_number - 1) * slot.part_size;
+          const put = await fetch(part.url, {
+            method: "PUT",
+            body:   file.slice(start, start + slot.part_size),
+          });
+          if (!put.ok) throw new Error(`Part ${part.part_number} failed: ${put.status}`);
+        }
+      };
+      await Promise.all([1, 2, 3, 4].map(worker));
+      return { key: slot.key, upload_id: slot.upload_id };
+    } catch (err) {
+      await authedPost("files/uploads/abort", { key: slot.key, upload_id: slot.upload_id }).catch(() => {});
+      throw err;
+    }
+  };
+
+  const uploadToS3 = async (file) => {
+    const slot = await authedPost("files/uploads", {
+      filename:     file.name,
+      content_type: file.type || "application/octet-stream",
+      size:         file.size,
+    });
+    return authedPost("files/uploads/complete", await putToSlot(file, slot));
+  };
+
+  // several files: one slot request, a few files in flight, one complete (and one KB sync)
+  const uploadBatch = async (files) => {
+    const { batch_id, slots } = await authedPost("files/batch/uploads", {
+      files: files.map((f) => ({
+        filename:     f.name,
+        content_type: f.type || "application/octet-stream",
+        size:         f.size,
+      })),
+    });
+    const queue = slots.map((slot, i) => [files[i], slot]);
+    const uploads = [];
+    const worker = async () => {
+      for (let item = queue.shift(); item; item = queue.shift()) {
+        uploads.push(await putToSlot(...item).catch(() => null));
       }
     };
-    reader.readAsDataURL(file);
+    await Promise.all([1, 2, 3, 4].map(worker));
+    return authedPost("files/batch/uploads/complete", { batch_id, uploads: uploads.filter(Boolean) });
+  };
+
+  // a .zip is extracted server-side
+  const uploadArchive = async (file) => {
+    const { batch_id, slots } = await authedPost("files/batch/uploads", {
+      archive: { filename: file.name, size: file.size },
+    });
+    const done = await putToSlot(file, slots[0]);
+    await authedPost("files/batch/uploads/complete", {
+      batch_id,
+      archive_key: done.key,
+      upload_id:   done.upload_id,
+      prefix,
+    });
+    return waitForBatch(batch_id);
+  };
+
+  // poll the report of an async batch (archive extraction, large delete) until it is done
+  const waitForBatch = async (batch_id) => {
+    const token = await getIdToken();
+    for (;;) {
+      await new Promise((r) => setTimeout(r, 2000));
+      const res = await fetch(`${DOCUMENTS_API}files/batch/${batch_id}`, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      if (!res.ok) throw new Error(`Batch status failed: ${res.status}`);
+      const report = await res.json();
+      if (report.state !== "running") return report;
+    }
   };
 
-  // 4) Download
+  const handleFileUpload = async (e) => {
+    const files = [...e.target.files];
+    if (!files.length) return;
+    setLoading(true);
+    setError("");
+    try {
+      let report = null;
+      if (files.length === 1 && /\.zip$/i.test(files[0].name)) {
+        report = await uploadArchive(files[0]);
+      } else if (files.length > 1) {
+        report = await uploadBatch(files);
+      } else {
+        await uploadToS3(files[0]);
+      }
+      if (report?.error) setError(report.error);
+      else if (report?.failed?.length) setError(`${report.failed.length} file(s) failed to upload`);
+      setUploadModalOpen(false);
+      await fetchDocuments();
+    } catch (err) {
+      console.error(err);
+      setError(err.message);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  // 4) Download – a short-lived presigned S3 link
   const handleDownloadFile = async (url, fileName) => {
     setError("");
     try {
       const token  = await getIdToken();
-      const res    = await fetch(url, {
+      const res    = await fetch(`${url}?presign=true`, {
         method:  "GET",
         headers: { Authorization: `Bearer ${token}` },
       });
   
       if (!res.ok) throw new Error("Download failed");
-  
-      // The Lambda returns a plain text body that is BASE-64 of the bytes
-      const b64Data = await res.text();
-  
-      // Convert base64 → Uint8Array → Blob
-      const byteString = atob(b64Data.trim());
-      const byteArray  = new Uint8Array(byteString.length);
-      for (let i = 0; i < byteString.length; i++) {
-        byteArray[i] = byteString.charCodeAt(i);
-      }
-      // Use the Content-Type the Lambda sent back (falls back to octet-stream)
-      const contentType = res.headers.get("Content-Type") || "application/octet-stream";
-      const blob = new Blob([byteArray], { type: contentType });
-  
-      // Create a blob URL and download
-      const blobUrl = URL.createObjectURL(blob);
+      const { url: signedUrl } = await res.json();
+
       const link    = document.createElement("a");
-      link.href     = blobUrl;
+      link.href     = signedUrl;
       link.download = fileName;
       document.body.appendChild(link);
       link.click();
       link.remove();
-      URL.revokeObjectURL(blobUrl);
     } catch (err) {
       console.error(err);
       setError(err.message);
     }
   };
 
+  // refetch from the first page when the query changes (typing is debounced)
   useEffect(() => {
-    fetchDocuments();
-  }, []);
+    const timer = setTimeout(() => fetchDocuments(), 300);
+    return () => clearTimeout(timer);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [searchTerm, prefix, sort]);
 
   // Checkbox toggle
   const handleCheckboxChange = (name) =>
@@ -236,7 +336,13 @@ export default function ManageDocuments() {
           onChange={e => setSearchTerm(e.target.value)}
           sx={{ flex: 1 }}
         />
-        <IconButton onClick={fetchDocuments} disabled={loading}>
+        <TextField
+          placeholder="Folder (prefix)"
+          value={prefix}
+          onChange={e => setPrefix(e.target.value)}
+          sx={{ width: "30%" }}
+        />
+        <IconButton onClick={() => fetchDocuments()} disabled={loading}>
           <RefreshIcon />
         </IconButton>
         <IconButton onClick={() => setUploadModalOpen(true)}>
@@ -264,16 +370,28 @@ export default function ManageDocuments() {
           <Table>
             <TableHead>
               <TableRow>
-                <TableCell>Name</TableCell>
-                <TableCell>Type</TableCell>
-                <TableCell>Last Modified</TableCell>
-                <TableCell>Size</TableCell>
+                {[["name", "Name"], [null, "Type"], ["last_modified", "Last Modified"], ["size", "Size"]].map(
+                  ([by, label]) => (
+                    <TableCell key={label}>
+                      {by ? (
+                        <TableSortLabel
+                          active={sort.by === by}
+                          direction={sort.by === by ? sort.order : "asc"}
+                          onClick={() => handleSort(by)}
+                        >
+                          {label}
+                        </TableSortLabel>
+                      ) : (
+                        label
+                      )}
+                    </TableCell>
+                  )
+                )}
                 <TableCell>Action</TableCell>
               </TableRow>
             </TableHead>
             <TableBody>
               {documents
-                .filter(d => d.name.toLowerCase().includes(searchTerm.toLowerCase()))
                 .map((doc) => (
                   <TableRow key={doc.name}>
                     <TableCell>
@@ -305,6 +423,20 @@ export default function ManageDocuments() {
             </TableBody>
           </Table>
         )}
+        <Box textAlign="center" my={2}>
+          {total != null && (
+            <Typography variant="caption" display="block" mb={1}>
+              {searchTerm || prefix
+                ? `Showing ${documents.length} matching documents`
+                : `Showing ${documents.length} of ${total} documents`}
+            </Typography>
+          )}
+          {nextToken && (
+            <Button variant="outlined" onClick={() => fetchDocuments(nextToken)} disabled={loading}>
+              Load more
+            </Button>
+          )}
+        </Box>
       </Container>
 
       {/* Upload Modal */}
@@ -314,15 +446,19 @@ export default function ManageDocuments() {
       >
         <Paper sx={modalStyle}>
           <Typography variant="h6" mb={2}>
-            Upload File
+            Upload Files
+          </Typography>
+          <Typography variant="body2" mb={2} textAlign="center">
+            Select one or more documents, or a .zip archive to extract
+            {prefix ? ` into "${prefix}"` : ""}.
           </Typography>
           <Button
             variant="contained"
             component="label"
             sx={{ backgroundColor: "#D63F09", "&:hover": { backgroundColor: "#B53207" } }}
           >
-            Select File
-            <input type="file" hidden onChange={handleFileUpload} />
+            Select Files
+            <input type="file" hidden multiple onChange={handleFileUpload} />
           </Button>
         </Paper>
       </Modal>